@@ -1,13 +1,23 @@
 import pandas as pd
 import json
-import random
 import os
+import time
+import numpy as np
+from building_index import build_residential_index_from_table, section_buildings, section_records
+from geojson_stream import load_features, load_feature_table, feature_collection
+from apportionment import apportion_section
+from profile_library import load_profiles
+from run_report import RunReport
+from household_pool import HOUSEHOLD_TYPES, household_counts, build_household_pool, split_pool
 
 # File paths
 census_data = "Data/census_data_out.json"
 building_data = "Data/Building_with_census_updated.json"
 profile_file = "Data/profiles_HH.xlsx"
 output_folder = "Data/Building_profiles"
+# Run report (stage timings, per-section counters) saved as run_report.json/.csv in
+# output_folder; True adds the memory peaks via tracemalloc, which slows the run down
+report_memory = False
 
 # Household types mapping
 ncomp_types = {
@@ -21,25 +31,29 @@ ncomp_types = {
 
 # Ensure output folder exists
 os.makedirs(output_folder, exist_ok=True)
+report = RunReport("Assegnazione_famiglie", track_memory=report_memory)
 
 # Load data
-with open(census_data, 'r') as f:
-    census_data = json.load(f)
+with report.stage("load"):
+    census_data = load_features(census_data)
 
-with open(building_data, 'r') as f:
-    building_data = json.load(f)
+    # only the building properties used here, as typed columns (geometry skipped)
+    building_table = load_feature_table(building_data)
+    building_data = feature_collection(building_table)
 
-profiles = {
-    ncomp_types[sheet]: pd.read_excel(profile_file, sheet_name=sheet).values.tolist()
-    for sheet in ncomp_types
-}
+    # SEZ21 -> residential buildings
+    building_index = build_residential_index_from_table(building_table, area_key="Shape_Area")
+
+with report.stage("profiles"):
+    profiles = load_profiles(profile_file, ncomp_types)
 
 
-def assign_households_to_residential_buildings(census_sections, building_data):
+def assign_households_to_residential_buildings(census_sections, building_data, building_index):
     building_summary = {}  # <-- define here
     building_estimated_residents = {}
 
     for feature in census_sections["features"]:
+        section_start = time.perf_counter()
         census = feature["properties"]
         census_id = census["SEZ21"]
         census_population = census["total resident population"]
@@ -48,51 +62,32 @@ def assign_households_to_residential_buildings(census_sections, building_data):
                             census["Foreign occupied_ST31"]) /
                            census["total resident population"]) if census_population > 0 else 0
 
-        residential_buildings = [b["properties"] for b in building_data["features"]
-                                 if b["properties"]["SEZ21"] == census_id and b["properties"]["function"] in [11, 12]]
+        residential_buildings = section_buildings(building_index, building_data, census_id)
         if not residential_buildings:
             continue
 
-        # Calculate total heated area for residential buildings
-        total_heated_area = sum(b["Shape_Area"] * b["nfloors"] for b in residential_buildings)
-        avg_area_per_person = total_heated_area / census_population if census_population > 0 else 1
-
-        # Assign estimated residents to each building
-        for building in residential_buildings:
-            building["heated_area"] = building["Shape_Area"] * building["nfloors"]
-            building["estimated_residents"] = max(1, round(building["heated_area"] / avg_area_per_person))
-
-        # Adjust total residents to match census population
-        assigned_population = sum(b["estimated_residents"] for b in residential_buildings)
-        difference = census_population - assigned_population
+        # Residents proportional to the heated area, households proportional to the
+        # residents, at least one per building and matching the census totals
+        records = section_records(building_index, census_id)
+        heated_area = records["area"] * records["nfloors"]
+        estimated_residents, assigned_households = apportion_section(
+            heated_area, census_population, total_census_households)
 
-        if difference > 0:
-            for _ in range(difference):
-                random.choice(residential_buildings)["estimated_residents"] += 1
-        elif difference < 0:
-            for _ in range(abs(difference)):
-                random.choice(residential_buildings)["estimated_residents"] -= 1
+        for building, area, residents, n_households in zip(
+                residential_buildings, heated_area, estimated_residents, assigned_households):
+            building["heated_area"] = float(area)
+            building["estimated_residents"] = int(residents)
+            building["assigned_households"] = int(n_households)
 
         # Assign households
-        households = []
-        households += [("1_comp_work", profiles["1_comp_work"]) for _ in range(int(census["HH_1 comp"] * census_occupied))]
-        households += [("1_comp_ret", profiles["1_comp_ret"]) for _ in range(int(census["HH_1 comp"] * (1 - census_occupied)))]
-        households += [("2_comp_work", profiles["2_comp_work"]) for _ in range(int(census["HH_2 comp"] * census_occupied))]
-        households += [("2_comp_ret", profiles["2_comp_ret"]) for _ in range(int(census["HH_2 comp"] * (1 - census_occupied)))]
-        households += [("3_comp", profiles["3_comp"]) for _ in range(int(census["HH_3 comp"]))]
-        households += [("4_comp_more", profiles["4_comp_more"]) for _ in range(int(census["HH_4 comp"] + census["HH_5 comp"] + census["HH_6 comp or more"]))]
+        # shuffled pool of household type codes, each building takes a contiguous slice
+        hh_types, _ = build_household_pool(household_counts(census, census_occupied))
+        starts, stops = split_pool(len(hh_types), assigned_households)
 
-        random.shuffle(households)
-
-        for building in residential_buildings:
+        for building, start, stop in zip(residential_buildings, starts, stops):
             building_id = str(building["ID"])
-            num_households = max(1, round(building["estimated_residents"] / census_population * total_census_households))
 
-            assigned_profiles = []
-            for _ in range(num_households):
-                if households:
-                    ncomp_type, _ = households.pop(0)
-                    assigned_profiles.append(ncomp_type)
+            assigned_profiles = [HOUSEHOLD_TYPES[code] for code in hh_types[start:stop]]
 
             # ---- JSON SUMMARY ----
             summary = {
@@ -124,6 +119,10 @@ def assign_households_to_residential_buildings(census_sections, building_data):
                 file_path = os.path.join(output_folder, f"{building_id}.csv")
                 df.to_csv(file_path, index=False)
 
+        report.section(census_id, buildings=len(residential_buildings), households=int(stops[-1]),
+                       residents=int(estimated_residents.sum()),
+                       seconds=round(time.perf_counter() - section_start, 4))
+
     # ---- SAVE ONE JSON FILE AT THE END ----
     output_json_path = os.path.join(output_folder, "building_household_summary.json")
     with open(output_json_path, "w") as f:
@@ -136,4 +135,7 @@ def assign_households_to_residential_buildings(census_sections, building_data):
 
 
 # Run function
-assign_households_to_residential_buildings(census_data, building_data)
+with report.stage("assign"):
+    assign_households_to_residential_buildings(census_data, building_data, building_index)
+
+print(f"✅ Saved run report to {report.write(output_folder)}")
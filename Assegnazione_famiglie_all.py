@@ -1,8 +1,16 @@
 import pandas as pd
 import json
-import random
 import os
-from collections import Counter
+import time
+import numpy as np
+from building_index import build_residential_index_from_table, section_buildings, section_records
+from geojson_stream import load_features, load_feature_table, feature_collection
+from apportionment import apportion_section
+from profile_library import load_profile_library
+from household_pool import HOUSEHOLD_TYPES, household_counts, build_household_pool, split_pool
+from population_sampling import sample_building_levels, allocate_section_levels, split_levels
+from profile_store import write_profile_store
+from run_report import RunReport
 
 # File paths
 census_data_file = "Data/census_data_out.json"
@@ -14,6 +22,19 @@ profile_files = {
     "DHW": "Data/Building_profiles_all/profiles_HH_ncomp_DHW.xlsx"
 }
 output_folder = "Data/Building_profiles_all_27.12"
+# Hourly profiles of all the households, one columnar file (see profile_store.py)
+profile_store_file = os.path.join(output_folder, "household_profiles.colstore")
+# Also write the old per-building Excel files (one sheet per category + "Average" row)
+write_building_xlsx = False
+# Education/income levels matching the census totals of each section (False: independent
+# multinomial draw per building, matching the section only on average)
+section_consistent_levels = True
+# Profile column of each household: False takes the first column of the profile table of
+# its type (as the original val[0]), True draws a random column per household
+random_profile_columns = False
+# Run report (stage timings, per-section counters) saved as run_report.json/.csv in
+# output_folder; True adds the memory peaks via tracemalloc, which slows the run down
+report_memory = False
 
 # Household types mapping (sheet names → simplified codes)
 ncomp_types = {
@@ -25,30 +46,53 @@ ncomp_types = {
     "More": "4_comp_more"
 }
 
+# Household types → keys of the building summary
+summary_types = {
+    "1_comp_work": "single_worker",
+    "1_comp_ret": "single_retired",
+    "2_comp_work": "couple_workers",
+    "2_comp_ret": "couple_retired",
+    "3_comp": "families",
+    "4_comp_more": "families"
+}
+# Residents per household of each summary group
+summary_sizes = {
+    "single_worker": 1,
+    "single_retired": 1,
+    "couple_workers": 2,
+    "couple_retired": 2,
+    "families": 3
+}
+
 # Ensure output folder exists
 os.makedirs(output_folder, exist_ok=True)
+report = RunReport("Assegnazione_famiglie_all", track_memory=report_memory)
 
 # Load census and building data
-with open(census_data_file, "r") as f:
-    census_data = json.load(f)
-with open(building_data_file, "r") as f:
-    building_data = json.load(f)
-
-# Load all profiles into a dictionary
-profiles = {}
-for category, file_path in profile_files.items():
-    profiles[category] = {
-        ncomp_types[sheet]: pd.read_excel(file_path, sheet_name=sheet).values.tolist()
-        for sheet in ncomp_types
-    }
+with report.stage("load"):
+    census_data = load_features(census_data_file)
+
+    # only the building properties used here, as typed columns (geometry skipped)
+    building_table = load_feature_table(building_data_file)
+    building_data = feature_collection(building_table)
+
+    # SEZ21 -> residential buildings
+    building_index = build_residential_index_from_table(building_table, area_key="Area")
+
+# Load all profiles into a dictionary (compiled once, then loaded from the cache)
+with report.stage("profiles"):
+    profiles = load_profile_library(profile_files, ncomp_types)
 
 building_household_summary = []
 
-def assign_households_to_residential_buildings(census_sections, building_data):
+def assign_households_to_residential_buildings(census_sections, building_data, building_index):
+    rng = np.random.default_rng()
     building_summary = {}
     building_estimated_residents = {}
+    building_profiles = {}
 
     for feature in census_sections["features"]:
+        section_start = time.perf_counter()
         census = feature["properties"]
         census_id = census["SEZ21"]
         census_population = census["total resident population"]
@@ -60,6 +104,15 @@ def assign_households_to_residential_buildings(census_sections, building_data):
         university_title = census["P90"]
         unknown_title = census["unknown_education"]
 
+        # --- Education data for the census section ---
+        section_education = {
+            "no_study": no_study_titles,
+            "elementary": elementary_title,
+            "middle_school": middle_school_title,
+            "secondary_school": secondary_school_title,
+            "university": university_title,
+            "unknown_edu": unknown_title
+        }
 
         if census_population <= 0 or total_census_households <= 0:
             continue
@@ -69,54 +122,56 @@ def assign_households_to_residential_buildings(census_sections, building_data):
             / census["total resident population"]
         )
 
-        residential_buildings = [
-            b["properties"] for b in building_data["features"]
-            if b["properties"]["SEZ21"] == census_id and b["properties"]["function"] in [11, 12]
-        ]
+        residential_buildings = section_buildings(building_index, building_data, census_id)
         if not residential_buildings:
             continue
 
-        # --- Calculate heated area and assign residents ---
-        total_heated_area = sum(b["Area"] * 0.82 * b["nfloors"] for b in residential_buildings)
-        avg_area_per_person = total_heated_area / census_population if census_population > 0 else 1
+        # --- Calculate heated area and assign residents and households ---
+        # (proportional split, at least 1 per building, matching the census totals)
+        records = section_records(building_index, census_id)
+        heated_area = records["area"] * 0.82 * records["nfloors"]
+        avg_area_per_person = heated_area.sum() / census_population
+        estimated_residents, assigned_households = apportion_section(
+            heated_area, census_population, total_census_households)
 
-        for b in residential_buildings:
-            b["heated_area"] = b["Area"] * 0.82 * b["nfloors"]
-            b["estimated_residents"] = max(1, round(b["heated_area"] / avg_area_per_person))
-
-        # --- Adjust population to match census ---
-        assigned_population = sum(b["estimated_residents"] for b in residential_buildings)
-        diff = census_population - assigned_population
-        for _ in range(abs(diff)):
-            choice = random.choice(residential_buildings)
-            choice["estimated_residents"] += 1 if diff > 0 else -1
+        for b, area, residents, n_households in zip(
+                residential_buildings, heated_area, estimated_residents, assigned_households):
+            b["heated_area"] = float(area)
+            b["estimated_residents"] = int(residents)
+            b["assigned_households"] = int(n_households)
 
         # --- Create household pool for this census section ---
-        households = []
-        hh_distribution = [
-            ("1_comp_work", int(census["HH_1 comp"] * census_occupied)),
-            ("1_comp_ret", int(census["HH_1 comp"] * (1 - census_occupied))),
-            ("2_comp_work", int(census["HH_2 comp"] * census_occupied)),
-            ("2_comp_ret", int(census["HH_2 comp"] * (1 - census_occupied))),
-            ("3_comp", int(census["HH_3 comp"])),
-            ("4_comp_more", int(census["HH_4 comp"] + census["HH_5 comp"] + census["HH_6 comp or more"]))
-        ]
-
-        for ncomp_type, count in hh_distribution:
-            for _ in range(count):
-                household_profiles = {cat: profiles[cat][ncomp_type] for cat in profile_files}
-                households.append((ncomp_type, household_profiles))
-
-        random.shuffle(households)
+        # (type code + profile column per household, profile values are read at output time)
+        n_profiles = ([min(profiles[cat][hh_type].shape[1] for cat in profile_files)
+                       for hh_type in HOUSEHOLD_TYPES] if random_profile_columns else None)
+        hh_types, hh_profile_idx = build_household_pool(
+            household_counts(census, census_occupied), n_profiles, rng)
+        starts, stops = split_pool(len(hh_types), assigned_households)
         print(f"census section ID {census_id}: {avg_area_per_person} m2/person")
 
+        # --- Households per type of every building (buildings x types) ---
+        n_buildings, n_types = len(residential_buildings), len(HOUSEHOLD_TYPES)
+        pool_building = np.repeat(np.arange(n_buildings), stops - starts)
+        type_counts = np.bincount(pool_building * n_types + hh_types[:stops[-1]],
+                                  minlength=n_buildings * n_types).reshape(n_buildings, n_types)
+        # residents per summary group
+        summary_groups = list(summary_sizes)
+        group_of_type = [summary_groups.index(summary_types[t]) for t in HOUSEHOLD_TYPES]
+        group_residents = np.zeros((n_buildings, len(summary_groups)), dtype=np.int64)
+        np.add.at(group_residents.T, group_of_type, type_counts.T)
+        group_residents *= np.array(list(summary_sizes.values()))
+
+        # --- RANDOM education allocation, all the buildings at once ---
+        # level counts per building (section totals split over the buildings, or a
+        # multinomial on the section distribution), then split over the household groups
+        sample_levels = allocate_section_levels if section_consistent_levels else sample_building_levels
+        education_levels = list(section_education)
+        education_counts = sample_levels(estimated_residents, list(section_education.values()), rng)
+        group_education = split_levels(education_counts, group_residents, rng)
+
         # --- Assign to buildings ---
-        for building in residential_buildings:
+        for b, (building, start, stop) in enumerate(zip(residential_buildings, starts, stops)):
             building_id = building["ID"]
-            num_households = max(
-                1,
-                round(building["estimated_residents"] / census_population * total_census_households)
-            )
 
             summary = {
                 "single_worker": {"Wasteful": 0, "Average": 0, "Saver": 0},
@@ -126,34 +181,16 @@ def assign_households_to_residential_buildings(census_sections, building_data):
                 "families": {"Wasteful": 0, "Average": 0, "Saver": 0},
             }
 
-            assigned_profiles = {cat: [] for cat in profile_files}
-            building_hh_count = {}
-
-            for _ in range(num_households):
-                if not households:
-                    break
-                ncomp_type, household_profiles = households.pop(0)
-
-                # count households
-                building_hh_count[ncomp_type] = building_hh_count.get(ncomp_type, 0) + 1
-
-                # update summary
-                if ncomp_type == "1_comp_work":
-                    summary["single_worker"]["Average"] += 1
-                elif ncomp_type == "1_comp_ret":
-                    summary["single_retired"]["Average"] += 1
-                elif ncomp_type == "2_comp_work":
-                    summary["couple_workers"]["Average"] += 1
-                elif ncomp_type == "2_comp_ret":
-                    summary["couple_retired"]["Average"] += 1
-                elif ncomp_type in ["3_comp", "4_comp_more"]:
-                    summary["families"]["Average"] += 1
+            # households of the building: a contiguous slice of the shuffled pool
+            building_types = hh_types[start:stop]
+            building_profile_idx = hh_profile_idx[start:stop]
 
-                # assign hourly profiles
-                for cat in profile_files:
-                    assigned_profiles[cat].append(
-                        [ncomp_type] + [val[0] if isinstance(val, list) else val for val in household_profiles[cat]]
-                    )
+            # count households and update summary
+            building_hh_count = {}
+            for code in np.flatnonzero(type_counts[b]):
+                ncomp_type = HOUSEHOLD_TYPES[code]
+                building_hh_count[ncomp_type] = int(type_counts[b, code])
+                summary[summary_types[ncomp_type]]["Average"] += int(type_counts[b, code])
 
             building_summary[building_id] = summary
             # Calculate number of occupied residents from household summary
@@ -163,154 +200,30 @@ def assign_households_to_residential_buildings(census_sections, building_data):
                 summary["families"]["Average"] * 2
             )
 
-            # --- Education data for the census section ---
-            section_education = {
-                "no_study": no_study_titles,
-                "elementary": elementary_title,
-                "middle_school": middle_school_title,
-                "secondary_school": secondary_school_title,
-                "university": university_title,
-                "unknown_edu": unknown_title
-            }
-            # --- RANDOM education allocation per building ---
-
-            # Calcola le probabilità di ciascun livello di istruzione nella sezione
-            total_section_education = sum(section_education.values())
-            if total_section_education == 0:
-                total_section_education = 1
-
-            education_levels = list(section_education.keys())
-            education_probs = [
-                value / total_section_education for value in section_education.values()
-            ]
-
-            # Estrai casualmente un titolo per ogni residente stimato nell’edificio
-            random_education = random.choices(
-                population=education_levels,
-                weights=education_probs,
-                k=building["estimated_residents"]
-            )
-
-            # Conta quanti residenti per ciascun livello
-            education_count = dict(Counter(random_education))
-
-            # Aggiungi eventuali livelli mancanti (per mantenere la chiave anche se 0)
-            for level in section_education.keys():
-                education_count.setdefault(level, 0)
-
-            # --- LOCAL REBALANCING per garantire coerenza con estimated_residents ---
-
-            sum_edu = sum(education_count.values())
-            if sum_edu < building["estimated_residents"]:
-                diff = building["estimated_residents"] - sum_edu
-                # aggiungi diff residenti casuali a livelli esistenti
-                for _ in range(diff):
-                    add_level = random.choice(list(education_count.keys()))
-                    education_count[add_level] += 1
-            elif sum_edu > building["estimated_residents"]:
-                diff = sum_edu - building["estimated_residents"]
-                # rimuovi diff residenti casuali dove il conteggio > 0
-                for _ in range(diff):
-                    candidates = [lvl for lvl, val in education_count.items() if val > 0]
-                    if candidates:
-                        rem_level = random.choice(candidates)
-                        education_count[rem_level] -= 1
-
-            # --- Estimate households and residents per type ---
-            hh_types_residents = {
-                "single_worker": summary["single_worker"]["Average"] * 1,
-                "single_retired": summary["single_retired"]["Average"] * 1,
-                "couple_workers": summary["couple_workers"]["Average"] * 2,
-                "couple_retired": summary["couple_retired"]["Average"] * 2,
-                "families": summary["families"]["Average"] * 3
-            }
-            total_building_residents = sum(hh_types_residents.values())
-            if total_building_residents == 0:
-                total_building_residents = 1
-
-            # --- Build a list of "virtual residents" for this building ---
-            education_levels = []
-            for level, count in education_count.items():
-                education_levels.extend([level] * count)
-
-            # Se il numero di residenti stimati > persone con titolo assegnato, riempi con "unknown"
-            #if len(education_levels) < building["estimated_residents"]:
-            #    education_levels.extend(["unknown"] * (building["estimated_residents"] - len(education_levels)))
-
-            # Shuffle for randomness
-            random.shuffle(education_levels)
-
-            # --- Assign education levels to households randomly ---
-            start_idx = 0
-            household_education_detail = {}
-            for hh_type, nres in hh_types_residents.items():
-                assigned = education_levels[start_idx:start_idx + nres] if nres > 0 else []
-                start_idx += nres
-                edu_counter = Counter(assigned)
-                household_education_detail[hh_type] = {
-                    "list": assigned,
-                    "count": dict(edu_counter)
-                }
-
-            # --- Aggregate education counts per building ---
-            aggregated_education = {}
-            for level in section_education.keys():
-                total = 0
-                for hh in household_education_detail.values():
-                    if isinstance(hh, dict) and "count" in hh:
-                        total += hh["count"].get(level, 0)
-                aggregated_education[level] = total
-
-            # --- FINAL LOCAL REBALANCING ---
-            # Garantisce coerenza tra estimated_residents, education e household_types
-
-            sum_edu = sum(aggregated_education.values())
-            sum_household = sum(
-                sum(v.get("count", {}).values()) for v in household_education_detail.values()
-            )
-
-            # Se la somma dell’educazione o dei tipi household è inferiore a estimated_residents
-            if building["estimated_residents"] > max(sum_edu, sum_household):
-                diff = building["estimated_residents"] - max(sum_edu, sum_household)
-                for _ in range(diff):
-                    add_level = random.choice(list(aggregated_education.keys()))
-                    aggregated_education[add_level] += 1
-
-            # Se invece eccedono
-            elif building["estimated_residents"] < min(sum_edu, sum_household):
-                diff = min(sum_edu, sum_household) - building["estimated_residents"]
-                for _ in range(diff):
-                    candidates = [lvl for lvl, val in aggregated_education.items() if val > 0]
-                    if candidates:
-                        rem_level = random.choice(candidates)
-                        aggregated_education[rem_level] -= 1
-
-            # Ora allinea anche la somma di household_types (se manca qualche individuo)
-            sum_household_final = sum(
-                sum(v.get("count", {}).values()) for v in household_education_detail.values()
-            )
-
-            if sum_household_final < building["estimated_residents"]:
-                diff = building["estimated_residents"] - sum_household_final
-                for _ in range(diff):
-                    hh_choice = random.choice(list(household_education_detail.keys()))
-                    lvl_choice = random.choice(list(aggregated_education.keys()))
-                    household_education_detail[hh_choice]["count"][lvl_choice] = (
-                        household_education_detail[hh_choice]["count"].get(lvl_choice, 0) + 1
-                    )
-
             # --- Save to dictionary ---
             building_estimated_residents[building_id] = {
                 "estimated_residents": building["estimated_residents"],
                 "occupied": occupied_count,
-                "education": aggregated_education,
+                "education": dict(zip(education_levels, education_counts[b].tolist())),
                 "household_types": {
-                    hh_type: hh["count"] for hh_type, hh in household_education_detail.items()
+                    group: {level: count for level, count in zip(education_levels, counts) if count}
+                    for group, counts in zip(summary_groups, group_education[b].tolist())
                 }
             }
 
+            # hourly profiles, written to the columnar store at the end
+            if stop > start:
+                building_profiles[building_id] = (building_types, building_profile_idx)
+
             # save detailed Excel
-            if any(assigned_profiles.values()):
+            if write_building_xlsx and stop > start:
+                # assign hourly profiles
+                assigned_profiles = {cat: [] for cat in profile_files}
+                for code, j in zip(building_types, building_profile_idx):
+                    ncomp_type = HOUSEHOLD_TYPES[code]
+                    for cat in profile_files:
+                        assigned_profiles[cat].append([ncomp_type] + profiles[cat][ncomp_type][:, j].tolist())
+
                 file_path = os.path.join(output_folder, f"{building_id}.xlsx")
                 with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
                     for cat, data in assigned_profiles.items():
@@ -323,40 +236,6 @@ def assign_households_to_residential_buildings(census_sections, building_data):
                         df.to_excel(writer, sheet_name=cat, index=False)
                 print(f"File creato: {file_path}")
 
-            # --- GLOBAL REBALANCING per la SEZIONE CENSUARIA ---
-
-            # # Calcola la somma di education per tutti gli edifici di questa sezione
-            # section_buildings = [bid for bid in building_estimated_residents if
-            #                      building_estimated_residents[bid].get("Census_Section", census_id) == census_id]
-            # section_sum = {lvl: 0 for lvl in section_education.keys()}
-            # for bid in section_buildings:
-            #     edu_dict = building_estimated_residents[bid]["education"]
-            #     for lvl, val in edu_dict.items():
-            #         section_sum[lvl] += val
-            #
-            # # Differenze con i valori censuari
-            # edu_levels = list(section_education.keys())
-            # for lvl in edu_levels:
-            #     diff = section_education[lvl] - section_sum[lvl]
-            #     if diff == 0:
-            #         continue
-            #
-            #     # Se mancano residenti per un livello → aggiungili randomicamente
-            #     if diff > 0:
-            #         for _ in range(diff):
-            #             target_building = random.choice(section_buildings)
-            #             building_estimated_residents[target_building]["education"][lvl] += 1
-            #     # Se sono in eccesso → rimuovili dove presenti
-            #     else:
-            #         for _ in range(abs(diff)):
-            #             candidates = [
-            #                 bid for bid in section_buildings
-            #                 if building_estimated_residents[bid]["education"].get(lvl, 0) > 0
-            #             ]
-            #             if candidates:
-            #                 target_building = random.choice(candidates)
-            #                 building_estimated_residents[target_building]["education"][lvl] -= 1
-
             # Save summary for later aggregation
             for hh_type, count in building_hh_count.items():
                 building_household_summary.append({
@@ -366,6 +245,10 @@ def assign_households_to_residential_buildings(census_sections, building_data):
                     "Count": count
                 })
 
+        report.section(census_id, buildings=n_buildings, households=int(type_counts.sum()),
+                       residents=int(estimated_residents.sum()), m2_per_person=round(float(avg_area_per_person), 2),
+                       seconds=round(time.perf_counter() - section_start, 4))
+
     # ---- SAVE ONE JSON FILE AT THE END ----
     output_json_path = os.path.join(output_folder, "building_household_summary.json")
     with open(output_json_path, "w") as f:
@@ -376,19 +259,26 @@ def assign_households_to_residential_buildings(census_sections, building_data):
     with open(residents_json_path, "w") as f:
         json.dump(building_estimated_residents, f, indent=2)
 
+    write_profile_store(profile_store_file, building_profiles, profiles)
+    print(f"✅ Saved household profiles to {profile_store_file}")
+
 # ---- RUN PROCESS ----
-assign_households_to_residential_buildings(census_data, building_data)
-
-summary_df = pd.DataFrame(building_household_summary)
-pivot_df = summary_df.pivot_table(
-    index=["Census_Section", "Building_ID"],
-    columns="Household_Type",
-    values="Count",
-    aggfunc="sum",
-    fill_value=0
-).reset_index()
-
-pivot_df = pivot_df.sort_values(by=["Census_Section", "Building_ID"])
-summary_file_path = os.path.join(output_folder, "Household_assignment_summary.xlsx")
-pivot_df.to_excel(summary_file_path, index=False)
+with report.stage("assign"):
+    assign_households_to_residential_buildings(census_data, building_data, building_index)
+
+with report.stage("summary_xlsx"):
+    summary_df = pd.DataFrame(building_household_summary)
+    pivot_df = summary_df.pivot_table(
+        index=["Census_Section", "Building_ID"],
+        columns="Household_Type",
+        values="Count",
+        aggfunc="sum",
+        fill_value=0
+    ).reset_index()
+
+    pivot_df = pivot_df.sort_values(by=["Census_Section", "Building_ID"])
+    summary_file_path = os.path.join(output_folder, "Household_assignment_summary.xlsx")
+    pivot_df.to_excel(summary_file_path, index=False)
 print(f"\n✅ File riepilogativo creato: {summary_file_path}")
+
+print(f"✅ Saved run report to {report.write(output_folder)}")
@@ -1,8 +1,26 @@
 import pandas as pd
+import numpy as np
 import json
-import random
 import os
-from collections import Counter
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from building_index import build_residential_index_from_table, section_buildings, section_records
+from geojson_stream import load_features, load_feature_table, feature_collection
+from apportionment import apportion_section
+from profile_library import load_profile_library
+from household_pool import (HOUSEHOLD_TYPES, HOUSEHOLD_SIZES, household_counts,
+                            build_household_pool, split_pool)
+from population_sampling import (sample_building_levels, allocate_section_levels, split_levels,
+                                 sample_members)
+from household_table import HouseholdTable
+from profile_store import write_profile_store, household_profile_matrix, open_profile_store
+from profile_averages import assignment_average_cube
+from cea_schedules import write_district_schedules
+from section_cache import section_fingerprint, section_entry, load_manifest, save_manifest, changed_sections
+from columnar_store import write_columns
+from ensemble_stats import EnsembleStats
+from run_report import RunReport, timer
 
 # File paths
 census_data_file = "Data/census_data_out.json"
@@ -14,6 +32,53 @@ profile_files = {
     "DHW": "Data/Building_profiles_all/profiles_HH_ncomp_DHW.xlsx"
 }
 output_folder = "Data/Building_profiles_income"
+# Hourly profiles of all the households, one columnar file (see profile_store.py)
+profile_store_file = os.path.join(output_folder, "household_profiles.colstore")
+# Also write the old per-building Excel files (one sheet per category + "Average" row)
+write_building_xlsx = False
+# CEA occupancy schedules (B<id>.csv) written directly from the assignment, without the
+# per-building Excel files and struttura_schedule_CEA.py (see cea_schedules.py). Off by
+# default: cea_schedule_folder holds the schedules built by struttura_schedule_CEA.py from
+# the _all profiles, which this would overwrite
+write_cea_schedules = False
+cea_schedule_folder = "Data/Building_schedules_CEA"
+# Schedule values: mean of the households weighted by household size (False: plain mean)
+cea_weighted_average = False
+# Households with their members, one columnar file (see household_table.py)
+household_table_file = os.path.join(output_folder, "households.colstore")
+# Also write the households as all_households_detailed.json (old layout)
+write_households_json = True
+# One line per census section on the console (m2/person)
+print_sections = True
+# Incremental mode: recompute only the census sections whose census data, buildings or
+# settings changed since the last run, the others are carried over from the outputs
+incremental = False
+section_manifest_file = os.path.join(output_folder, "section_manifest.json")
+# Education/income levels matching the census totals of each section (False: independent
+# multinomial draw per building, matching the section only on average)
+section_consistent_levels = True
+# Profile column of each household: False takes the first column of the profile table of
+# its type (as the original val[0]), True draws a random column per household
+random_profile_columns = False
+
+# Random generation: one master seed, each census section gets its own stream from it
+master_seed = 2025
+# Worker processes for the census sections (1 = sequential, in this process)
+n_workers = 1
+
+# Monte Carlo ensemble: number of realizations (0 = one realization with the full outputs).
+# Only running mean, std and quantiles per building are kept (see ensemble_stats.py)
+n_realizations = 0
+# realizations kept in memory for the quantiles, only for the per-building counts: the mean
+# hourly profiles (buildings x hours per category) get mean and std only
+ensemble_reservoir = 100
+ensemble_quantile_arrays = ("household_types", "occupied", "education", "income")
+ensemble_store_file = os.path.join(output_folder, "ensemble_statistics.colstore")
+ensemble_json_file = os.path.join(output_folder, "ensemble_statistics.json")
+
+# Run report (stage timings, per-section counters) saved as run_report.json/.csv in
+# output_folder; True adds the memory peaks via tracemalloc, which slows the run down
+report_memory = False
 
 # Household types mapping (sheet names → simplified codes)
 ncomp_types = {
@@ -25,707 +90,616 @@ ncomp_types = {
     "More": "4_comp_more"
 }
 
-# Ensure output folder exists
-os.makedirs(output_folder, exist_ok=True)
-
-# Load census and building data
-with open(census_data_file, "r") as f:
-    census_data = json.load(f)
-with open(building_data_file, "r") as f:
-    building_data = json.load(f)
-
-# Load all profiles into a dictionary
-profiles = {}
-for category, file_path in profile_files.items():
-    profiles[category] = {
-        ncomp_types[sheet]: pd.read_excel(file_path, sheet_name=sheet).values.tolist()
-        for sheet in ncomp_types
-    }
+# Household types → keys of the building summary
+summary_types = {
+    "1_comp_work": "single_worker",
+    "1_comp_ret": "single_retired",
+    "2_comp_work": "couple_workers",
+    "2_comp_ret": "couple_retired",
+    "3_comp": "families_3comp",
+    "4_comp_more": "families_4ormore"
+}
 
-building_household_summary = []
-all_households_detailed = {}
+# Education and income levels of the census sections (P86-P90 + unknown, income brackets),
+# in the order of the per-building counts
+education_levels = ("no_study", "elementary", "middle_school", "secondary_school", "university", "unknown_edu")
+income_levels = ("below0_income", "10k_income", "10_15k_income", "15_26k_income", "26_55k_income",
+                 "55_75k_income", "75_120k_income", "120k_income")
 
 
-def assign_households_to_residential_buildings(census_sections, building_data):
-    building_summary = {}
-    building_estimated_residents = {}
+def section_seed(master_seed, census_id, realization=None):
+    """Independent random stream of a census section, derived from the master seed.
 
-    for feature in census_sections["features"]:
-        census = feature["properties"]
-        census_id = census["SEZ21"]
-        census_population = census["total resident population"]
-        total_census_households = census["total households"]
-
-        # education level
-        no_study_titles = census["P86"]
-        elementary_title = census["P87"]
-        middle_school_title = census["P88"]
-        secondary_school_title = census["P89"]
-        university_title = census["P90"]
-        unknown_title = census["unknown_education"]
-
-        # income classes distribution
-        below0_income = census["below0_income"]
-        I_range_income = census ["10k_income"]
-        II_range_income = census["10_15k_income"]
-        III_range_income = census["15_26k_income"]
-        IV_range_income = census["26_55k_income"]
-        V_range_income = census["55_75k_income"]
-        VI_range_income = census["75_120k_income"]
-        VII_range_income = census["120k_income"]
-
-
-        if census_population <= 0 or total_census_households <= 0:
-            continue
+    Same mechanism as SeedSequence.spawn, keyed on SEZ21 instead of the spawn order, so
+    the stream of a section does not depend on which other sections are processed.
+    In ensemble mode the realization number is part of the key.
+    """
+    if realization is None:
+        return np.random.SeedSequence(master_seed, spawn_key=(int(census_id),))
+    return np.random.SeedSequence(master_seed, spawn_key=(int(realization), int(census_id)))
 
-        census_occupied = (
-            (census["Italian occupied_IT10"] + census["Foreign occupied_ST31"])
-            / census["total resident population"]
-        )
 
-        residential_buildings = [
-            b["properties"] for b in building_data["features"]
-            if b["properties"]["SEZ21"] == census_id and b["properties"]["function"] in [11, 12]
-        ]
-        if not residential_buildings:
-            continue
+def assign_section(census, residential_buildings, records, profiles, seed):
+    """Households, education and income for the residential buildings of one census section.
 
-        # --- Calculate heated area and assign residents ---
-        total_heated_area = sum(b["Area"] * 0.82 * b["nfloors"] for b in residential_buildings)
-        avg_area_per_person = total_heated_area / census_population if census_population > 0 else 1
-
-        for b in residential_buildings:
-            b["heated_area"] = b["Area"] * 0.82 * b["nfloors"]
-            b["estimated_residents"] = max(1, round(b["heated_area"] / avg_area_per_person))
-
-        # --- Adjust population to match census ---
-        assigned_population = sum(b["estimated_residents"] for b in residential_buildings)
-        diff = census_population - assigned_population
-        for _ in range(abs(diff)):
-            choice = random.choice(residential_buildings)
-            choice["estimated_residents"] += 1 if diff > 0 else -1
-
-        # --- Create household pool for this census section ---
-        households = []
-        hh_distribution = [
-            ("1_comp_work", int(census["HH_1 comp"] * census_occupied)),
-            ("1_comp_ret", int(census["HH_1 comp"] * (1 - census_occupied))),
-            ("2_comp_work", int(census["HH_2 comp"] * census_occupied)),
-            ("2_comp_ret", int(census["HH_2 comp"] * (1 - census_occupied))),
-            ("3_comp", int(census["HH_3 comp"])),
-            ("4_comp_more", int(census["HH_4 comp"] + census["HH_5 comp"] +
-                                census["HH_6 comp or more"]))
-        ]
-
-        for ncomp_type, count in hh_distribution:
-            for _ in range(count):
-                household_profiles = {cat: profiles[cat][ncomp_type] for cat in profile_files}
-                households.append((ncomp_type, household_profiles))
-
-        random.shuffle(households)
+    All the random draws come from `seed`, so the result only depends on the section data
+    and the seed, whatever process runs it. Nothing is written to disk here: the results
+    are returned and merged by assign_households_to_residential_buildings.
+    """
+    start_time = time.perf_counter()
+    # seconds of the phases of the section, see section_phases
+    phase_seconds = {}
+    rng = np.random.default_rng(seed)
+    building_summary = {}
+    building_estimated_residents = {}
+    household_summary = []
+    building_profiles = {}
+
+    census_id = census["SEZ21"]
+    census_population = census["total resident population"]
+    total_census_households = census["total households"]
+
+    # education level
+    no_study_titles = census["P86"]
+    elementary_title = census["P87"]
+    middle_school_title = census["P88"]
+    secondary_school_title = census["P89"]
+    university_title = census["P90"]
+    unknown_title = census["unknown_education"]
+
+    # income classes distribution
+    below0_income = census["below0_income"]
+    I_range_income = census ["10k_income"]
+    II_range_income = census["10_15k_income"]
+    III_range_income = census["15_26k_income"]
+    IV_range_income = census["26_55k_income"]
+    V_range_income = census["55_75k_income"]
+    VI_range_income = census["75_120k_income"]
+    VII_range_income = census["120k_income"]
+
+
+    census_occupied = (
+        (census["Italian occupied_IT10"] + census["Foreign occupied_ST31"])
+        / census["total resident population"]
+    )
+
+    # --- Calculate heated area and assign residents and households ---
+    # (proportional split, at least 1 per building, matching the census totals)
+    with timer(phase_seconds, "residents"):
+        heated_area = records["area"] * 0.82 * records["nfloors"]
+        avg_area_per_person = heated_area.sum() / census_population
+        estimated_residents, assigned_households = apportion_section(
+            heated_area, census_population, total_census_households)
+
+        for b, area, residents, n_households in zip(
+                residential_buildings, heated_area, estimated_residents, assigned_households):
+            b["heated_area"] = float(area)
+            b["estimated_residents"] = int(residents)
+            b["assigned_households"] = int(n_households)
+
+    # --- Create household pool for this census section ---
+    # (type code + profile column per household, profile values are read at output time)
+    with timer(phase_seconds, "household_pool"):
+        n_profiles = ([min(profiles[cat][hh_type].shape[1] for cat in profile_files)
+                       for hh_type in HOUSEHOLD_TYPES] if random_profile_columns else None)
+        hh_types, hh_profile_idx = build_household_pool(
+            household_counts(census, census_occupied), n_profiles, rng)
+        starts, stops = split_pool(len(hh_types), assigned_households)
+    if print_sections:
         print(f"census section ID {census_id}: {avg_area_per_person} m2/person")
 
-        # --- Assign to buildings ---
-        for building in residential_buildings:
-            building_id = building["ID"]
-            num_households = max(
-                1,
-                round(building["estimated_residents"] / census_population * total_census_households)
-            )
-
-            summary = {
-                "single_worker": {"Wasteful": 0, "Average": 0, "Saver": 0},
-                "single_retired": {"Wasteful": 0, "Average": 0, "Saver": 0},
-                "couple_workers": {"Wasteful": 0, "Average": 0, "Saver": 0},
-                "couple_retired": {"Wasteful": 0, "Average": 0, "Saver": 0},
-                "families_3comp": {"Wasteful": 0, "Average": 0, "Saver": 0},
-                "families_4ormore": {"Wasteful": 0, "Average": 0, "Saver": 0}
-            }
+    # --- Education and income data for the census section ---
+    section_education = dict(zip(education_levels, (
+        no_study_titles, elementary_title, middle_school_title, secondary_school_title,
+        university_title, unknown_title)))
+    section_income = dict(zip(income_levels, (
+        below0_income, I_range_income, II_range_income, III_range_income,
+        IV_range_income, V_range_income, VI_range_income, VII_range_income)))
+    household_groups = [summary_types[hh_type] for hh_type in HOUSEHOLD_TYPES]
+
+    # --- Households per type of every building (buildings x types) ---
+    n_buildings, n_types = len(residential_buildings), len(HOUSEHOLD_TYPES)
+    with timer(phase_seconds, "household_pool"):
+        pool_building = np.repeat(np.arange(n_buildings), stops - starts)
+        type_counts = np.bincount(pool_building * n_types + hh_types[:stops[-1]],
+                                  minlength=n_buildings * n_types).reshape(n_buildings, n_types)
+        # residents per household type
+        type_residents = type_counts * np.array(HOUSEHOLD_SIZES)
+
+    # --- RANDOM education and income allocation, all the buildings at once ---
+    # level counts per building (section totals split over the buildings, or a multinomial
+    # on the section distribution), split over the household types and then over the
+    # households (hypergeometric draws)
+    with timer(phase_seconds, "levels"):
+        sample_levels = allocate_section_levels if section_consistent_levels else sample_building_levels
+        education_counts = sample_levels(estimated_residents, list(section_education.values()), rng)
+        income_counts = sample_levels(estimated_residents, list(section_income.values()), rng)
+        type_education = split_levels(education_counts, type_residents, rng)
+        type_income = split_levels(income_counts, type_residents, rng)
+
+    # --- Assign to buildings ---
+    buildings_start = time.perf_counter()
+    for b, (building, start, stop) in enumerate(zip(residential_buildings, starts, stops)):
+        building_id = building["ID"]
+
+        summary = {
+            "single_worker": {"Wasteful": 0, "Average": 0, "Saver": 0},
+            "single_retired": {"Wasteful": 0, "Average": 0, "Saver": 0},
+            "couple_workers": {"Wasteful": 0, "Average": 0, "Saver": 0},
+            "couple_retired": {"Wasteful": 0, "Average": 0, "Saver": 0},
+            "families_3comp": {"Wasteful": 0, "Average": 0, "Saver": 0},
+            "families_4ormore": {"Wasteful": 0, "Average": 0, "Saver": 0}
+        }
+
+        # households of the building: a contiguous slice of the shuffled pool
+        building_types = hh_types[start:stop]
+
+        # count households and update summary
+        building_hh_count = {}
+        for code in np.flatnonzero(type_counts[b]):
+            ncomp_type = HOUSEHOLD_TYPES[code]
+            building_hh_count[ncomp_type] = int(type_counts[b, code])
+            summary[summary_types[ncomp_type]]["Average"] += int(type_counts[b, code])
+
+        building_summary[building_id] = summary
+        # Calculate number of occupied residents from household summary
+        occupied_count = (
+            summary["single_worker"]["Average"] * 1 +
+            summary["couple_workers"]["Average"] * 2 +
+            summary["families_3comp"]["Average"] * 2 +
+            summary["families_4ormore"]["Average"] * 2
+        )
 
-            assigned_profiles = {cat: [] for cat in profile_files}
-            building_hh_count = {}
-
-            for _ in range(num_households):
-                if not households:
-                    break
-                ncomp_type, household_profiles = households.pop(0)
-
-                # count households
-                building_hh_count[ncomp_type] = building_hh_count.get(ncomp_type, 0) + 1
-
-                # update summary
-                if ncomp_type == "1_comp_work":
-                    summary["single_worker"]["Average"] += 1
-                elif ncomp_type == "1_comp_ret":
-                    summary["single_retired"]["Average"] += 1
-                elif ncomp_type == "2_comp_work":
-                    summary["couple_workers"]["Average"] += 1
-                elif ncomp_type == "2_comp_ret":
-                    summary["couple_retired"]["Average"] += 1
-                elif ncomp_type in ["3_comp"]:
-                    summary["families_3comp"]["Average"] += 1
-                elif ncomp_type in ["4_comp_more"]:
-                    summary["families_4ormore"]["Average"] += 1
-
-                # assign hourly profiles
-                for cat in profile_files:
-                    assigned_profiles[cat].append(
-                        [ncomp_type] + [val[0] if isinstance(val, list) else val for val in household_profiles[cat]]
-                    )
-
-            building_summary[building_id] = summary
-            # Calculate number of occupied residents from household summary
-            occupied_count = (
-                summary["single_worker"]["Average"] * 1 +
-                summary["couple_workers"]["Average"] * 2 +
-                summary["families_3comp"]["Average"] * 2 +
-                summary["families_4ormore"]["Average"] * 2
-            )
-
-            # --- Education data for the census section ---
-            section_education = {
-                "no_study": no_study_titles,
-                "elementary": elementary_title,
-                "middle_school": middle_school_title,
-                "secondary_school": secondary_school_title,
-                "university": university_title,
-                "unknown_edu": unknown_title
+        # --- Save to dictionary ---
+        building_estimated_residents[building_id] = {
+            "estimated_residents": building["estimated_residents"],
+            "occupied": occupied_count,
+            "education": dict(zip(education_levels, education_counts[b].tolist())),
+            "income": dict(zip(income_levels, income_counts[b].tolist())),
+            "household_types": {
+                group: {level: count for level, count in zip(education_levels, counts) if count}
+                for group, counts in zip(household_groups, type_education[b].tolist())
             }
+        }
+
+        # households of the building, their hourly profiles are saved in the output stage
+        if stop > start:
+            building_profiles[building_id] = (building_types, hh_profile_idx[start:stop])
+
+        # Save summary for later aggregation
+        for hh_type, count in building_hh_count.items():
+            household_summary.append({
+                "Building_ID": building_id,
+                "Census_Section": census_id,
+                "Household_Type": hh_type,
+                "Count": count
+            })
+
+    phase_seconds["buildings"] = time.perf_counter() - buildings_start
+
+    # --- Households of the section: type and, per member, education and income codes ---
+    # (buildings x types order; members take the residents of their type, "unknown_edu" /
+    # "below0_income" when the type has fewer residents than member slots)
+    with timer(phase_seconds, "members"):
+        household_building = np.repeat(np.repeat(np.arange(n_buildings), n_types), type_counts.ravel())
+        household_type = np.repeat(np.tile(np.arange(n_types), n_buildings), type_counts.ravel())
+        member_start = np.concatenate(([0], np.cumsum(np.array(HOUSEHOLD_SIZES)[household_type])))
+        households = HouseholdTable(
+            buildings=records["ID"], building=household_building, household_type=household_type,
+            member_start=member_start,
+            member_education=sample_members(type_education, type_counts, HOUSEHOLD_SIZES,
+                                            education_levels.index("unknown_edu"), rng),
+            member_income=sample_members(type_income, type_counts, HOUSEHOLD_SIZES,
+                                         income_levels.index("below0_income"), rng),
+            household_types=HOUSEHOLD_TYPES, education_levels=education_levels, income_levels=income_levels)
+
+    return {
+        "census_id": census_id,
+        "building_summary": building_summary,
+        "building_estimated_residents": building_estimated_residents,
+        "households": households,
+        "household_summary": household_summary,
+        "building_profiles": building_profiles,
+        "m2_per_person": float(avg_area_per_person),
+        "seconds": time.perf_counter() - start_time,
+        "phase_seconds": phase_seconds,
+    }
 
-            # --- Income data for the census section ---
-            section_income = {
-                "below0_income": below0_income,
-                "10k_income": I_range_income,
-                "10_15k_income": II_range_income,
-                "15_26k_income": III_range_income,
-                "26_55k_income": IV_range_income,
-                "55_75k_income": V_range_income,
-                "75_120k_income": VI_range_income,
-                "120k_income": VII_range_income
-            }
 
+# phases of assign_section timed per section: resident estimate (apportion_section),
+# household pool, education/income levels, per-building outputs, household members
+section_phases = ("residents", "household_pool", "levels", "buildings", "members")
 
 
-            # --- RANDOM education allocation per building ---
-
-            # Calcola le probabilità di ciascun livello di istruzione nella sezione
-            total_section_education = sum(section_education.values())
-            if total_section_education == 0:
-                total_section_education = 1
-
-            education_levels = list(section_education.keys())
-            education_probs = [
-                value / total_section_education for value in section_education.values()
-            ]
-
-            # Estrai casualmente un titolo per ogni residente stimato nell’edificio
-            random_education = random.choices(
-                population=education_levels,
-                weights=education_probs,
-                k=building["estimated_residents"]
-            )
-
-            # Conta quanti residenti per ciascun livello
-            education_count = dict(Counter(random_education))
-
-            # Aggiungi eventuali livelli mancanti (per mantenere la chiave anche se 0)
-            for level in section_education.keys():
-                education_count.setdefault(level, 0)
-
-            # --- LOCAL REBALANCING per garantire coerenza con estimated_residents ---
-
-            sum_edu = sum(education_count.values())
-            if sum_edu < building["estimated_residents"]:
-                diff = building["estimated_residents"] - sum_edu
-                # aggiungi diff residenti casuali a livelli esistenti
-                for _ in range(diff):
-                    add_level = random.choice(list(education_count.keys()))
-                    education_count[add_level] += 1
-            elif sum_edu > building["estimated_residents"]:
-                diff = sum_edu - building["estimated_residents"]
-                # rimuovi diff residenti casuali dove il conteggio > 0
-                for _ in range(diff):
-                    candidates = [lvl for lvl, val in education_count.items() if val > 0]
-                    if candidates:
-                        rem_level = random.choice(candidates)
-                        education_count[rem_level] -= 1
-
-
-
-            # --- RANDOM income allocation per building ---
-            # Calcola le probabilità di ciascun livello di income nella sezione
-            total_section_income = sum(section_income.values())
-            if total_section_income == 0:
-                total_section_income = 1
-
-            income_levels = list(section_income.keys())
-            income_probs = [
-                value / total_section_income for value in section_income.values()
-            ]
-
-            # Estrai casualmente un titolo per ogni residente stimato nell’edificio
-            random_income = random.choices(
-                population=income_levels,
-                weights=income_probs,
-                k=building["estimated_residents"]
-            )
-
-            # Conta quanti residenti per ciascun livello
-            income_count = dict(Counter(random_income))
-
-            # Aggiungi eventuali livelli mancanti (per mantenere la chiave anche se 0)
-            for level in section_income.keys():
-                income_count.setdefault(level, 0)
-
-            # --- LOCAL REBALANCING per garantire coerenza con estimated_residents ---
-
-            sum_income = sum(income_count.values())
-            if sum_income < building["estimated_residents"]:
-                diff = building["estimated_residents"] - sum_income
-                # aggiungi diff residenti casuali a livelli esistenti
-                for _ in range(diff):
-                    add_level = random.choice(list(income_count.keys()))
-                    income_count[add_level] += 1
-            elif sum_income > building["estimated_residents"]:
-                diff = sum_income - building["estimated_residents"]
-                # rimuovi diff residenti casuali dove il conteggio > 0
-                for _ in range(diff):
-                    candidates = [lvl for lvl, val in income_count.items() if val > 0]
-                    if candidates:
-                        rem_level = random.choice(candidates)
-                        income_count[rem_level] -= 1
-
-            # # garantisci tutte le chiavi
-            # for level in income_levels:
-            #     income_count.setdefault(level, 0)
-            #
-            # # --- LOCAL REBALANCING income ---
-            # sum_inc = sum(income_count.values())
-            #
-            # if sum_inc < building["estimated_residents"]:
-            #     diff = building["estimated_residents"] - sum_inc
-            #     for _ in range(diff):
-            #         add_level = random.choice(income_levels)
-            #         income_count[add_level] += 1
-            #
-            # elif sum_inc > building["estimated_residents"]:
-            #     diff = sum_inc - building["estimated_residents"]
-            #     for _ in range(diff):
-            #         candidates = [lvl for lvl, val in income_count.items() if val > 0]
-            #         if candidates:
-            #             rem_level = random.choice(candidates)
-            #             income_count[rem_level] -= 1
-
-
-            # --- Estimate households and residents per type ---
-            hh_types_residents = {
-                "single_worker": summary["single_worker"]["Average"] * 1,
-                "single_retired": summary["single_retired"]["Average"] * 1,
-                "couple_workers": summary["couple_workers"]["Average"] * 2,
-                "couple_retired": summary["couple_retired"]["Average"] * 2,
-                "families_3comp": summary["families_3comp"]["Average"] * 3,
-                "families_4ormore": summary["families_4ormore"]["Average"] * 4
-            }
+def section_counters(section):
+    """Counters of a section result for the run report (phase times as <phase>_s)."""
+    residents = section["building_estimated_residents"].values()
+    phase_seconds = section.get("phase_seconds", {})
+    return {
+        "buildings": len(section["building_estimated_residents"]),
+        "households": len(section["households"]),
+        "residents": sum(building["estimated_residents"] for building in residents),
+        "m2_per_person": round(section["m2_per_person"], 2) if "m2_per_person" in section else "",
+        "seconds": round(section["seconds"], 4) if "seconds" in section else "",
+        **{f"{phase}_s": round(phase_seconds[phase], 4) if phase in phase_seconds else ""
+           for phase in section_phases},
+    }
+
+
+# profiles (and ensemble sections) of the worker processes, set once by the pool initializer
+_worker_profiles = None
+_worker_sections = None
+
+
+def _init_worker(profiles, sections=None):
+    global _worker_profiles, _worker_sections
+    _worker_profiles = profiles
+    _worker_sections = sections
+
+
+def _assign_section_task(task):
+    census, residential_buildings, records, seed = task
+    return assign_section(census, residential_buildings, records, _worker_profiles, seed)
+
+
+def _realization_task(task):
+    realization, master_seed = task
+    return run_realization(_worker_sections, _worker_profiles, realization, master_seed)
 
-            total_building_residents = sum(hh_types_residents.values())
-            if total_building_residents == 0:
-                total_building_residents = 1
-
-
-            # --- Build a list of "virtual residents" for this building ---
-            education_levels = []
-            for level, count in education_count.items():
-                education_levels.extend([level] * count)
-
-            # Se il numero di residenti stimati > persone con titolo assegnato, riempi con "unknown"
-            #if len(education_levels) < building["estimated_residents"]:
-            #    education_levels.extend(["unknown"] * (building["estimated_residents"] - len(education_levels)))
-
-            # Shuffle for randomness
-            random.shuffle(education_levels)
-
-            # --- Build income virtual residents list ---
-            income_levels = []
-            for level, count in income_count.items():
-                income_levels.extend([level] * count)
-
-            random.shuffle(income_levels)
-
-
-            # --- Assign education levels to households randomly ---
-            household_education_detail = {}
-            household_income_detail = {}
-
-            start_idx = 0
-
-            for hh_type, nres in hh_types_residents.items():
-                # Education
-                assigned_edu = education_levels[start_idx:start_idx + nres] if nres > 0 else []
-
-                # Income
-                assigned_inc = income_levels[start_idx:start_idx + nres] if nres > 0 else []
-
-                start_idx += nres
-
-                edu_counter = Counter(assigned_edu)
-                inc_counter = Counter(assigned_inc)
-
-                household_education_detail[hh_type] = {
-                    "list": assigned_edu,
-                    "count": dict(edu_counter)
-                }
-
-                household_income_detail[hh_type] = {
-                    "list": assigned_inc,
-                    "count": dict(inc_counter)
-                }
-
-            # --- SAVE EACH HOUSEHOLD DISTINCTLY ---
-
-            # for hh_type in household_education_detail.keys():
-            #
-            #     edu_list = household_education_detail[hh_type]["list"]
-            #     inc_list = household_income_detail[hh_type]["list"]
-            #
-            #     for i in range(len(edu_list)):
-            #         hh_id = f"{building_id}_{random.randint(1, 200)}"
-            #
-            #         all_households_detailed.append({
-            #             "Household_ID": hh_id,
-            #             "Building_ID": building_id,
-            #             "Household_type": hh_type,
-            #             "education": edu_list[i],
-            #             "income": inc_list[i]
-            #         })
-            # # --- SAVE EACH HOUSEHOLD WITH ITS RESIDENTS ---
-            # hh_resident_counts = {
-            #     "single_worker": 1,
-            #     "single_retired": 1,
-            #     "couple_workers": 2,
-            #     "couple_retired": 2,
-            #     "families": 3  # puoi regolare in base alla dimensione media desiderata
-            # }
-            #
-            # for hh_type, nres in hh_types_residents.items():
-            #     num_households = building_hh_count.get(hh_type, 0)
-            #     if num_households == 0:
-            #         continue
-            #
-            #     # Prendi le liste dei residenti disponibili
-            #     edu_list = household_education_detail[hh_type]["list"].copy()
-            #     inc_list = household_income_detail[hh_type]["list"].copy()
-            #
-            #     start_idx = 0
-            #     for _ in range(num_households):
-            #         hh_id = f"{building_id}_{random.randint(100000, 999999)}"
-            #         members_count = hh_resident_counts.get(hh_type, 1)
-            #
-            #         # Estrai i residenti per questo household
-            #         hh_edu = edu_list[start_idx:start_idx + members_count]
-            #         hh_inc = inc_list[start_idx:start_idx + members_count]
-            #         start_idx += members_count
-            #
-            #         # In caso di eccedenza o lista più corta, riempi con "unknown"/"below0_income"
-            #         while len(hh_edu) < members_count:
-            #             hh_edu.append("unknown_edu")
-            #         while len(hh_inc) < members_count:
-            #             hh_inc.append("below0_income")
-            #
-            #         # Conta i residenti per ciascun livello
-            #         edu_count = dict(Counter(hh_edu))
-            #         inc_count = dict(Counter(hh_inc))
-            #
-            #         all_households_detailed.append({
-            #             "Household_ID": hh_id,
-            #             "Building_ID": building_id,
-            #             "Household_type": hh_type,
-            #             "education": edu_count,
-            #             "income": inc_count
-            #         })
-
-            # --- Aggregate education counts per building ---
-            aggregated_education = {}
-            for level in section_education.keys():
-                total = 0
-                for hh in household_education_detail.values():
-                    if isinstance(hh, dict) and "count" in hh:
-                        total += hh["count"].get(level, 0)
-                aggregated_education[level] = total
-
-            # --- Aggregate income per building ---
-            aggregated_income = {}
-            for level in section_income.keys():
-                total = 0
-                for hh in household_income_detail.values():
-                    if isinstance(hh, dict) and "count" in hh:
-                        total += hh["count"].get(level, 0)
-                aggregated_income[level] = total
-
-            # --- Assign income levels to households randomly ---
-            # start_idx = 0
-            # household_income_detail = {}
-            #
-            # for hh_type, nres in hh_types_residents.items():
-            #     assigned_inc = income_levels_list[start_idx:start_idx + nres] if nres > 0 else []
-            #     start_idx += nres
-            #     inc_counter = Counter(assigned_inc)
-            #     household_income_detail[hh_type] = {
-            #         "list": assigned_inc,
-            #         "count": dict(inc_counter)
-            #     }
-            # # --- Aggregate income counts per building ---
-            # aggregated_income = {}
-            #
-            # for level in section_income.keys():
-            #     total = 0
-            #     for hh in household_income_detail.values():
-            #         if isinstance(hh, dict) and "count" in hh:
-            #             total += hh["count"].get(level, 0)
-            #     aggregated_income[level] = total
-
-
-            # --- FINAL LOCAL REBALANCING ---
-            # Garantisce coerenza tra estimated_residents, education e household_types
-
-            sum_edu = sum(aggregated_education.values())
-            sum_household = sum(sum(v.get("count", {}).values())
-                                for v in household_education_detail.values())
-
-            # Se la somma dell’educazione o dei tipi household è inferiore a estimated_residents
-            if building["estimated_residents"] > max(sum_edu, sum_household):
-                diff = building["estimated_residents"] - max(sum_edu, sum_household)
-                for _ in range(diff):
-                    add_level = random.choice(list(aggregated_education.keys()))
-                    aggregated_education[add_level] += 1
-
-            # Se invece eccedono
-            elif building["estimated_residents"] < min(sum_edu, sum_household):
-                diff = min(sum_edu, sum_household) - building["estimated_residents"]
-                for _ in range(diff):
-                    candidates = [lvl for lvl, val in aggregated_education.items() if val > 0]
-                    if candidates:
-                        rem_level = random.choice(candidates)
-                        aggregated_education[rem_level] -= 1
-
-            # Ora allinea anche la somma di household_types (se manca qualche individuo)
-            sum_household_final_edu = sum(sum(v.get("count", {}).values())
-                                      for v in household_education_detail.values())
-
-            if sum_household_final_edu < building["estimated_residents"]:
-                diff = building["estimated_residents"] - sum_household_final_edu
-                for _ in range(diff):
-                    hh_choice = random.choice(list(household_education_detail.keys()))
-                    lvl_choice = random.choice(list(aggregated_education.keys()))
-                    household_education_detail[hh_choice]["count"][lvl_choice] = (
-                        household_education_detail[hh_choice]["count"].get(lvl_choice, 0) + 1)
-
-            sum_income = sum(aggregated_income.values())
-            sum_household = sum(sum(v.get("count", {}).values())
-                                for v in household_income_detail.values())
-
-            # Se la somma dell’educazione o dei tipi household è inferiore a estimated_residents
-            if building["estimated_residents"] > max(sum_income, sum_household):
-                diff = building["estimated_residents"] - max(sum_income, sum_household)
-                for _ in range(diff):
-                    add_level = random.choice(list(aggregated_income.keys()))
-                    aggregated_income[add_level] += 1
-
-            # Se invece eccedono
-            elif building["estimated_residents"] < min(sum_income, sum_household):
-                diff = min(sum_income, sum_household) - building["estimated_residents"]
-                for _ in range(diff):
-                    candidates = [lvl for lvl, val in aggregated_income.items() if val > 0]
-                    if candidates:
-                        rem_level = random.choice(candidates)
-                        aggregated_income[rem_level] -= 1
-
-            # Ora allinea anche la somma di household_types (se manca qualche individuo)
-            sum_household_final_income = sum(sum(v.get("count", {}).values())
-                                      for v in household_income_detail.values())
-
-            if sum_household_final_income < building["estimated_residents"]:
-                diff = building["estimated_residents"] - sum_household_final_income
-                for _ in range(diff):
-                    hh_choice = random.choice(list(household_income_detail.keys()))
-                    lvl_choice = random.choice(list(aggregated_income.keys()))
-                    household_income_detail[hh_choice]["count"][lvl_choice] = (
-                        household_income_detail[hh_choice]["count"].get(lvl_choice, 0) + 1)
-
-            # --- Save to dictionary ---
-            building_estimated_residents[building_id] = {
-                "estimated_residents": building["estimated_residents"],
-                "occupied": occupied_count,
-                "education": aggregated_education,
-                "income": aggregated_income,
-                "household_types": {
-                    hh_type: hh["count"] for hh_type, hh in household_education_detail.items()
-                }
-            }
 
-            # save detailed Excel
-            if any(assigned_profiles.values()):
-                file_path = os.path.join(output_folder, f"{building_id}.xlsx")
-                with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
-                    for cat, data in assigned_profiles.items():
-                        if not data:
-                            continue
-                        col_names = ["Household Type"] + [f"Hour_{i+1}" for i in range(len(data[0]) - 1)]
-                        df = pd.DataFrame(data, columns=col_names)
-                        avg_row = ["Average"] + df.iloc[:, 1:].mean().tolist()
-                        df.loc[len(df)] = avg_row
-                        df.to_excel(writer, sheet_name=cat, index=False)
-                print(f"File creato: {file_path}")
-
-            # --- GLOBAL REBALANCING per la SEZIONE CENSUARIA ---
-
-            # # Calcola la somma di education per tutti gli edifici di questa sezione
-            # section_buildings = [bid for bid in building_estimated_residents if
-            #                      building_estimated_residents[bid].get("Census_Section", census_id) == census_id]
-            # section_sum = {lvl: 0 for lvl in section_education.keys()}
-            # for bid in section_buildings:
-            #     edu_dict = building_estimated_residents[bid]["education"]
-            #     for lvl, val in edu_dict.items():
-            #         section_sum[lvl] += val
-            #
-            # # Differenze con i valori censuari
-            # edu_levels = list(section_education.keys())
-            # for lvl in edu_levels:
-            #     diff = section_education[lvl] - section_sum[lvl]
-            #     if diff == 0:
-            #         continue
-            #
-            #     # Se mancano residenti per un livello → aggiungili randomicamente
-            #     if diff > 0:
-            #         for _ in range(diff):
-            #             target_building = random.choice(section_buildings)
-            #             building_estimated_residents[target_building]["education"][lvl] += 1
-            #     # Se sono in eccesso → rimuovili dove presenti
-            #     else:
-            #         for _ in range(abs(diff)):
-            #             candidates = [
-            #                 bid for bid in section_buildings
-            #                 if building_estimated_residents[bid]["education"].get(lvl, 0) > 0
-            #             ]
-            #             if candidates:
-            #                 target_building = random.choice(candidates)
-            #                 building_estimated_residents[target_building]["education"][lvl] -= 1
-
-            # Save summary for later aggregation
-            for hh_type, count in building_hh_count.items():
-                building_household_summary.append({
+def section_tasks(census_sections, building_data, building_index):
+    """(census, residential buildings, records) of the sections with residents and buildings."""
+    tasks = []
+    for feature in census_sections["features"]:
+        census = feature["properties"]
+        census_id = census["SEZ21"]
+        if census["total resident population"] <= 0 or census["total households"] <= 0:
+            continue
+
+        residential_buildings = section_buildings(building_index, building_data, census_id)
+        if not residential_buildings:
+            continue
+
+        tasks.append((census, residential_buildings, section_records(building_index, census_id)))
+    return tasks
+
+
+def save_building_profiles(building_id, building_types, building_profile_idx, profiles):
+    """Per-building Excel with one sheet per category and the "Average" row."""
+    # assign hourly profiles
+    assigned_profiles = {cat: [] for cat in profile_files}
+    for code, j in zip(building_types, building_profile_idx):
+        ncomp_type = HOUSEHOLD_TYPES[code]
+        for cat in profile_files:
+            assigned_profiles[cat].append([ncomp_type] + profiles[cat][ncomp_type][:, j].tolist())
+
+    file_path = os.path.join(output_folder, f"{building_id}.xlsx")
+    with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
+        # fixed creation date, so that the same seed gives identical files
+        writer.book.set_properties({"created": datetime(2025, 1, 1)})
+        for cat, data in assigned_profiles.items():
+            if not data:
+                continue
+            col_names = ["Household Type"] + [f"Hour_{i+1}" for i in range(len(data[0]) - 1)]
+            df = pd.DataFrame(data, columns=col_names)
+            avg_row = ["Average"] + df.iloc[:, 1:].mean().tolist()
+            df.loc[len(df)] = avg_row
+            df.to_excel(writer, sheet_name=cat, index=False)
+    print(f"File creato: {file_path}")
+
+
+def _run_sections(tasks, profiles, n_workers=n_workers):
+    """assign_section on every task, in parallel if requested (results in task order)."""
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(profiles,)) as pool:
+            return list(pool.map(_assign_section_task, tasks))
+    return [assign_section(census, residential_buildings, records, profiles, seed)
+            for census, residential_buildings, records, seed in tasks]
+
+
+def _previous_outputs():
+    """Outputs of the previous run, for the sections carried over by the incremental mode."""
+    with open(os.path.join(output_folder, "building_household_summary.json"), "r") as f:
+        building_summary = json.load(f)
+    with open(os.path.join(output_folder, "building_estimated_residents.json"), "r") as f:
+        building_estimated_residents = json.load(f)
+    return {
+        "building_summary": building_summary,
+        "building_estimated_residents": building_estimated_residents,
+        "households": HouseholdTable.read(household_table_file),
+        "profiles": open_profile_store(profile_store_file),
+    }
+
+
+def _carry_over_section(previous, census_id, building_ids):
+    """Entries of an unchanged section, taken from the previous outputs."""
+    building_summary = {}
+    building_estimated_residents = {}
+    household_summary = []
+    building_profiles = {}
+    store = previous["profiles"]
+    for building_id in building_ids:
+        summary = previous["building_summary"][str(building_id)]
+        building_summary[str(building_id)] = summary
+        building_estimated_residents[str(building_id)] = previous["building_estimated_residents"][str(building_id)]
+        for hh_type in HOUSEHOLD_TYPES:
+            count = summary[summary_types[hh_type]]["Average"]
+            if count:
+                household_summary.append({
                     "Building_ID": building_id,
                     "Census_Section": census_id,
                     "Household_Type": hh_type,
                     "Count": count
                 })
+        if building_id in store["rows"]:
+            rows = store["rows"][building_id]
+            building_profiles[building_id] = (np.array(store["columns"]["household_type"][rows]),
+                                              np.array(store["columns"]["profile_idx"][rows]))
+    return {
+        "building_summary": building_summary,
+        "building_estimated_residents": building_estimated_residents,
+        "households": previous["households"].subset(building_ids),
+        "household_summary": household_summary,
+        "building_profiles": building_profiles,
+    }
 
-            # Numero membri per tipo
-            hh_resident_counts = {
-                "single_worker": 1,
-                "single_retired": 1,
-                "couple_workers": 2,
-                "couple_retired": 2,
-                "families_3comp": 3,
-                "families_4ormore": 4
-            }
 
-            #Add this mapping
-            hh_type_mapping = {
-                "1_comp_work": "single_worker",
-                "1_comp_ret": "single_retired",
-                "2_comp_work": "couple_workers",
-                "2_comp_ret": "couple_retired",
-                "3_comp": "families_3comp",
-                "4_comp_more": "families_4ormore"
+def assign_households_to_residential_buildings(census_sections, building_data, building_index, profiles,
+                                               master_seed=master_seed, n_workers=n_workers,
+                                               write_building_xlsx=write_building_xlsx,
+                                               incremental=incremental, report=None):
+    report = report or RunReport("assignment", track_memory=False)
+    # --- One task per census section with residents and residential buildings ---
+    tasks = [(census, residential_buildings, records, section_seed(master_seed, census["SEZ21"]))
+             for census, residential_buildings, records
+             in section_tasks(census_sections, building_data, building_index)]
+
+    # --- Fingerprint of every section: what it depends on, including the run settings ---
+    n_profiles = ([min(profiles[cat][hh_type].shape[1] for cat in profile_files) for hh_type in HOUSEHOLD_TYPES]
+                  if random_profile_columns else None)
+    fingerprints = {census["SEZ21"]: section_fingerprint(census, records, master_seed,
+                                                         section_consistent_levels, n_profiles)
+                    for census, _, records, _ in tasks}
+    outputs = [os.path.join(output_folder, "building_household_summary.json"),
+               os.path.join(output_folder, "building_estimated_residents.json"),
+               household_table_file, profile_store_file]
+    manifest = {}
+    if incremental and all(os.path.exists(path) for path in outputs):
+        manifest = load_manifest(section_manifest_file)
+    changed, removed = changed_sections(manifest, fingerprints)
+    if manifest:
+        print(f"Incremental run: {len(changed)} census sections changed, {len(removed)} removed, "
+              f"{len(tasks) - len(changed)} unchanged")
+
+    # --- Run the changed sections, in parallel if requested ---
+    # results keyed by the section of each task: changed_sections has its own order
+    changed_set = set(changed)
+    changed_tasks = [task for task in tasks if task[0]["SEZ21"] in changed_set]
+    with report.stage("assign_sections"):
+        results = {task[0]["SEZ21"]: section
+                   for task, section in zip(changed_tasks, _run_sections(changed_tasks, profiles, n_workers))}
+    with report.stage("previous_outputs"):
+        previous = _previous_outputs() if len(results) < len(tasks) else None
+
+    # --- Deterministic merge, in census order (unchanged sections from the previous outputs) ---
+    building_summary = {}
+    building_estimated_residents = {}
+    household_tables = []
+    building_household_summary = []
+    building_profiles = {}
+    new_manifest = {}
+    for census, _, records, _ in tasks:
+        census_id = census["SEZ21"]
+        if census_id in results:
+            section = results[census_id]
+        else:
+            section = _carry_over_section(previous, census_id, manifest[str(census_id)]["buildings"])
+        building_summary.update({str(bid): summary for bid, summary in section["building_summary"].items()})
+        building_estimated_residents.update({str(bid): residents for bid, residents
+                                             in section["building_estimated_residents"].items()})
+        household_tables.append(section["households"])
+        building_household_summary.extend(section["household_summary"])
+        building_profiles.update(section["building_profiles"])
+        new_manifest[str(census_id)] = section_entry(fingerprints[census_id], records)
+        report.section(census_id, status="assigned" if census_id in results else "carried_over",
+                       **section_counters(section))
+
+    # ---- HOURLY PROFILES: one columnar file, per-building Excel only on request ----
+    with report.stage("profile_store"):
+        write_profile_store(profile_store_file, building_profiles, profiles)
+        print(f"✅ Saved household profiles to {profile_store_file}")
+    if write_building_xlsx:
+        with report.stage("building_xlsx"):
+            for section in results.values():
+                for building_id, (building_types, building_profile_idx) in section["building_profiles"].items():
+                    save_building_profiles(building_id, building_types, building_profile_idx, profiles)
+    if write_cea_schedules:
+        with report.stage("cea_schedules"):
+            building_ids, categories, cube = assignment_average_cube(building_profiles, profiles,
+                                                                     weighted=cea_weighted_average)
+            written, unchanged = write_district_schedules(cea_schedule_folder, building_ids.tolist(),
+                                                          categories, cube)
+        print(f"✅ Saved CEA schedules to {cea_schedule_folder} ({written} written, {unchanged} unchanged)")
+
+    # ---- SAVE ONE JSON FILE AT THE END ----
+    with report.stage("summary_json"):
+        output_json_path = os.path.join(output_folder, "building_household_summary.json")
+        with open(output_json_path, "w") as f:
+            json.dump(building_summary, f, indent=2)
+        print(f"✅ Saved household summary JSON to {output_json_path}")
+
+        residents_json_path = os.path.join(output_folder, "building_estimated_residents.json")
+        with open(residents_json_path, "w") as f:
+            json.dump(building_estimated_residents, f, indent=2)
+
+    # ---- HOUSEHOLDS: binary table (sequential ids), JSON export for compatibility ----
+    with report.stage("household_table"):
+        household_table = HouseholdTable.concat(household_tables, HOUSEHOLD_TYPES, education_levels, income_levels)
+        household_table.write(household_table_file)
+    print(f"✅ Saved household table to {household_table_file}")
+
+    if write_households_json:
+        with report.stage("households_json"):
+            households_json_path = os.path.join(output_folder, "all_households_detailed.json")
+            with open(households_json_path, "w") as f:
+                json.dump(household_table.to_json_dict(), f, indent=2)
+
+        print(f"✅ Saved detailed household JSON to {households_json_path}")
+
+    save_manifest(section_manifest_file, new_manifest)
+    return building_household_summary
+
+
+def write_summary_xlsx(building_household_summary):
+    """Household_assignment_summary.xlsx in output_folder: households per type of every building."""
+    summary_df = pd.DataFrame(building_household_summary)
+    pivot_df = summary_df.pivot_table(
+        index=["Census_Section", "Building_ID"],
+        columns="Household_Type",
+        values="Count",
+        aggfunc="sum",
+        fill_value=0
+    ).reset_index()
+
+    pivot_df = pivot_df.sort_values(by=["Census_Section", "Building_ID"])
+    summary_file_path = os.path.join(output_folder, "Household_assignment_summary.xlsx")
+    pivot_df.to_excel(summary_file_path, index=False)
+    return summary_file_path
+
+
+def run_realization(sections, profiles, realization, master_seed=master_seed):
+    """One realization of the ensemble, reduced to arrays over the buildings of `sections`.
+
+    Returns ({name: array}, {name: level names}): households per type, occupied residents,
+    education and income counts and mean hourly profile of every category.
+    """
+    hours = profiles[next(iter(profiles))][HOUSEHOLD_TYPES[0]].shape[0]
+    no_households = (np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int32))
+    household_types, occupied, education, income = [], [], [], []
+    mean_profiles = {cat: [] for cat in profiles}
+    for census, residential_buildings, records in sections:
+        section = assign_section(census, residential_buildings, records, profiles,
+                                 section_seed(master_seed, census["SEZ21"], realization))
+        for building in residential_buildings:
+            building_id = building["ID"]
+            summary = section["building_summary"][building_id]
+            residents = section["building_estimated_residents"][building_id]
+            household_types.append([summary[summary_types[t]]["Average"] for t in HOUSEHOLD_TYPES])
+            occupied.append(residents["occupied"])
+            education.append(list(residents["education"].values()))
+            income.append(list(residents["income"].values()))
+
+            types, profile_idx = section["building_profiles"].get(building_id, no_households)
+            for cat, category_profiles in profiles.items():
+                mean_profiles[cat].append(
+                    household_profile_matrix(types, profile_idx, category_profiles).mean(axis=0)
+                    if len(types) else np.zeros(hours))
+
+    # (buildings x levels) shapes also without buildings
+    arrays = {
+        "household_types": np.array(household_types).reshape(-1, len(HOUSEHOLD_TYPES)),
+        "occupied": np.array(occupied),
+        "education": np.array(education).reshape(-1, len(education_levels)),
+        "income": np.array(income).reshape(-1, len(income_levels)),
+    }
+    for cat, rows in mean_profiles.items():
+        arrays[f"profile/{cat}"] = np.array(rows).reshape(-1, hours)
+    names = {
+        "household_types": list(HOUSEHOLD_TYPES),
+        "education": list(education_levels),
+        "income": list(income_levels),
+    }
+    return arrays, names
+
+
+def run_ensemble(census_sections, building_data, building_index, profiles, n_realizations,
+                 master_seed=master_seed, n_workers=n_workers):
+    """Run n_realizations of the assignment and save the per-building ensemble statistics.
+
+    Realizations are reduced as they arrive (running mean/variance, quantile reservoir),
+    and submitted to the worker pool a few at a time, so memory does not grow with N.
+    """
+    sections = section_tasks(census_sections, building_data, building_index)
+    building_ids = [building["ID"] for _, residential_buildings, _ in sections
+                    for building in residential_buildings]
+    stats = EnsembleStats(reservoir_size=ensemble_reservoir, seed=master_seed,
+                          quantile_names=ensemble_quantile_arrays)
+
+    names = {}
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(profiles, sections)) as pool:
+            for first in range(0, n_realizations, 2 * n_workers):
+                batch = range(first, min(first + 2 * n_workers, n_realizations))
+                for arrays, names in pool.map(_realization_task, [(r, master_seed) for r in batch]):
+                    stats.update(arrays)
+                print(f"realizations: {batch.stop}/{n_realizations}")
+    else:
+        for realization in range(n_realizations):
+            arrays, names = run_realization(sections, profiles, realization, master_seed)
+            stats.update(arrays)
+            print(f"realizations: {realization + 1}/{n_realizations}")
+
+    # ---- SAVE: all the statistics in one columnar file, the non-hourly ones also as JSON ----
+    summary = stats.summary()
+    columns = {"building_id": np.array(building_ids, dtype=np.int64)}
+    for name, values in summary.items():
+        for stat, array in values.items():
+            columns[f"{name}/{stat}"] = array.astype(np.float32)
+    write_columns(ensemble_store_file, columns, attrs={
+        "n_realizations": n_realizations, "master_seed": master_seed,
+        "categories": list(profiles), **names})
+    print(f"✅ Saved ensemble statistics to {ensemble_store_file}")
+
+    building_stats = {}
+    for i, building_id in enumerate(building_ids):
+        building_stats[building_id] = {}
+        for name, values in summary.items():
+            if name.startswith("profile/"):
+                continue
+            labels = names.get(name)
+            building_stats[building_id][name] = {
+                stat: (dict(zip(labels, array[i].round(3).tolist())) if labels else round(float(array[i]), 3))
+                for stat, array in values.items()
             }
+    with open(ensemble_json_file, "w") as f:
+        json.dump(building_stats, f, indent=2)
+    print(f"✅ Saved ensemble statistics JSON to {ensemble_json_file}")
+    return summary
 
-            for hh_type, num_households in building_hh_count.items():
-
-                members_per_household = hh_resident_counts.get(hh_type, 1)
-
-                mapped_type = hh_type_mapping.get(hh_type, hh_type)
-                edu_pool = household_education_detail[mapped_type]["list"].copy()
-                inc_pool = household_income_detail[mapped_type]["list"].copy()
-
-                start_idx = 0
-
-                used_ids = set()
-                while True:
-                    rand_id = random.randint(1, num_households * 1000)
-                    hh_id = f"{building_id}_{rand_id}"
-                    if hh_id not in used_ids:
-                        used_ids.add(hh_id)
-                        break
-
-                for h in range(num_households):
-
-                    hh_id = f"{building_id}_{random.randint(1, num_households*1000)}"
-
-                    hh_edu = edu_pool[start_idx:start_idx + members_per_household]
-                    hh_inc = inc_pool[start_idx:start_idx + members_per_household]
-
-                    start_idx += members_per_household
-
-                    # sicurezza nel caso di mismatch
-                    while len(hh_edu) < members_per_household:
-                        hh_edu.append("unknown_edu")
-                    while len(hh_inc) < members_per_household:
-                        hh_inc.append("below0_income")
-
-                    if members_per_household == 1:
-                        # Single resident → just a dict
-                        residents_data = {
-                            "education": hh_edu[0],
-                            "income": hh_inc[0]
-                        }
-                    else:
-                        # Multiple residents → keep list
-                        residents_data = []
-                        for i in range(members_per_household):
-                            residents_data.append({
-                                "education": hh_edu[i],
-                                "income": hh_inc[i]
-                            })
-                    hh_edu_value = hh_edu[0] if hh_edu else "unknown_edu"
-                    hh_inc_value = hh_inc[0] if hh_inc else "below0_income"
-                    # --- Assegna direttamente tutti i valori di education e income ---
-                    all_households_detailed[hh_id] = {
-                        "Building_ID": building_id,
-                        "Household_type": hh_type,
-                        "education": hh_edu_value,
-                        "income": hh_inc_value
-                    }
 
-    # ---- SAVE ONE JSON FILE AT THE END ----
-    output_json_path = os.path.join(output_folder, "building_household_summary.json")
-    with open(output_json_path, "w") as f:
-        json.dump(building_summary, f, indent=2)
-    print(f"✅ Saved household summary JSON to {output_json_path}")
+# ---- RUN PROCESS ----
+if __name__ == "__main__":
+    # Ensure output folder exists
+    os.makedirs(output_folder, exist_ok=True)
 
-    residents_json_path = os.path.join(output_folder, "building_estimated_residents.json")
-    with open(residents_json_path, "w") as f:
-        json.dump(building_estimated_residents, f, indent=2)
+    report = RunReport("Assegnazione_famiglie_income", track_memory=report_memory)
 
-    households_json_path = os.path.join(output_folder, "all_households_detailed.json")
-    with open(households_json_path, "w") as f:
-        json.dump(all_households_detailed, f, indent=2)
+    # Load census and building data
+    with report.stage("load"):
+        census_data = load_features(census_data_file)
 
-    print(f"✅ Saved detailed household JSON to {households_json_path}")
+        # only the building properties used here, as typed columns (geometry skipped)
+        building_table = load_feature_table(building_data_file)
+        building_data = feature_collection(building_table)
 
+        # SEZ21 -> residential buildings
+        building_index = build_residential_index_from_table(building_table, area_key="Area")
 
-# ---- RUN PROCESS ----
-assign_households_to_residential_buildings(census_data, building_data)
-
-summary_df = pd.DataFrame(building_household_summary)
-pivot_df = summary_df.pivot_table(
-    index=["Census_Section", "Building_ID"],
-    columns="Household_Type",
-    values="Count",
-    aggfunc="sum",
-    fill_value=0
-).reset_index()
-
-pivot_df = pivot_df.sort_values(by=["Census_Section", "Building_ID"])
-summary_file_path = os.path.join(output_folder, "Household_assignment_summary.xlsx")
-pivot_df.to_excel(summary_file_path, index=False)
-print(f"\n✅ File riepilogativo creato: {summary_file_path}")
+    # Load all profiles into a dictionary (compiled once, then loaded from the cache)
+    with report.stage("profiles"):
+        profiles = load_profile_library(profile_files, ncomp_types)
+
+    if n_realizations > 0:
+        with report.stage("ensemble"):
+            run_ensemble(census_data, building_data, building_index, profiles, n_realizations)
+    else:
+        building_household_summary = assign_households_to_residential_buildings(
+            census_data, building_data, building_index, profiles, report=report)
+
+        with report.stage("summary_xlsx"):
+            summary_file_path = write_summary_xlsx(building_household_summary)
+        print(f"\n✅ File riepilogativo creato: {summary_file_path}")
+
+    print(f"✅ Saved run report to {report.write(output_folder)}")
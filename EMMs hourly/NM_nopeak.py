@@ -3,8 +3,13 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from pathlib import Path
+import sys
 import json
 
+# moduli condivisi nella cartella principale
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from cea_cache import read_excel_cached
+
 # Upload the excel file which has the hourly values divided by building
 file_path = Path(r"C:\Users\franc\PythonProject\Bari_dataset\Elaboration REC\BAU_40%roof\VES\community_bybuilding_BAU_40%roof.xlsx")
 output_file_NM_nopeak = Path(r"C:\Users\franc\Desktop\ABM Bari\Elaboration_REC\NM_nopeak.xlsx")
@@ -25,7 +30,7 @@ is_residential = {b_id: (data["building_type"] == "1000")
     for b_id, data in building_data.items()}
 
 # === LOAD COMMUNITY PRICES ===
-df_rec = pd.read_excel(file_path, sheet_name="valutazione CER")
+df_rec = read_excel_cached(file_path, "valutazione CER")
 
 # Assumo che la colonna si chiami "Prices"
 community_prices = df_rec["Price purchase"].values
@@ -61,14 +66,14 @@ with pd.ExcelWriter(output_file_costs, engine='openpyxl') as writer:
 
 # # # NET METERING WITH 50 kW peak threshold
 # # Upload data in Excel
-df_import = pd.read_excel(file_path, sheet_name="Import_kWh")
-df_export = pd.read_excel(file_path, sheet_name="Export_kWh")
-df_consumption = pd.read_excel(file_path, sheet_name="Demand_kWh")
-df_production = pd.read_excel(file_path, sheet_name="PV_kWh")
-df_selfconsumption = pd.read_excel(file_path, sheet_name="Self_consumption_kWh")
-df_initial_costs = pd.read_excel(file_path, sheet_name="Import_costs")
-df_syst_charges = pd.read_excel(output_file_costs, sheet_name="System Access Charges")
-df_prices = pd.read_excel(output_file_costs, sheet_name="Prices")
+df_import = read_excel_cached(file_path, "Import_kWh")
+df_export = read_excel_cached(file_path, "Export_kWh")
+df_consumption = read_excel_cached(file_path, "Demand_kWh")
+df_production = read_excel_cached(file_path, "PV_kWh")
+df_selfconsumption = read_excel_cached(file_path, "Self_consumption_kWh")
+df_initial_costs = read_excel_cached(file_path, "Import_costs")
+df_syst_charges = read_excel_cached(output_file_costs, "System Access Charges")
+df_prices = read_excel_cached(output_file_costs, "Prices")
 
 df_consumption['Date'] = pd.to_datetime(df_consumption['Date'])
 df_production['Date'] = pd.to_datetime(df_production['Date'])
@@ -1,6 +1,11 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import sys
+
+# moduli condivisi nella cartella principale
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from cea_cache import read_excel_cached
 
 """script to calculate the energy and financial trend of P2P with IDP scheme for Bari district. 
 The script is based on the elaborations from CEA, stored in an excel file, which includes:
@@ -52,13 +57,13 @@ def calculate_dynamic_price(demand, generation, import_grid,
             surplus_REC, deficit_REC, surplus_REC_revenues, deficit_REC_costs)
 
 # Read valutazione CER
-initial_demand_df = pd.read_excel(community_file, sheet_name="Demand_kWh")
-initial_PV_production_df = pd.read_excel(community_file, sheet_name="PV_kWh")
-physical_selfcons_df = pd.read_excel(community_file, sheet_name="Self_consumption_kWh")
-import_df = pd.read_excel(community_file, sheet_name="Import_kWh")
-export_df = pd.read_excel(community_file, sheet_name="Export_kWh")
-import_costs_df = pd.read_excel(community_file, sheet_name="Import_costs")
-tariff_purchase_price_df = pd.read_excel(costs_file, sheet_name="Prices")
+initial_demand_df = read_excel_cached(community_file, "Demand_kWh")
+initial_PV_production_df = read_excel_cached(community_file, "PV_kWh")
+physical_selfcons_df = read_excel_cached(community_file, "Self_consumption_kWh")
+import_df = read_excel_cached(community_file, "Import_kWh")
+export_df = read_excel_cached(community_file, "Export_kWh")
+import_costs_df = read_excel_cached(community_file, "Import_costs")
+tariff_purchase_price_df = read_excel_cached(costs_file, "Prices")
 
 initial_demand_df['Date'] = pd.to_datetime(initial_demand_df['Date'])
 physical_selfcons_df['Date'] = pd.to_datetime(physical_selfcons_df['Date'])
@@ -68,7 +73,7 @@ tariff_purchase_price_df['Date'] = pd.to_datetime(tariff_purchase_price_df['Date
 # Trova l'intersezione ordinata (edifici presenti in entrambi)
 
 
-valutazione_CER_df = pd.read_excel(community_file, sheet_name="valutazione CER")
+valutazione_CER_df = read_excel_cached(community_file, "valutazione CER")
 valutazione_CER_df['Date'] = pd.to_datetime(valutazione_CER_df['Date'])
 #valutazione_CER_df.reset_index('Date', inplace=True)
 
@@ -1,6 +1,11 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import sys
+
+# moduli condivisi nella cartella principale
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from cea_cache import read_excel_cached
 
 #name_scenario = "Retrofit_II_0.20PV"
 
@@ -27,11 +32,11 @@ costs_file = Path(r"C:\Users\franc\PythonProject\Bari_dataset\Elaboration REC\Bu
 # Lettura fogli necessari
 # =========================
 
-valutazione_CER_df = pd.read_excel(community_file, sheet_name="valutazione CER")
-demand_df = pd.read_excel(community_file, sheet_name="Demand_kWh")
-import_df = pd.read_excel(community_file, sheet_name="Import_kWh")
-export_df = pd.read_excel(community_file, sheet_name="Export_kWh")
-tariff_df = pd.read_excel(costs_file, sheet_name="Prices")
+valutazione_CER_df = read_excel_cached(community_file, "valutazione CER")
+demand_df = read_excel_cached(community_file, "Demand_kWh")
+import_df = read_excel_cached(community_file, "Import_kWh")
+export_df = read_excel_cached(community_file, "Export_kWh")
+tariff_df = read_excel_cached(costs_file, "Prices")
 
 
 # Lista edifici (tutte le colonne tranne Date)
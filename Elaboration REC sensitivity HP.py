@@ -1,9 +1,12 @@
 from pathlib import Path
-import os
-import glob
 import pandas as pd
 import numpy as np
 
+from cea_cache import load_cached_frame
+from cea_io import find_date_column
+from arera_calendar import hourly_prices, time_frame
+from rec_flows import frame_flows
+
 # =========================
 # CONFIG
 # =========================
@@ -34,105 +37,23 @@ community_file = output_folder_community / f"community_{name_scenario}_HPcompare
 # FUNZIONI
 # =========================
 def load_demand(demand_folder: Path):
-    """Legge i file B*.csv e restituisce demand_final_df (Date + col per edificio) e building_ids."""
-    csv_files = sorted(glob.glob(os.path.join(str(demand_folder), "B*.csv")))
-    if not csv_files:
-        raise FileNotFoundError(f"Nessun file B*.csv trovato in: {demand_folder}")
-
-    dfs = []
-    building_ids = []
-
-    for i, file in enumerate(csv_files):
-        df = pd.read_csv(file)
-
-        building_id = os.path.splitext(os.path.basename(file))[0]  # es. B123
-        building_ids.append(building_id)
-
-        # Colonna di domanda (come nel tuo script originale)
-        temp_df = df[["GRID_kWh"]].copy()
-        temp_df.rename(columns={"GRID_kWh": building_id}, inplace=True)
-
-        if i == 0:
-            # Nel demand è 'DATE' (ma se fosse 'Date', fallback)
-            date_col = "DATE" if "DATE" in df.columns else "Date"
-            temp_df.insert(0, "Date", df[date_col])
-
-        dfs.append(temp_df)
-
-    final_df = pd.concat(dfs, axis=1)
-    final_df = final_df.loc[:, ~final_df.columns.duplicated()]
-    final_df["Date"] = pd.to_datetime(final_df["Date"])
-    return final_df, building_ids
+    """Legge GRID_kWh dei file B*.csv e restituisce demand_final_df (Date + col per edificio) e building_ids.
+    La colonna data può essere DATE o Date."""
+    return load_cached_frame(demand_folder, "GRID_kWh", date_column=find_date_column(demand_folder))
 
 
 def load_pv(pv_folder: Path, building_ids):
-    """Legge i file PV B*_PV.csv e restituisce radiation_final_df (Date + col per edificio) allineato ai building_ids."""
-    csv_files = sorted(glob.glob(os.path.join(str(pv_folder), "B*_PV.csv")))
-    if not csv_files:
-        raise FileNotFoundError(f"Nessun file B*_PV.csv trovato in: {pv_folder}")
-
-    dfs = []
-    seen_buildings = set()
-
-    for i, file in enumerate(csv_files):
-        df = pd.read_csv(file)
-
-        filename = os.path.splitext(os.path.basename(file))[0]  # es. B123_PV
-        bld = filename.split("_")[0]  # es. B123
-        seen_buildings.add(bld)
-
-        temp_df = df[["E_PV_gen_kWh"]].copy()
-        temp_df.rename(columns={"E_PV_gen_kWh": bld}, inplace=True)
-
-        if i == 0:
-            # In PV è 'Date'
-            temp_df.insert(0, "Date", df["Date"])
-
-        dfs.append(temp_df)
-
-    final_df = pd.concat(dfs, axis=1)
-    final_df = final_df.loc[:, ~final_df.columns.duplicated()]
-    final_df["Date"] = pd.to_datetime(final_df["Date"]).dt.tz_localize(None)
-
-    # Assicura stesse colonne (Date + building_ids).
-    # Se mancano edifici nella PV, li aggiunge a 0.
-    for b in building_ids:
-        if b not in final_df.columns:
-            final_df[b] = 0.0
-
-    final_df = final_df[["Date"] + building_ids]
-    return final_df
+    """Legge i file PV B*_PV.csv e restituisce radiation_final_df (Date + col per edificio) allineato ai building_ids.
+    Se mancano edifici nella PV, li aggiunge a 0."""
+    radiation_final_df, _ = load_cached_frame(pv_folder, "E_PV_gen_kWh", pattern="B*_PV.csv", date_column="Date",
+                                              building_ids=building_ids, fill_missing=True)
+    return radiation_final_df
 
 
 def build_time_price_df():
     """Crea df_time per 2016 (8760h), timeband e prezzi."""
-    datetime_index = pd.date_range(start="2016-01-01", periods=8760, freq="h")
-
-    df_time = pd.DataFrame({
-        "Date": datetime_index,
-        "Month": datetime_index.month,
-        "Day": datetime_index.day,
-        "Hour": datetime_index.hour,
-        "Day type": datetime_index.dayofweek.map(lambda x: "Weekday" if x < 5 else ("Saturday" if x == 5 else "Sunday"))
-    })
-
-    def classify_timeband(row):
-        if row["Day type"] == "Weekday":
-            if 8 <= row["Hour"] < 19:
-                return "F1"
-            elif (7 <= row["Hour"] < 8) or (19 <= row["Hour"] < 23):
-                return "F2"
-            else:
-                return "F3"
-        elif row["Day type"] == "Saturday":
-            if 7 <= row["Hour"] < 23:
-                return "F2"
-            else:
-                return "F3"
-        else:
-            return "F3"
-
-    df_time["Hourly timeband"] = df_time.apply(classify_timeband, axis=1)
+    # fasce F1/F2/F3 ARERA, festività nazionali in F3 (vedi arera_calendar.py)
+    df_time = time_frame("2016-01-01", periods=8760)
 
     price_surplus_dict = {
         (1, "F1"): 0.10085, (2, "F1"): 0.08504, (3, "F1"): 0.08369, (4, "F1"): 0.07386, (5, "F1"): 0.08233,
@@ -145,10 +66,7 @@ def build_time_price_df():
         (6, "F3"): 0.07438, (7, "F3"): 0.10019, (8, "F3"): 0.11625, (9, "F3"): 0.08511, (10, "F3"): 0.09625,
         (11, "F3"): 0.10931, (12, "F3"): 0.10954,
     }
-    df_time["Price surplus"] = df_time.apply(
-        lambda row: price_surplus_dict.get((row["Month"], row["Hourly timeband"]), 0),
-        axis=1
-    )
+    df_time["Price surplus"] = hourly_prices(df_time["Date"], price_surplus_dict)
 
     price_purchase_dict = {
         (1, "F1"): 0.38, (2, "F1"): 0.36, (3, "F1"): 0.34, (4, "F1"): 0.39, (5, "F1"): 0.34, (6, "F1"): 0.35,
@@ -158,43 +76,17 @@ def build_time_price_df():
         (1, "F3"): 0.38, (2, "F3"): 0.36, (3, "F3"): 0.34, (4, "F3"): 0.39, (5, "F3"): 0.34, (6, "F3"): 0.35,
         (7, "F3"): 0.35, (8, "F3"): 0.35, (9, "F3"): 0.36, (10, "F3"): 0.37, (11, "F3"): 0.35, (12, "F3"): 0.38,
     }
-    df_time["Price purchase"] = df_time.apply(
-        lambda row: price_purchase_dict.get((row["Month"], row["Hourly timeband"]), 0),
-        axis=1
-    )
+    df_time["Price purchase"] = hourly_prices(df_time["Date"], price_purchase_dict)
 
     return df_time
 
 
 def compute_hourly_flows(demand_final_df, radiation_final_df, building_ids):
-    """Calcola self-consumption, import, export per edificio (DataFrame con Date + building_ids)."""
-    merged_df = pd.merge(
-        demand_final_df[["Date"] + building_ids],
-        radiation_final_df[["Date"] + building_ids],
-        on="Date",
-        suffixes=("_demand", "_PV")
-    )
-
-    sc_dict = {"Date": merged_df["Date"]}
-    import_dict = {"Date": merged_df["Date"]}
-    export_dict = {"Date": merged_df["Date"]}
-
-    for b in building_ids:
-        demand_series = merged_df[f"{b}_demand"].to_numpy()
-        pv_series = merged_df[f"{b}_PV"].to_numpy()
-
-        self_consumption = np.where(pv_series > 0, np.minimum(demand_series, pv_series), 0.0)
-        imp = np.where(demand_series > pv_series, demand_series - pv_series, 0.0)
-        exp = np.where(demand_series < pv_series, pv_series - demand_series, 0.0)
-
-        sc_dict[b] = self_consumption
-        import_dict[b] = imp
-        export_dict[b] = exp
-
-    self_consumption_df = pd.DataFrame(sc_dict)
-    import_df = pd.DataFrame(import_dict)
-    export_df = pd.DataFrame(export_dict)
-    return self_consumption_df, import_df, export_df
+    """Calcola self-consumption, import, export per edificio (DataFrame con Date + building_ids),
+    tutti gli edifici insieme (vedi rec_flows.py)."""
+    flows = frame_flows(demand_final_df, radiation_final_df, building_ids,
+                        names=("self_consumption", "import", "export"))
+    return flows["self_consumption"], flows["import"], flows["export"]
 
 
 def compute_valutazione_CER(df_time, demand_final_df, radiation_final_df,
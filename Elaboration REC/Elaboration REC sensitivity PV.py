@@ -3,6 +3,13 @@ import os
 import pandas as pd
 import glob
 import numpy as np
+import sys
+
+# moduli condivisi nella cartella principale
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from cea_cache import load_cached_frame
+from arera_calendar import hourly_prices, time_frame
+from rec_flows import frame_flows
 
 # =========================
 # SETTINGS
@@ -24,30 +31,8 @@ community_file = output_folder_community / f"community_{name_scenario}_sensitivi
 # =========================
 # 1) DEMAND (ONCE)
 # =========================
-csv_files_demand = glob.glob(str(demand_folder / "B*.csv"))
-if not csv_files_demand:
-    raise FileNotFoundError(f"Nessun file B*.csv trovato in demand_folder: {demand_folder}")
-
-dfs_demand = []
-building_ids = []
-
-for i, file in enumerate(sorted(csv_files_demand)):
-    df = pd.read_csv(file)
-
-    building_id = os.path.splitext(os.path.basename(file))[0]
-    building_ids.append(building_id)
-
-    temp_df = df[['GRID_kWh']].copy()
-    temp_df.rename(columns={'GRID_kWh': building_id}, inplace=True)
-
-    if i == 0:
-        temp_df.insert(0, 'Date', df['DATE'])
-
-    dfs_demand.append(temp_df)
-
-final_df_demand = pd.concat(dfs_demand, axis=1)
-demand_final_df = final_df_demand.loc[:, ~final_df_demand.columns.duplicated()].copy()
-demand_final_df['Date'] = pd.to_datetime(demand_final_df['Date'])
+# solo GRID_kWh di ogni file, edifici ordinati per ID (vedi cea_cache.py)
+demand_final_df, building_ids = load_cached_frame(demand_folder, "GRID_kWh")
 
 ordered_columns = ['Date'] + building_ids
 demand_final_df = demand_final_df[ordered_columns]
@@ -55,35 +40,8 @@ demand_final_df = demand_final_df[ordered_columns]
 # =========================
 # 2) TIMEBANDS + PRICES (ONCE)
 # =========================
-datetime_index = pd.date_range(start='2016-01-01', periods=8760, freq='h')
-
-df_time = pd.DataFrame({
-    'Date': datetime_index,
-    'Month': datetime_index.month,
-    'Day': datetime_index.day,
-    'Hour': datetime_index.hour,
-    'Day type': datetime_index.dayofweek.map(
-        lambda x: 'Weekday' if x < 5 else ('Saturday' if x == 5 else 'Sunday')
-    )
-})
-
-def classify_timeband(row):
-    if row['Day type'] == 'Weekday':
-        if 8 <= row['Hour'] < 19:
-            return 'F1'
-        elif (7 <= row['Hour'] < 8) or (19 <= row['Hour'] < 23):
-            return 'F2'
-        else:
-            return 'F3'
-    elif row['Day type'] == 'Saturday':
-        if 7 <= row['Hour'] < 23:
-            return 'F2'
-        else:
-            return 'F3'
-    else:
-        return 'F3'
-
-df_time['Hourly timeband'] = df_time.apply(classify_timeband, axis=1)
+# fasce F1/F2/F3 ARERA, festività nazionali in F3 (vedi arera_calendar.py)
+df_time = time_frame('2016-01-01', periods=8760)
 
 price_surplus_dict = {
     (1, 'F1'): 0.10085, (2, 'F1'): 0.08504, (3, 'F1'): 0.08369, (4, 'F1'): 0.07386, (5, 'F1'): 0.08233,
@@ -96,9 +54,7 @@ price_surplus_dict = {
     (6, 'F3'): 0.07438, (7, 'F3'): 0.10019, (8, 'F3'): 0.11625, (9, 'F3'): 0.08511, (10, 'F3'): 0.09625,
     (11, 'F3'): 0.10931, (12, 'F3'): 0.10954,
 }
-df_time['Price surplus'] = df_time.apply(
-    lambda row: price_surplus_dict.get((row['Month'], row['Hourly timeband']), 0), axis=1
-)
+df_time['Price surplus'] = hourly_prices(df_time['Date'], price_surplus_dict)
 
 price_purchase_dict = {
     (1, 'F1'): 0.38, (2, 'F1'): 0.36, (3, 'F1'): 0.34, (4, 'F1'): 0.39, (5, 'F1'): 0.34, (6, 'F1'): 0.35,
@@ -108,9 +64,7 @@ price_purchase_dict = {
     (1, 'F3'): 0.38, (2, 'F3'): 0.36, (3, 'F3'): 0.34, (4, 'F3'): 0.39, (5, 'F3'): 0.34, (6, 'F3'): 0.35,
     (7, 'F3'): 0.35, (8, 'F3'): 0.35, (9, 'F3'): 0.36, (10, 'F3'): 0.37, (11, 'F3'): 0.35, (12, 'F3'): 0.38,
 }
-df_time['Price purchase'] = df_time.apply(
-    lambda row: price_purchase_dict.get((row['Month'], row['Hourly timeband']), 0), axis=1
-)
+df_time['Price purchase'] = hourly_prices(df_time['Date'], price_purchase_dict)
 
 # Base valutazione (non dipende dal PV)
 valutazione_base = pd.DataFrame({
@@ -142,58 +96,19 @@ with pd.ExcelWriter(community_file) as writer:
             print(f"ATTENZIONE: nessun file PV trovato per PV{pv_n} in {radiation_folder}. Foglio saltato.")
             continue
 
-        # --- Read PV files for this technology ---
-        pv_map = {}
-        date_series = None
-
-        for i, file in enumerate(sorted(csv_files_radiation)):
-            df = pd.read_csv(file)
-
-            filename = os.path.splitext(os.path.basename(file))[0]
-            building_id = filename.split('_')[0]
-
-            # First file provides Date
-            if date_series is None:
-                date_series = pd.to_datetime(df['Date']).dt.tz_localize(None)
-
-            pv_map[building_id] = df['E_PV_gen_kWh'].values
-
-        # Build PV dataframe with ALL buildings; missing -> 0
-        radiation_final_df = pd.DataFrame({'Date': date_series})
-        for b in building_ids:
-            if b in pv_map:
-                radiation_final_df[b] = pv_map[b]
-            else:
-                radiation_final_df[b] = 0.0
+        # --- Read PV files for this technology (all buildings, missing -> 0) ---
+        radiation_final_df, _ = load_cached_frame(radiation_folder, "E_PV_gen_kWh", pattern="B*_PV.csv",
+                                                  date_column="Date", building_ids=building_ids,
+                                                  fill_missing=True)
 
         radiation_final_df = radiation_final_df[ordered_columns]
 
-        # Merge demand + PV on Date
-        merged_df = pd.merge(
-            demand_final_df, radiation_final_df, on='Date',
-            suffixes=('_demand', '_PV')
-        )
-
-        # --- Per-building computations (vectorized via loop) ---
-        sc_dict = {'Date': merged_df['Date']}
-        imp_dict = {'Date': merged_df['Date']}
-        exp_dict = {'Date': merged_df['Date']}
-
-        for b in building_ids:
-            demand_series = merged_df[f"{b}_demand"].to_numpy()
-            pv_series = merged_df[f"{b}_PV"].to_numpy()
-
-            sc = np.where(pv_series > 0, np.minimum(demand_series, pv_series), 0.0)
-            imp = np.where(demand_series > pv_series, demand_series - pv_series, 0.0)
-            exp = np.where(demand_series < pv_series, pv_series - demand_series, 0.0)
-
-            sc_dict[b] = sc
-            imp_dict[b] = imp
-            exp_dict[b] = exp
-
-        self_consumption_df = pd.DataFrame(sc_dict)
-        import_df = pd.DataFrame(imp_dict)
-        export_df = pd.DataFrame(exp_dict)
+        # --- Per-building flows, all the buildings at once (vedi rec_flows.py) ---
+        flows = frame_flows(demand_final_df, radiation_final_df, building_ids,
+                            names=("self_consumption", "import", "export"))
+        self_consumption_df = flows["self_consumption"]
+        import_df = flows["import"]
+        export_df = flows["export"]
 
         # --- Valutazione CER for this PV technology ---
         valutazione_CER_df = valutazione_base.copy()
@@ -5,6 +5,13 @@ import glob
 from datetime import datetime, timedelta
 import numpy as np
 import json
+import sys
+
+# moduli condivisi nella cartella principale
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from cea_cache import load_cached_frame
+from arera_calendar import hourly_prices, time_frame
+from rec_flows import frame_flows
 
 name_scenario = "BAU_40%roof"
 
@@ -25,37 +32,8 @@ community_file = (output_folder_community /
                   f"community_bybuilding_{name_scenario}.xlsx")
 
 ### Demand ###
-csv_files_demand = glob.glob(os.path.join(demand_folder, 'B*.csv'))
-dfs_demand = []
-building_ids = []
-
-# Variabile per salvare la colonna DATE (la prendiamo dal primo file)
-date_column = None
-
-# Leggiamo tutti i file di demand
-for i, file in enumerate(csv_files_demand):
-    df = pd.read_csv(file)
-
-    # Estrai il nome dell'edificio dal nome del file
-    building_id = os.path.splitext(os.path.basename(file))[0]
-    building_ids.append(building_id)
-
-    # Prendi solo la colonna E_sys_kWh e rinominala con il building_id
-    temp_df = df[['GRID_kWh']].copy()
-    temp_df.rename(columns={'GRID_kWh': building_id}, inplace=True)
-
-    # Alla prima iterazione prendiamo anche la colonna DATE
-    if i == 0:
-        temp_df.insert(0, 'Date', df['DATE'])
-
-    dfs_demand.append(temp_df)
-
-# Ora uniamo tutti i DataFrame sulle colonne
-final_df_demand = pd.concat(dfs_demand, axis=1)
-# Rimuoviamo eventuali colonne duplicate di DATE (per sicurezza)
-demand_final_df = final_df_demand.loc[:, ~final_df_demand.columns.duplicated()]
-demand_final_df['Date'] = pd.to_datetime(demand_final_df['Date'])
-
+# solo GRID_kWh di ogni file, edifici ordinati per ID (vedi cea_cache.py)
+demand_final_df, building_ids = load_cached_frame(demand_folder, "GRID_kWh")
 
 ### PV Generation ###
 csv_files_radiation = glob.glob(os.path.join(radiation_folder, 'B*_radiation.csv'))
@@ -133,73 +111,19 @@ ordered_columns = ['Date'] + building_ids
 demand_final_df = demand_final_df[ordered_columns]
 radiation_final_df = radiation_final_df[ordered_columns]
 
-# Facciamo un merge per essere sicuri che siano allineati sulle date
-merged_df = pd.merge(demand_final_df, radiation_final_df, on='Date', suffixes=('_demand', '_PV'))
-
-# Creiamo un dizionario per raccogliere tutte le serie
-self_consumption_dict = {'Date': merged_df['Date']}
-SCI_dict = {'Date': merged_df['Date']}
-SSI_dict = {'Date': merged_df['Date']}
-import_kWh_dict = {'Date': merged_df['Date']}
-export_kWh_dict = {'Date': merged_df['Date']}
-
-# Per ogni edificio
-for col in demand_final_df.columns:
-    if col != 'Date':  # saltiamo la colonna Date
-        demand_series = merged_df[f"{col}_demand"]
-        pv_series = merged_df[f"{col}_PV"]
-
-        # Calcolo autoconsumo orario
-        self_consumption = np.where(pv_series > 0, np.minimum(demand_series, pv_series), 0)
-        SCI = np.where(pv_series > 0, self_consumption/pv_series, 0)
-        SSI = np.where(pv_series > 0, self_consumption/demand_series, 0)
-        import_kWh = np.where(demand_series > pv_series, demand_series - pv_series, 0)
-        export_kWh = np.where(demand_series < pv_series, pv_series - demand_series, 0)
-
-        # Aggiungiamo al dizionario
-        self_consumption_dict[col] = self_consumption
-        SCI_dict[col] = SCI
-        SSI_dict[col] = SSI
-        import_kWh_dict[col] = import_kWh
-        export_kWh_dict[col] = export_kWh
-
-# Ora creiamo il dataframe tutto in una volta (veloce e senza frammentazione)
-self_consumption_df = pd.DataFrame(self_consumption_dict)
-SCI_df = pd.DataFrame(SCI_dict)
-SSI_df = pd.DataFrame(SSI_dict)
-import_df = pd.DataFrame(import_kWh_dict)
-export_df = pd.DataFrame(export_kWh_dict)
+# Flussi orari di tutti gli edifici in un solo passaggio sulle matrici, allineati sulle
+# date come il vecchio merge (vedi rec_flows.py)
+flows = frame_flows(demand_final_df, radiation_final_df, building_ids)
+self_consumption_df = flows["self_consumption"]
+SCI_df = flows["SCI"]
+SSI_df = flows["SSI"]
+import_df = flows["import"]
+export_df = flows["export"]
 
 
 ### Valutazione REC ###
-datetime_index = pd.date_range(start='2016-01-01', periods=8760, freq='h')
-
-df_time = pd.DataFrame({
-    'Date': datetime_index,
-    'Month': datetime_index.month,
-    'Day': datetime_index.day,
-    'Hour': datetime_index.hour,
-    'Day type': datetime_index.dayofweek.map(lambda x: 'Weekday' if x < 5 else ('Saturday' if x == 5 else 'Sunday'))
-})
-
-# Definire le fasce orarie
-def classify_timeband(row):
-    if row['Day type'] == 'Weekday':
-        if 8 <= row['Hour'] < 19:
-            return 'F1'
-        elif (7 <= row['Hour'] < 8) or (19 <= row['Hour'] < 23):
-            return 'F2'
-        else:
-            return 'F3'
-    elif row['Day type'] == 'Saturday':
-        if 7 <= row['Hour'] < 23:
-            return 'F2'
-        else:
-            return 'F3'
-    else:  # Sunday
-        return 'F3'
-
-df_time['Hourly timeband'] = df_time.apply(classify_timeband, axis=1)
+# fasce F1/F2/F3 ARERA, festività nazionali in F3 (vedi arera_calendar.py)
+df_time = time_frame('2016-01-01', periods=8760)
 
 # Prezzi surplus
 price_surplus_dict = {
@@ -214,7 +138,7 @@ price_surplus_dict = {
     (11, 'F3'): 0.10931, (12, 'F3'): 0.10954,
 }
 
-df_time['Price surplus'] = df_time.apply(lambda row: price_surplus_dict.get((row['Month'], row['Hourly timeband']), 0), axis=1)
+df_time['Price surplus'] = hourly_prices(df_time['Date'], price_surplus_dict)
 
 # Prezzi acquisto
 # price_purchase_dict = {
@@ -235,7 +159,7 @@ price_purchase_dict = {
     (7, 'F3'): 0.35, (8, 'F3'): 0.35, (9, 'F3'): 0.36, (10, 'F3'): 0.37, (11, 'F3'): 0.35, (12, 'F3'): 0.38,
 }
 
-df_time['Price purchase'] = df_time.apply(lambda row: price_purchase_dict.get((row['Month'], row['Hourly timeband']), 0), axis=1)
+df_time['Price purchase'] = hourly_prices(df_time['Date'], price_purchase_dict)
 
 ### Prices_purchase (versione ottimizzata) ###
 # Crea un DataFrame in un unico passaggio
@@ -1,10 +1,14 @@
 from pathlib import Path
-import os
 import pandas as pd
-import glob
 from datetime import datetime, timedelta
 import numpy as np
 import json
+import sys
+
+# moduli condivisi nella cartella principale
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from cea_cache import load_cached_frames
+from arera_calendar import hourly_prices, time_frame
 
 name_scenario = "Retrofit_II_prova"
 
@@ -24,108 +28,17 @@ output_folder_community.mkdir(parents=True, exist_ok=True)
 community_file = (output_folder_community /
                   f"community_bybuilding_{name_scenario}_NG_stochastic.xlsx")
 
-### Demand heating ###
-csv_files_demand = glob.glob(os.path.join(demand_folder, 'B*.csv'))
-dfs_demand_NG_heating = []
-building_ids = []
-
-# Variabile per salvare la colonna DATE (la prendiamo dal primo file)
-date_column = None
-
-# Leggiamo tutti i file di demand
-for i, file in enumerate(csv_files_demand):
-    df = pd.read_csv(file)
-
-    # Estrai il nome dell'edificio dal nome del file
-    building_id = os.path.splitext(os.path.basename(file))[0]
-    building_ids.append(building_id)
-
-    # Prendi solo la colonna E_sys_kWh e rinominala con il building_id
-    temp_df = df[['NG_hs_kWh']].copy()
-    temp_df.rename(columns={'NG_hs_kWh': building_id}, inplace=True)
-
-    # Alla prima iterazione prendiamo anche la colonna DATE
-    if i == 0:
-        temp_df.insert(0, 'Date', df['DATE'])
-
-    dfs_demand_NG_heating.append(temp_df)
-
-# Ora uniamo tutti i DataFrame sulle colonne
-final_df_demand_heating = pd.concat(dfs_demand_NG_heating, axis=1)
-# Rimuoviamo eventuali colonne duplicate di DATE (per sicurezza)
-demand_heating_final_df = final_df_demand_heating.loc[:, ~final_df_demand_heating.columns.duplicated()]
-demand_heating_final_df['Date'] = pd.to_datetime(demand_heating_final_df['Date'])
-
-
-dfs_demand_NG_DHW = []
-building_ids = []
-
-# Domestic Hot Water
-date_column = None
-
-# Leggiamo tutti i file di demand
-for i, file in enumerate(csv_files_demand):
-    df = pd.read_csv(file)
-
-    # Estrai il nome dell'edificio dal nome del file
-    building_id = os.path.splitext(os.path.basename(file))[0]
-    building_ids.append(building_id)
-
-    # Prendi solo la colonna E_sys_kWh e rinominala con il building_id
-    temp_df = df[['NG_ww_kWh']].copy()
-    temp_df.rename(columns={'NG_ww_kWh': building_id}, inplace=True)
-
-    # Alla prima iterazione prendiamo anche la colonna DATE
-    if i == 0:
-        temp_df.insert(0, 'Date', df['DATE'])
-
-    dfs_demand_NG_DHW.append(temp_df)
-
-# Ora uniamo tutti i DataFrame sulle colonne
-final_df_demand_DHW = pd.concat(dfs_demand_NG_DHW, axis=1)
-# Rimuoviamo eventuali colonne duplicate di DATE (per sicurezza)
-demand_DHW_final_df = final_df_demand_DHW.loc[:, ~final_df_demand_DHW.columns.duplicated()]
-demand_DHW_final_df['Date'] = pd.to_datetime(demand_DHW_final_df['Date'])
-
-
-### Ordiniamo le Colonne ###
-ordered_columns = ['Date'] + building_ids
-demand_heating_final_df = demand_heating_final_df[ordered_columns]
-demand_DHW_final_df = demand_DHW_final_df[ordered_columns]
-
-# Facciamo un merge per essere sicuri che siano allineati sulle date
-merged_df = pd.merge(demand_heating_final_df, demand_DHW_final_df, on='Date', suffixes=('_demand', '_demand'))
+### Demand heating e Domestic Hot Water ###
+# NG_hs_kWh e NG_ww_kWh in una sola lettura di ogni file: stesse date e stessi edifici,
+# ordinati per ID (vedi cea_cache.py)
+ng_frames, building_ids = load_cached_frames(demand_folder, ["NG_hs_kWh", "NG_ww_kWh"])
+demand_heating_final_df = ng_frames["NG_hs_kWh"]
+demand_DHW_final_df = ng_frames["NG_ww_kWh"]
 
 
 ### Valutazione REC ###
-datetime_index = pd.date_range(start='2016-01-01', periods=8760, freq='h')
-
-df_time = pd.DataFrame({
-    'Date': datetime_index,
-    'Month': datetime_index.month,
-    'Day': datetime_index.day,
-    'Hour': datetime_index.hour,
-    'Day type': datetime_index.dayofweek.map(lambda x: 'Weekday' if x < 5 else ('Saturday' if x == 5 else 'Sunday'))
-})
-
-# Definire le fasce orarie
-def classify_timeband(row):
-    if row['Day type'] == 'Weekday':
-        if 8 <= row['Hour'] < 19:
-            return 'F1'
-        elif (7 <= row['Hour'] < 8) or (19 <= row['Hour'] < 23):
-            return 'F2'
-        else:
-            return 'F3'
-    elif row['Day type'] == 'Saturday':
-        if 7 <= row['Hour'] < 23:
-            return 'F2'
-        else:
-            return 'F3'
-    else:  # Sunday
-        return 'F3'
-
-df_time['Hourly timeband'] = df_time.apply(classify_timeband, axis=1)
+# fasce F1/F2/F3 ARERA, festività nazionali in F3 (vedi arera_calendar.py)
+df_time = time_frame('2016-01-01', periods=8760)
 
 # Prezzi surplus
 price_surplus_dict = {
@@ -140,7 +53,7 @@ price_surplus_dict = {
     (11, 'F3'): 0.10931, (12, 'F3'): 0.10954,
 }
 
-df_time['Price surplus'] = df_time.apply(lambda row: price_surplus_dict.get((row['Month'], row['Hourly timeband']), 0), axis=1)
+df_time['Price surplus'] = hourly_prices(df_time['Date'], price_surplus_dict)
 
 # Prezzi acquisto
 # price_purchase_dict = {
@@ -161,7 +74,7 @@ price_purchase_dict = {
     (7, 'F3'): 0.35, (8, 'F3'): 0.35, (9, 'F3'): 0.36, (10, 'F3'): 0.37, (11, 'F3'): 0.35, (12, 'F3'): 0.38,
 }
 
-df_time['Price purchase'] = df_time.apply(lambda row: price_purchase_dict.get((row['Month'], row['Hourly timeband']), 0), axis=1)
+df_time['Price purchase'] = hourly_prices(df_time['Date'], price_purchase_dict)
 
 
 # Scriviamo in Excel
@@ -0,0 +1,147 @@
+"""ARERA time bands (F1, F2, F3) of every hour and hourly prices from monthly band prices.
+
+F1: Monday to Friday 8-19; F2: Monday to Friday 7-8 and 19-23, Saturday 7-23; F3: the
+other hours, Sundays and national holidays all day. The elaboration scripts classified
+the hours of 2016 row by row (df_time.apply(classify_timeband, axis=1)), without
+holidays, and looked the prices up with two more row-wise apply over {(month, band):
+price} dicts. Here the band of every hour is one lookup in a (day type x hour) table and
+the prices one lookup in a (month x band) table, for any span of years:
+
+    df_time = time_frame("2016-01-01", periods=8760)
+    df_time["Price surplus"] = hourly_prices(df_time["Date"], price_surplus_dict)
+
+The "Day type" column of time_frame has a fourth value, "Holiday", for the national
+holidays (264 hours in 2016, labelled Weekday/Saturday/Sunday by the old df_time): pivots
+or filters on "Day type" of the REC sheets must include it. holidays=False gives the old
+labels and bands.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+band_names = ("F1", "F2", "F3")
+day_type_names = ("Weekday", "Saturday", "Sunday", "Holiday")
+
+# band code (0 F1, 1 F2, 2 F3) of each hour, per day type (holidays as Sundays)
+_weekday = [2] * 7 + [1] + [0] * 11 + [1] * 4 + [2]
+_saturday = [2] * 7 + [1] * 16 + [2]
+band_table = np.array([_weekday, _saturday, [2] * 24, [2] * 24], dtype=np.int8)
+
+# festività nazionali a data fissa (mese, giorno); Pasquetta è calcolata per ogni anno
+fixed_holidays = ((1, 1), (1, 6), (4, 25), (5, 1), (6, 2), (8, 15), (11, 1), (12, 8), (12, 25), (12, 26))
+
+
+def easter(year):
+    """Easter Sunday of a year (Gregorian calendar, anonymous algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(years):
+    """datetime64[D] array of the Italian national holidays of the years (Easter Monday included)."""
+    days = [date(year, month, day) for year in years for month, day in fixed_holidays]
+    days += [easter(year) + timedelta(days=1) for year in years]
+    return np.array(sorted(days), dtype="datetime64[D]")
+
+
+def hourly_range(start="2016-01-01", periods=8760):
+    """datetime64[h] array of consecutive hours, as pd.date_range(start, periods=periods, freq="h")."""
+    return np.datetime64(start, "h") + np.arange(periods)
+
+
+def _calendar(dates, holidays=True):
+    """(month 1-12, hour, day type code) of every hour."""
+    hours = np.asarray(dates, dtype="datetime64[h]")
+    days = hours.astype("datetime64[D]")
+    hour = (hours - days).astype(np.int64)
+    month = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    # 1970-01-01 was a Thursday: Monday = 0
+    weekday = (days.astype(np.int64) + 3) % 7
+    day_type = np.clip(weekday - 4, 0, 2).astype(np.int8)
+    if holidays and days.size:
+        first, last = days.min().astype(object).year, days.max().astype(object).year
+        day_type[np.isin(days, national_holidays(range(first, last + 1)))] = 3
+    return month, hour, day_type
+
+
+def band_codes(dates, holidays=True):
+    """Band code of every hour: 0 F1, 1 F2, 2 F3 (band_names order)."""
+    _, hour, day_type = _calendar(dates, holidays)
+    return band_table[day_type, hour]
+
+
+def price_table(prices):
+    """(12 months x 3 bands) table of a {(month, "F1"/"F2"/"F3"): price} dict, 0 where missing."""
+    table = np.zeros((12, len(band_names)))
+    for (month, band), price in prices.items():
+        table[month - 1, band_names.index(band)] = price
+    return table
+
+
+def hourly_prices(dates, prices, holidays=True):
+    """Price of every hour from monthly band prices: a (month, band) dict or a price_table."""
+    table = price_table(prices) if isinstance(prices, dict) else np.asarray(prices)
+    month, hour, day_type = _calendar(dates, holidays)
+    return table[month - 1, band_table[day_type, hour]]
+
+
+def time_frame(start="2016-01-01", periods=8760, holidays=True):
+    """df_time of the elaboration scripts: Date, Month, Day, Hour, Day type, Hourly timeband."""
+    hours = hourly_range(start, periods)
+    month, hour, day_type = _calendar(hours, holidays)
+    dates = pd.DatetimeIndex(hours.astype("datetime64[ns]"))
+    return pd.DataFrame({
+        "Date": dates,
+        "Month": month,
+        "Day": dates.day,
+        "Hour": hour,
+        "Day type": np.array(day_type_names, dtype=object)[day_type],
+        "Hourly timeband": np.array(band_names, dtype=object)[band_table[day_type, hour]],
+    })
+
+
+# ---- SELF-CHECK ----
+def _self_check():
+    """Easter dates, holiday and weekday bands, prices (python arera_calendar.py)."""
+    for year, month, day in ((2000, 4, 23), (2016, 3, 27), (2019, 4, 21), (2024, 3, 31),
+                             (2025, 4, 20), (2038, 4, 25)):
+        assert easter(year) == date(year, month, day), year
+
+    def bands(day):
+        return [band_names[code] for code in band_codes(hourly_range(day, 24))]
+
+    # Tuesday 5 January 2016: F3 0-7, F2 7-8, F1 8-19, F2 19-23, F3 23-24
+    assert bands("2016-01-05") == ["F3"] * 7 + ["F2"] + ["F1"] * 11 + ["F2"] * 4 + ["F3"]
+    # Saturday 2 January 2016: F2 7-23
+    assert bands("2016-01-02") == ["F3"] * 7 + ["F2"] * 16 + ["F3"]
+    # Sunday, Easter Monday, Liberazione (a Monday) and Epiphany (a Wednesday): all F3
+    for day in ("2016-01-03", "2016-03-28", "2016-04-25", "2016-01-06"):
+        assert bands(day) == ["F3"] * 24, day
+    # without holidays Easter Monday is a plain weekday again
+    assert band_names[band_codes(np.datetime64("2016-03-28T10"), holidays=False)] == "F1"
+
+    holidays_2016 = national_holidays([2016])
+    assert len(holidays_2016) == len(fixed_holidays) + 1
+    assert np.datetime64("2016-03-28") in holidays_2016
+
+    df_time = time_frame("2016-01-01", periods=8760)
+    assert (df_time["Day type"] == "Holiday").sum() == 24 * 11
+    assert df_time["Date"].iloc[-1] == pd.Timestamp("2016-12-30 23:00")
+
+    prices = {(month, band): month + 0.1 * k for month in range(1, 13) for k, band in enumerate(band_names)}
+    hourly = hourly_prices(df_time["Date"], prices)
+    expected = [prices[(month, band)] for month, band in zip(df_time["Month"], df_time["Hourly timeband"])]
+    assert np.allclose(hourly, expected)
+
+
+if __name__ == "__main__":
+    _self_check()
+    print("✅ arera_calendar: self-check OK")
@@ -0,0 +1,145 @@
+"""Scaling benchmark of the household assignment on synthetic districts.
+
+For every size a synthetic district is generated (synthetic_district.py) in its own
+process, then Assegnazione_famiglie_income.py itself runs on it in a fresh process: the
+same load, section_tasks / assign_section and outputs as a real run (settings of the
+script, outputs in the benchmark folder), timed by the stages of its RunReport. Inside
+the sections the resident estimate, household pool, education/income levels, building
+outputs and members are timed per section (section_phases) and added up over the district.
+The old JSON export, the CEA schedules and the per-section console lines are off, so
+they do not weigh on the large sizes. The peak RSS of the process is recorded at the end
+of every stage, so the generation is not in it and the profile loading is a stage of its
+own. Results (seconds and peak RSS per stage, seconds per phase, buildings/s) go to
+results_file.
+
+    python benchmark_assignment.py               # all the sizes
+    python benchmark_assignment.py 1000 10000    # only these sizes
+"""
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+from contextlib import contextmanager
+
+from run_report import RunReport
+
+benchmark_folder = "Data/benchmark"
+results_file = os.path.join(benchmark_folder, "benchmark_results.csv")
+sizes = (1_000, 10_000, 100_000, 1_000_000)
+seed = 2025
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class BenchmarkReport(RunReport):
+    """RunReport that also records the peak RSS of the process at the end of every stage."""
+
+    @contextmanager
+    def stage(self, name):
+        with super().stage(name):
+            yield
+        self.stages[-1]["peak_rss_mb"] = _peak_rss_mb()
+
+
+def _district_files(n_buildings):
+    folder = os.path.join(benchmark_folder, str(n_buildings))
+    return folder, os.path.join(folder, "census.json"), os.path.join(folder, "buildings.json")
+
+
+def generate_size(n_buildings):
+    """Write the synthetic district of n_buildings (run in its own process)."""
+    from synthetic_district import write_district
+
+    folder, census_file, building_file = _district_files(n_buildings)
+    os.makedirs(folder, exist_ok=True)
+    write_district(census_file, building_file, n_buildings, seed=seed)
+
+
+def run_size(n_buildings):
+    """Run the assignment script on the district of n_buildings, timed stage by stage."""
+    # imported here: the parent process only spawns the runs
+    import Assegnazione_famiglie_income as income
+    from building_index import build_residential_index_from_table
+    from geojson_stream import load_features, load_feature_table, feature_collection
+    from profile_library import load_profile_library
+
+    folder, census_file, building_file = _district_files(n_buildings)
+    # outputs of the run in the benchmark folder, never over the real ones
+    income.output_folder = folder
+    income.profile_store_file = os.path.join(folder, "household_profiles.colstore")
+    income.household_table_file = os.path.join(folder, "households.colstore")
+    income.section_manifest_file = os.path.join(folder, "section_manifest.json")
+    income.write_cea_schedules = False
+    income.write_households_json = False
+    income.print_sections = False
+
+    report = BenchmarkReport(f"benchmark_{n_buildings}", track_memory=False)
+    # same stages as the __main__ of the script
+    with report.stage("load"):
+        census_data = load_features(census_file)
+        building_table = load_feature_table(building_file)
+        building_data = feature_collection(building_table)
+        building_index = build_residential_index_from_table(building_table, area_key="Area")
+    with report.stage("profiles"):
+        profiles = load_profile_library(income.profile_files, income.ncomp_types)
+    building_household_summary = income.assign_households_to_residential_buildings(
+        census_data, building_data, building_index, profiles, master_seed=seed,
+        write_building_xlsx=False, incremental=False, report=report)
+    with report.stage("summary_xlsx"):
+        income.write_summary_xlsx(building_household_summary)
+    report.write(folder)
+
+    summary = report.summary()
+    # profile loading does not grow with the district: not in the assignment time
+    assignment_s = sum(stage["seconds"] for stage in report.stages if stage["stage"] != "profiles")
+    return {
+        "buildings": n_buildings,
+        "sections": len(summary["sections"]),
+        "households": summary["section_totals"]["households"],
+        **{f"{stage['stage']}_s": stage["seconds"] for stage in report.stages},
+        # phases inside assign_sections, over all the sections
+        **{f"{phase}_s": round(sum(section[f"{phase}_s"] or 0 for section in report.sections), 4)
+           for phase in income.section_phases},
+        "assignment_s": round(assignment_s, 4),
+        "buildings_per_s": round(n_buildings / assignment_s, 1),
+        **{f"{stage['stage']}_rss_mb": stage["peak_rss_mb"] for stage in report.stages},
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_benchmark(sizes=sizes):
+    """Generate and run every size, each step in a fresh process, and write the results table."""
+    os.makedirs(benchmark_folder, exist_ok=True)
+    results = []
+    for n_buildings in sizes:
+        subprocess.run([sys.executable, __file__, "--generate", str(n_buildings)], check=True)
+        output = subprocess.run([sys.executable, __file__, "--size", str(n_buildings)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{result['buildings']:>9} buildings: {result['assignment_s']:>8.2f} s, "
+              f"{result['buildings_per_s']:>9.1f} buildings/s, peak RSS {result['peak_rss_mb']} MB")
+
+    fieldnames = list(dict.fromkeys(key for result in results for key in result))
+    with open(results_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"✅ Benchmark results saved to {results_file}")
+    return results
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--generate"]:
+        generate_size(int(sys.argv[2]))
+    elif sys.argv[1:2] == ["--size"]:
+        # child process: the last line printed is the result
+        result = run_size(int(sys.argv[2]))
+        print(json.dumps(result))
+    else:
+        run_benchmark([int(n) for n in sys.argv[1:]] or sizes)
@@ -0,0 +1,108 @@
+"""Index SEZ21 -> residential buildings, built once when the building data is loaded.
+
+The assignment scripts used to look up the buildings of every census section with a
+list comprehension over all building_data["features"] (cost: sections x buildings).
+Here the features are scanned a single time and the residential ones are grouped by
+section into compact record arrays, so each lookup is a dictionary access.
+"""
+import time
+
+import numpy as np
+
+# residential codes of the "function" attribute
+RESIDENTIAL_FUNCTIONS = (11, 12)
+
+building_record = np.dtype([
+    ("feature", np.int64),    # position in building_data["features"]
+    ("ID", np.int64),
+    ("area", np.float64),     # footprint area (Area or Shape_Area)
+    ("nfloors", np.float64),
+])
+
+_empty_section = np.empty(0, dtype=building_record)
+
+
+def build_residential_index(building_data, area_key="Area", functions=RESIDENTIAL_FUNCTIONS):
+    """Group the residential buildings by census section in one pass over the features.
+
+    Returns {SEZ21: array of building_record}, buildings in the same order as the file.
+    """
+    features = building_data["features"]
+    sections = {}
+    for i, feature in enumerate(features):
+        b = feature["properties"]
+        if b["function"] in functions:
+            sections.setdefault(b["SEZ21"], []).append(
+                (i, b["ID"], b[area_key], b["nfloors"]))
+
+    return {census_id: np.array(rows, dtype=building_record)
+            for census_id, rows in sections.items()}
+
+
+def build_residential_index_from_table(building_table, area_key="Area", functions=RESIDENTIAL_FUNCTIONS):
+    """Same as build_residential_index, from the typed columns of geojson_stream.load_feature_table.
+
+    The "feature" field is the row of the table, i.e. the position in
+    feature_collection(building_table)["features"].
+    """
+    rows = np.flatnonzero(np.isin(building_table["function"], functions))
+    sez = building_table["SEZ21"][rows]
+    rows = rows[np.argsort(sez, kind="stable")]
+    records = np.empty(rows.size, dtype=building_record)
+    records["feature"] = rows
+    records["ID"] = building_table["ID"][rows]
+    records["area"] = building_table[area_key][rows]
+    records["nfloors"] = building_table["nfloors"][rows]
+
+    sez = building_table["SEZ21"][rows]
+    census_ids, starts = np.unique(sez, return_index=True)
+    return {census_id: section for census_id, section
+            in zip(census_ids.tolist(), np.split(records, starts[1:]))}
+
+
+def section_records(building_index, census_id):
+    """Record array of the residential buildings of a section (empty if none)."""
+    return building_index.get(census_id, _empty_section)
+
+
+def section_buildings(building_index, building_data, census_id):
+    """Properties dicts of the residential buildings of a section.
+
+    The dicts are the ones stored in building_data, so the assignment scripts can keep
+    writing "estimated_residents" & co. on them.
+    """
+    features = building_data["features"]
+    return [features[i]["properties"] for i in section_records(building_index, census_id)["feature"]]
+
+
+# ---- BENCHMARK ----
+def _benchmark(sizes=(1_000, 10_000, 100_000)):
+    """Time the path of the assignment scripts on synthetic districts (synthetic_district.py):
+    load_feature_table, build_residential_index_from_table and one lookup per section."""
+    import os
+    import tempfile
+
+    from geojson_stream import feature_collection, load_feature_table
+    from synthetic_district import write_district
+
+    print(f"{'buildings':>10} {'load [s]':>10} {'build [s]':>10} {'lookups [s]':>12} {'us/building':>12}")
+    with tempfile.TemporaryDirectory() as folder:
+        for n in sizes:
+            census_file, building_file = os.path.join(folder, "census.json"), os.path.join(folder, "buildings.json")
+            n_sections = write_district(census_file, building_file, n)
+            start = time.perf_counter()
+            building_table = load_feature_table(building_file)
+            building_data = feature_collection(building_table)
+            loaded = time.perf_counter()
+            index = build_residential_index_from_table(building_table, area_key="Area")
+            built = time.perf_counter()
+            for census_id in range(1, n_sections + 1):
+                section_records(index, census_id)
+                section_buildings(index, building_data, census_id)
+            done = time.perf_counter()
+            print(f"{n:>10} {loaded - start:>10.3f} {built - loaded:>10.3f} {done - built:>12.3f} "
+                  f"{(done - loaded) / n * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    _benchmark()
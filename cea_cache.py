@@ -0,0 +1,157 @@
+"""On-disk cache of CEA output folders and community workbooks, opened by memory map.
+
+The first run of an elaboration converts the hourly files of a CEA output folder into one
+columnar store (see columnar_store.py) under Data/cea_cache: the dates and a
+(variables x buildings x hours) cube, all the variables read in one pass over each file
+(see cea_io.read_hourly_cube). The store is keyed by folder, file pattern, date
+column and variables, and records the name, size and mtime of every file it was built
+from: when a file is added, removed or rewritten by CEA the store is built again,
+otherwise the next runs map it without parsing a single CSV.
+
+    demand_final_df, building_ids = load_cached_frame(demand_folder, "GRID_kWh")
+    ng_frames, building_ids = load_cached_frames(demand_folder, ["NG_hs_kWh", "NG_ww_kWh"])
+
+The EMM scripts read the sheets of the community workbook written by the elaborations;
+read_excel_cached keeps each sheet as a store too, keyed by workbook, sheet and stamp.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cea_io import building_files, hourly_frame, read_hourly_cube
+from columnar_store import open_columns, write_columns
+
+cache_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data", "cea_cache")
+
+
+def _cache_path(kind, key):
+    digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+    return os.path.join(cache_folder, f"{kind}_{digest}.colstore")
+
+
+def _stamp(paths):
+    """Digest of name, size and mtime of the files: changes when CEA rewrites any of them."""
+    entries = []
+    for path in sorted(paths):
+        stat = os.stat(path)
+        entries.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(json.dumps(entries).encode()).hexdigest()
+
+
+def _open_if_current(path, stamp):
+    """(columns, attrs) of a store built from files with this stamp, None otherwise."""
+    if not os.path.exists(path):
+        return None
+    try:
+        columns, attrs = open_columns(path)
+    except (ValueError, OSError):
+        return None
+    return (columns, attrs) if attrs.get("stamp") == stamp else None
+
+
+def open_scenario(folder, variables, pattern="B*.csv", date_column="DATE"):
+    """(dates, building IDs, {variable: (hours x buildings) read-only memmap}) of a folder.
+
+    All the buildings with a file, sorted by ID; built from the CSVs on the first call
+    and whenever the files change.
+    """
+    variables = list(variables)
+    files = building_files(folder, pattern)
+    if not files:
+        raise FileNotFoundError(f"Nessun file {pattern} trovato in: {folder}")
+    path = _cache_path("scenario", [os.path.abspath(str(folder)), pattern, date_column, variables])
+    stamp = _stamp(files.values())
+
+    cached = _open_if_current(path, stamp)
+    if cached is None:
+        # one pass over every file for all the variables
+        dates, building_ids, cube = read_hourly_cube(folder, variables, pattern=pattern, date_column=date_column)
+        # variables x buildings x hours on disk: the series of a building is contiguous
+        os.makedirs(cache_folder, exist_ok=True)
+        write_columns(path, {"date": dates.to_numpy(), "cube": cube.transpose(2, 1, 0)},
+                      attrs={"stamp": stamp, "folder": os.path.abspath(str(folder)),
+                             "variables": variables, "building_ids": building_ids})
+        cached = open_columns(path)
+
+    columns, attrs = cached
+    dates = pd.Series(np.array(columns["date"]), name="Date")
+    cube = columns["cube"]
+    return dates, attrs["building_ids"], {variable: cube[k].T for k, variable in enumerate(attrs["variables"])}
+
+
+def load_cached_frames(folder, columns, pattern="B*.csv", date_column="DATE", building_ids=None,
+                       fill_missing=False):
+    """({column: DataFrame Date + buildings}, building IDs) as cea_io.load_hourly_frames,
+    from the cache."""
+    dates, cached_ids, matrices = open_scenario(folder, columns, pattern, date_column)
+    if building_ids is None:
+        return {column: hourly_frame(dates, cached_ids, matrices[column]) for column in columns}, cached_ids
+
+    building_ids = list(building_ids)
+    position = {building_id: j for j, building_id in enumerate(cached_ids)}
+    missing = [building_id for building_id in building_ids if building_id not in position]
+    if missing and not fill_missing:
+        raise FileNotFoundError(f"{len(missing)} edifici senza file {pattern} in {folder}: {missing[:10]}")
+    found = [j for j, building_id in enumerate(building_ids) if building_id in position]
+    cached_columns = [position[building_ids[j]] for j in found]
+    frames = {}
+    for column in columns:
+        selected = np.zeros((len(dates), len(building_ids)), order="F")
+        selected[:, found] = matrices[column][:, cached_columns]
+        frames[column] = hourly_frame(dates, building_ids, selected)
+    return frames, building_ids
+
+
+def load_cached_frame(folder, column, **kwargs):
+    """(DataFrame Date + buildings, building IDs) as cea_io.load_hourly_frame, from the cache;
+    kwargs as load_cached_frames."""
+    frames, building_ids = load_cached_frames(folder, [column], **kwargs)
+    return frames[column], building_ids
+
+
+def _sheet_columns(df):
+    """({name: array}, {name: dtype of the text columns}) of a sheet that can be stored,
+    None if a column mixes types or has empty text cells."""
+    columns, text_dtypes = {}, {}
+    for k, name in enumerate(df.columns):
+        values = df[name]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_dtype(values):
+            columns[f"c{k}"] = values.to_numpy()
+        elif values.map(type).eq(str).all():
+            columns[f"c{k}"] = values.to_numpy().astype(str)
+            text_dtypes[f"c{k}"] = str(values.dtype)
+        else:
+            return None
+    return columns, text_dtypes
+
+
+def read_excel_cached(path, sheet_name):
+    """pd.read_excel(path, sheet_name) through the cache, rebuilt when the workbook changes.
+
+    Sheets with columns of mixed types (text and numbers) are always read from the workbook.
+    """
+    path = os.path.abspath(str(path))
+    store = _cache_path("sheet", [path, sheet_name])
+    stamp = _stamp([path])
+
+    cached = _open_if_current(store, stamp)
+    if cached is None:
+        df = pd.read_excel(path, sheet_name=sheet_name)
+        stored = _sheet_columns(df)
+        if stored is None or not all(isinstance(name, (str, int, float)) for name in df.columns):
+            return df
+        columns, text_dtypes = stored
+        os.makedirs(cache_folder, exist_ok=True)
+        write_columns(store, columns, attrs={"stamp": stamp, "names": list(df.columns),
+                                             "text_dtypes": text_dtypes})
+        cached = open_columns(store)
+
+    columns, attrs = cached
+    frame = {}
+    for k, name in enumerate(attrs["names"]):
+        values, text_dtype = columns[f"c{k}"], attrs["text_dtypes"].get(f"c{k}")
+        frame[name] = np.array(values) if text_dtype is None else pd.Series(values.astype(object)).astype(text_dtype)
+    return pd.DataFrame(frame)
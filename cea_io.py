@@ -0,0 +1,174 @@
+"""Hourly CEA results of all the buildings as (hours x buildings) matrices.
+
+The REC elaboration scripts used to pd.read_csv every B*.csv of a CEA output folder (the
+demand files have dozens of columns), keep one column, and pd.concat the per-building
+frames, once per variable. Here only the requested columns are parsed, all in one pass
+over each file (see read_columns), the files are read by a thread pool, and every building
+writes straight into its slice of a preallocated (hours x buildings x variables) cube. The
+buildings are in a fixed order: sorted by building ID, or the order given.
+
+    demand_final_df, building_ids = load_hourly_frame(demand_folder, "GRID_kWh")
+    radiation_final_df, _ = load_hourly_frame(radiation_folder, "E_PV_gen_kWh", pattern="B*_PV.csv",
+                                              date_column="Date", building_ids=building_ids)
+    frames, building_ids = load_hourly_frames(demand_folder, ["NG_hs_kWh", "NG_ww_kWh"])
+"""
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Thread che leggono i file
+n_workers = 8
+
+
+def building_files(folder, pattern="B*.csv"):
+    """{building ID: file} of a CEA output folder, sorted by ID (B123_PV.csv -> B123)."""
+    files = {os.path.splitext(os.path.basename(file))[0].split("_")[0]: file
+             for file in glob.glob(os.path.join(str(folder), pattern))}
+    return dict(sorted(files.items()))
+
+
+def find_date_column(folder, pattern="B*.csv", candidates=("DATE", "Date")):
+    """First of the candidates in the header of the first file (CEA writes DATE or Date)."""
+    files = building_files(folder, pattern)
+    if not files:
+        raise FileNotFoundError(f"Nessun file {pattern} trovato in: {folder}")
+    header = pd.read_csv(next(iter(files.values())), nrows=0).columns
+    for column in candidates:
+        if column in header:
+            return column
+    raise KeyError(f"Nessuna colonna data {list(candidates)} in {next(iter(files.values()))}")
+
+
+def _read_columns_fast(path, columns):
+    """(rows x columns) values of some columns, cut straight out of the bytes of the file;
+    None when the file is not a plain CSV (quoted fields, ragged rows, empty values), read
+    it with pandas then.
+
+    CEA writes unquoted CSVs with the same number of fields on every row, so the fields
+    of a column are between fixed separators of each row: no need to tokenize the
+    other columns as pd.read_csv(usecols=...) still does, and the separators are found
+    once for all the columns.
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    if data.size == 0 or b'"'[0] in data:
+        return None
+    if data[-1] != ord("\n"):
+        data = np.append(data, np.uint8(ord("\n")))
+    header_end = int(np.argmax(data == ord("\n")))
+    header = data[:header_end].tobytes().decode().rstrip("\r").split(",")
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"{path}: colonne {missing} non trovate")
+
+    body = data[header_end + 1:]
+    separators = np.flatnonzero((body == ord(",")) | (body == ord("\n")))
+    if separators.size % len(header):
+        return None
+    separators = separators.reshape(-1, len(header))
+    if not (body[separators[:, -1]] == ord("\n")).all():
+        return None
+
+    values = np.empty((len(separators), len(columns)))
+    for i, column in enumerate(columns):
+        k = header.index(column)
+        start = separators[:, k - 1] + 1 if k else np.concatenate(([0], separators[:-1, -1] + 1))
+        end = separators[:, k]
+        if (end <= start).any():
+            return None
+
+        # fields as fixed-width byte strings (padded with spaces, \r too) parsed in one go
+        width = int((end - start).max())
+        index = start[:, None] + np.arange(width)
+        chars = np.where(index < end[:, None], body[np.minimum(index, body.size - 1)], ord(" ")).astype(np.uint8)
+        chars[chars == ord("\r")] = ord(" ")
+        try:
+            values[:, i] = chars.view(f"S{width}").ravel().astype(np.float64)
+        except ValueError:
+            return None
+    return values
+
+
+def read_columns(path, columns):
+    """(rows x columns) float64 values of some columns of a CEA CSV, one read of the file."""
+    columns = list(columns)
+    values = _read_columns_fast(path, columns)
+    if values is None:
+        df = pd.read_csv(path, usecols=columns, dtype={column: np.float64 for column in columns})
+        values = df[columns].to_numpy()
+    return values
+
+
+def read_column(path, column):
+    """float64 values of one column of a CEA CSV."""
+    return read_columns(path, [column])[:, 0]
+
+
+def read_hourly_cube(folder, columns, pattern="B*.csv", date_column="DATE", building_ids=None,
+                     fill_missing=False, n_workers=n_workers):
+    """(dates, building IDs, (hours x buildings x variables) float64 cube) of some columns
+    of every file, each file read once.
+
+    dates come from the first file (timezone removed). building_ids: order of the buildings
+    (default: all the files, sorted by ID); with fill_missing the buildings without a file
+    get zeros, otherwise they raise FileNotFoundError.
+    """
+    columns = list(columns)
+    files = building_files(folder, pattern)
+    if not files:
+        raise FileNotFoundError(f"Nessun file {pattern} trovato in: {folder}")
+    building_ids = list(files) if building_ids is None else list(building_ids)
+    missing = [building_id for building_id in building_ids if building_id not in files]
+    if missing and not fill_missing:
+        raise FileNotFoundError(f"{len(missing)} edifici senza file {pattern} in {folder}: {missing[:10]}")
+
+    first = pd.read_csv(next(iter(files.values())), usecols=[date_column])
+    dates = pd.to_datetime(first[date_column])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+
+    # stored variables x buildings x hours: the series of each building and variable is
+    # contiguous, and cube[:, :, k] is a column-major (hours x buildings) matrix
+    cube = np.zeros((len(columns), len(building_ids), len(dates))).transpose(2, 1, 0)
+
+    def read(j):
+        building_id = building_ids[j]
+        if building_id not in files:
+            return
+        values = read_columns(files[building_id], columns)
+        if len(values) != len(dates):
+            raise ValueError(f"{files[building_id]}: {len(values)} righe invece di {len(dates)}")
+        cube[:, j, :] = values
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        list(pool.map(read, range(len(building_ids))))
+    return dates.rename("Date"), building_ids, cube
+
+
+def read_hourly_matrix(folder, column, **kwargs):
+    """(dates, building IDs, (hours x buildings) float64 matrix) of one column of every
+    file; kwargs as read_hourly_cube."""
+    dates, building_ids, cube = read_hourly_cube(folder, [column], **kwargs)
+    return dates, building_ids, cube[:, :, 0]
+
+
+def hourly_frame(dates, building_ids, matrix):
+    """DataFrame with the Date column and one column per building (the old layout)."""
+    return pd.concat([dates.rename("Date").reset_index(drop=True),
+                      pd.DataFrame(matrix, columns=building_ids)], axis=1)
+
+
+def load_hourly_frame(folder, column, **kwargs):
+    """(DataFrame Date + buildings, building IDs); kwargs as read_hourly_cube."""
+    dates, building_ids, matrix = read_hourly_matrix(folder, column, **kwargs)
+    return hourly_frame(dates, building_ids, matrix), building_ids
+
+
+def load_hourly_frames(folder, columns, **kwargs):
+    """({column: DataFrame Date + buildings}, building IDs), each file read once; kwargs as
+    read_hourly_cube."""
+    dates, building_ids, cube = read_hourly_cube(folder, columns, **kwargs)
+    return {column: hourly_frame(dates, building_ids, cube[:, :, k])
+            for k, column in enumerate(columns)}, building_ids
@@ -0,0 +1,146 @@
+"""Copy the generated schedule columns into the schedules of one or more CEA scenarios.
+
+Sovrascrivere_a_CEA.py used to parse both files with pandas and rewrite the whole CEA file
+in place. Here the files are patched line by line: only the fields of the patched columns
+change, the rest of each CEA line (METADATA, MONTHLY_MULTIPLIER and the other columns) is
+kept as it is. Each generated file is read once and applied to every scenario folder.
+The patched file is written to a temporary file and renamed over the original, so an
+interrupted run never leaves a half-written schedule. Files are processed by a thread pool.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Colonne sostituite nei file CEA
+patch_columns = ["OCCUPANCY", "APPLIANCES", "LIGHTING", "WATER"]
+# Le prime due righe sono METADATA e MONTHLY_MULTIPLIER
+header_rows = 2
+n_workers = 8
+
+
+def _split_line(line):
+    """(fields, line ending) of a CSV line."""
+    body = line.rstrip("\r\n")
+    return body.split(","), line[len(body):]
+
+
+def read_schedule_columns(path, columns=patch_columns):
+    """{column: [field strings]} of the columns of a schedule file (only those present)."""
+    with open(path, "r", newline="") as f:
+        lines = f.readlines()[header_rows:]
+    header, _ = _split_line(lines[0])
+    rows = [_split_line(line)[0] for line in lines[1:] if line.strip()]
+    return {col: [row[header.index(col)] for row in rows] for col in columns if col in header}
+
+
+def patch_schedule(updated_columns, cea_path):
+    """Replace the columns of one CEA schedule.
+
+    Returns "patched", "skipped" (already up to date), "mismatch" (no column in common or
+    a different number of rows: the file is left as it is and a warning is printed) or
+    "missing" (no such CEA file).
+    """
+    if not os.path.exists(cea_path):
+        return "missing"
+    with open(cea_path, "r", newline="") as f:
+        lines = f.readlines()
+
+    header, _ = _split_line(lines[header_rows])
+    positions = {header.index(col): values for col, values in updated_columns.items() if col in header}
+    data_rows = [i for i in range(header_rows + 1, len(lines)) if lines[i].strip()]
+    n_values = {len(values) for values in updated_columns.values()}
+    if not positions or n_values != {len(data_rows)}:
+        print(f"⚠️ {cea_path}: colonne o righe non corrispondenti. Saltato.")
+        return "mismatch"
+
+    patched = list(lines)
+    for row, i in enumerate(data_rows):
+        fields, ending = _split_line(lines[i])
+        for position, values in positions.items():
+            fields[position] = values[row]
+        patched[i] = ",".join(fields) + ending
+    if patched == lines:
+        return "skipped"
+
+    tmp_path = f"{cea_path}.tmp"
+    try:
+        with open(tmp_path, "w", newline="") as f:
+            f.writelines(patched)
+        os.replace(tmp_path, cea_path)
+    except BaseException:
+        # the original is untouched, only the temporary file is removed
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return "patched"
+
+
+def patch_scenarios(schedule_folder, cea_folders, columns=patch_columns, n_workers=n_workers):
+    """Patch every schedule of schedule_folder into each CEA schedule folder.
+
+    Returns {cea folder: {"patched": n, "skipped": n, "mismatch": n, "missing": n}}.
+    """
+    files = sorted(file for file in os.listdir(schedule_folder) if file.endswith(".csv"))
+
+    def patch_file(file):
+        updated_columns = read_schedule_columns(os.path.join(schedule_folder, file), columns)
+        return [patch_schedule(updated_columns, os.path.join(cea_folder, file)) for cea_folder in cea_folders]
+
+    counts = {cea_folder: {"patched": 0, "skipped": 0, "mismatch": 0, "missing": 0} for cea_folder in cea_folders}
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        for statuses in pool.map(patch_file, files):
+            for cea_folder, status in zip(cea_folders, statuses):
+                counts[cea_folder][status] += 1
+    return counts
+
+
+# ---- SELF-CHECK ----
+def _self_check():
+    """Statuses, untouched fields and atomic write of patch_schedule (python cea_patcher.py)."""
+    import tempfile
+    from unittest import mock
+
+    head = "METADATA,AUTO\r\nMONTHLY_MULTIPLIER,0.8,0.8\r\nDAY,HOUR,OCCUPANCY,APPLIANCES,HEATING\r\n"
+    cea = head + "WEEKDAY,1,0,0,SETBACK\r\nWEEKDAY,2,0,0,SETPOINT\r\n"
+    generated = "METADATA,x\nMONTHLY_MULTIPLIER,1\nDAY,HOUR,OCCUPANCY,APPLIANCES\nWEEKDAY,1,0.5,0.1\nWEEKDAY,2,0.6,0.2\n"
+    with tempfile.TemporaryDirectory() as folder:
+        source, target = os.path.join(folder, "B1_generated.csv"), os.path.join(folder, "B1.csv")
+        with open(source, "w", newline="") as f:
+            f.write(generated)
+        updated = read_schedule_columns(source)
+        assert updated == {"OCCUPANCY": ["0.5", "0.6"], "APPLIANCES": ["0.1", "0.2"]}
+
+        def write_target(text):
+            with open(target, "w", newline="") as f:
+                f.write(text)
+
+        def read_target():
+            with open(target, "r", newline="") as f:
+                return f.read()
+
+        # a failure while replacing leaves the original as it was and no temporary file
+        write_target(cea)
+        with mock.patch("os.replace", side_effect=OSError("disk full")):
+            try:
+                patch_schedule(updated, target)
+            except OSError:
+                pass
+            else:
+                raise AssertionError("failure not raised")
+        assert read_target() == cea and not os.path.exists(f"{target}.tmp")
+
+        # only the patched fields change, line endings and other columns are kept
+        assert patch_schedule(updated, target) == "patched"
+        assert read_target() == head + "WEEKDAY,1,0.5,0.1,SETBACK\r\nWEEKDAY,2,0.6,0.2,SETPOINT\r\n"
+        assert patch_schedule(updated, target) == "skipped"
+
+        # a different number of rows or no column in common is reported, not skipped
+        write_target(head + "WEEKDAY,1,0,0,SETBACK\r\n")
+        assert patch_schedule(updated, target) == "mismatch"
+        assert read_target() == head + "WEEKDAY,1,0,0,SETBACK\r\n"
+        assert patch_schedule({"WATER": ["1", "1"]}, target) == "mismatch"
+        assert patch_schedule(updated, os.path.join(folder, "B2.csv")) == "missing"
+
+
+if __name__ == "__main__":
+    _self_check()
+    print("✅ cea_patcher: self-check OK")
@@ -0,0 +1,81 @@
+"""CEA occupancy schedules (B{id}.csv) written straight from the building average profiles.
+
+Same format as struttura_schedule_CEA.py used to write with pandas: METADATA row,
+MONTHLY_MULTIPLIER row, header and 72 hourly rows (24 WEEKDAY, 24 SATURDAY, 24 SUNDAY).
+The averages come as a (buildings x 72 x categories) array (see profile_averages.py).
+Everything but the 4 x 72 values is the same in every file, so the whole file is compiled
+once into a %-template ("%.1f" like to_csv(float_format="%.1f")) and each building is one
+string formatting. The files are written by a thread pool, and a file whose content did
+not change is not rewritten, so regenerating the schedules of a district is I/O bound.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Struttura header CEA
+metadata = ["METADATA", "CH-SIA-2014", "SINGLE_RES"] + [""] * 8
+#monthly_multiplier = ["MONTHLY_MULTIPLIER"] + [0.8] * 12
+monthly_multiplier = ["MONTHLY_MULTIPLIER"] + [1, 1, 1, 1, 1, 1, 1, 0.8, 1, 1, 1, 1]
+# Giorni della settimana e ore
+days = ["WEEKDAY"] * 24 + ["SATURDAY"] * 24 + ["SUNDAY"] * 24
+hours = list(range(1, 25)) * 3
+# Setpoint di riscaldamento/raffrescamento: SETBACK dalle 7 alle 21
+setpoints = ["SETPOINT"] * 6 + ["SETBACK"] * 15 + ["SETPOINT"] * 3
+
+columns = ["OCCUPANCY", "APPLIANCES", "LIGHTING", "SERVERS", "WATER", "HEATING", "COOLING",
+           "PROCESSES", "ELECTROMOBILITY", "DAY", "HOUR"]
+# profile categories of the value columns, in template order
+schedule_categories = ["occupancy", "appliances", "lighting", "DHW"]
+
+# Thread che scrivono i file
+n_threads = 8
+
+
+def _compile_template():
+    # the table part used to come from to_csv, which ends lines with os.linesep
+    rows = [",".join(columns)]
+    for hour in range(72):
+        setpoint = setpoints[hour % 24]
+        rows.append(f"%.1f,%.1f,%.1f,0,%.1f,{setpoint},{setpoint},0,0,{days[hour]},{hours[hour]}")
+    return (",".join(map(str, metadata)) + "\n"
+            + ",".join(map(str, monthly_multiplier)) + "\n"
+            + os.linesep.join(rows) + os.linesep)
+
+
+template = _compile_template()
+
+
+def schedule_text(values):
+    """Content of one schedule file; values: (72 x 4) occupancy, appliances, lighting, DHW."""
+    return template % tuple(np.asarray(values, dtype=np.float64).ravel().tolist())
+
+
+def _write_if_changed(path, content):
+    """Write content to path unless the file already has exactly that content."""
+    data = content.encode()
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def write_district_schedules(output_folder, building_ids, categories, cube, n_threads=n_threads):
+    """B{id}.csv of every building from the (buildings x 72 x categories) averages.
+
+    Returns (files written, files left untouched because already up to date).
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    cube = np.asarray(cube, dtype=np.float64)
+    values = cube[:, :, [list(categories).index(cat) for cat in schedule_categories]]
+    paths = [os.path.join(output_folder, f"B{building_id}.csv") for building_id in building_ids]
+
+    def write(i):
+        return _write_if_changed(paths[i], schedule_text(values[i]))
+
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        written = sum(pool.map(write, range(len(paths))))
+    return written, len(paths) - written
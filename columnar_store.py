@@ -0,0 +1,79 @@
+"""Single-file columnar store readable by memory map.
+
+Layout: a magic line, the length of a JSON header (8 bytes, little endian), the JSON
+header (name, dtype, shape and offset of every column plus free "attrs"), then the raw
+column data, each column aligned to 64 bytes. Reading maps the file once and returns
+one np.memmap view per column, so only the parts actually used are read from disk.
+"""
+import json
+import os
+
+import numpy as np
+
+MAGIC = b"COLSTORE1\n"
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_columns(path, columns, attrs=None):
+    """Write {name: array} (any shape, fixed-size dtype) and the attrs dict to one file.
+
+    The file is written next to the target and moved in place at the end, so a reader
+    never sees a half-written store.
+    """
+    columns = {name: np.ascontiguousarray(array) for name, array in columns.items()}
+    for name, array in columns.items():
+        if array.dtype.hasobject:
+            raise TypeError(f"Column {name!r} has object dtype, it cannot be stored")
+
+    # offsets relative to the start of the data block
+    header_columns, offset = [], 0
+    for name, array in columns.items():
+        offset = _aligned(offset)
+        header_columns.append({"name": name, "dtype": array.dtype.str,
+                               "shape": list(array.shape), "offset": offset})
+        offset += array.nbytes
+    header = json.dumps({"columns": header_columns, "attrs": attrs or {}}).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for column, array in zip(header_columns, columns.values()):
+            f.write(b"\0" * (data_start + column["offset"] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """(header dict, start of the data block) of a store."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar store")
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    return header, _aligned(len(MAGIC) + 8 + header_size)
+
+
+def open_columns(path, mmap=True):
+    """({name: array}, attrs) of a store; arrays are read-only memory maps by default."""
+    header, data_start = read_header(path)
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        with open(path, "rb") as f:
+            buffer = np.frombuffer(f.read(), dtype=np.uint8)
+
+    columns = {}
+    for column in header["columns"]:
+        dtype = np.dtype(column["dtype"])
+        shape = tuple(column["shape"])
+        start = data_start + column["offset"]
+        nbytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        columns[column["name"]] = buffer[start:start + nbytes].view(dtype).reshape(shape)
+    return columns, header["attrs"]
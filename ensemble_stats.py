@@ -0,0 +1,98 @@
+"""Streaming statistics over the realizations of a Monte Carlo ensemble.
+
+Each realization gives arrays of fixed shape (per building, per category, per hour...).
+Instead of keeping the N realizations, every array name keeps a running mean and
+variance (Welford update) and, for the arrays that need quantiles, a fixed-size
+reservoir of realizations, so the memory does not grow with N. Quantiles are exact while
+N <= reservoir_size and a uniform-sample estimate afterwards. The reservoir holds
+reservoir_size copies of the array: keep it for the small ones (counts per building),
+not for large ones such as hourly profiles per building, which get mean and std only.
+"""
+import numpy as np
+
+
+class StreamingStats:
+    """Running mean, variance and quantile sketch of an array of fixed shape."""
+
+    def __init__(self, shape, reservoir_size=100, rng=None):
+        """reservoir_size=0: mean and variance only, no quantiles."""
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self._reservoir = np.empty((reservoir_size,) + tuple(shape), dtype=np.float32)
+        self._rng = np.random.default_rng(rng)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+        # reservoir sampling, one slot for the whole array
+        size = len(self._reservoir)
+        if size == 0:
+            return
+        if self.count <= size:
+            self._reservoir[self.count - 1] = x
+        else:
+            slot = self._rng.integers(self.count)
+            if slot < size:
+                self._reservoir[slot] = x
+
+    @property
+    def variance(self):
+        """Sample variance (NaN with less than 2 realizations)."""
+        if self.count < 2:
+            return np.full(self.mean.shape, np.nan)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def has_quantiles(self):
+        return len(self._reservoir) > 0
+
+    def quantile(self, q):
+        """Quantile(s) q of the realizations, element by element (NaN before the first one)."""
+        if not self.has_quantiles:
+            raise ValueError("Quantili non disponibili: statistiche senza reservoir (reservoir_size=0)")
+        kept = self._reservoir[:min(self.count, len(self._reservoir))]
+        if len(kept) == 0:
+            return np.full(np.shape(q) + self.mean.shape, np.nan)
+        return np.quantile(kept.astype(np.float64), q, axis=0)
+
+
+class EnsembleStats:
+    """StreamingStats of every array of the realizations, created at the first update.
+
+    quantile_names: names of the arrays that keep a quantile reservoir (None: all); the
+    others get mean and std only.
+    """
+
+    def __init__(self, reservoir_size=100, seed=None, quantile_names=None):
+        self.reservoir_size = reservoir_size
+        self.quantile_names = None if quantile_names is None else set(quantile_names)
+        self._seed = np.random.SeedSequence(seed)
+        self.stats = {}
+
+    def update(self, realization):
+        """realization: {name: array}, same names and shapes at every call."""
+        for name, values in realization.items():
+            if name not in self.stats:
+                with_quantiles = self.quantile_names is None or name in self.quantile_names
+                self.stats[name] = StreamingStats(np.shape(values), self.reservoir_size if with_quantiles else 0,
+                                                  self._seed.spawn(1)[0])
+            self.stats[name].update(values)
+
+    def summary(self, quantiles=(0.05, 0.5, 0.95)):
+        """{name: {"mean", "std", "p05", "p50", "p95"...: array}}, quantiles only where kept."""
+        summary = {}
+        for name, stats in self.stats.items():
+            summary[name] = {"mean": stats.mean, "std": stats.std}
+            if stats.has_quantiles:
+                for q in quantiles:
+                    summary[name][f"p{round(q * 100):02d}"] = stats.quantile(q)
+        return summary
@@ -0,0 +1,166 @@
+"""Streaming reader for the GeoJSON feature collections of Data/.
+
+json.load builds the whole collection (geometry included) as nested dicts, while the
+assignment scripts only read a handful of properties. Here the features are decoded one
+at a time from a text buffer read in chunks; the geometry is dropped unless asked for,
+and load_feature_table keeps only the requested properties, as typed arrays. Peak memory
+is one chunk plus one feature plus the projected columns.
+"""
+import json
+
+import numpy as np
+
+# properties of the building collections used by the assignment scripts
+BUILDING_FIELDS = {
+    "ID": np.int64,
+    "SEZ21": np.int64,
+    "function": np.int64,
+    "Area": np.float64,
+    "Shape_Area": np.float64,
+    "nfloors": np.float64,
+}
+
+_decoder = json.JSONDecoder()
+_whitespace = " \t\n\r"
+
+
+def iter_features(path, geometry=False, chunk_size=1 << 20):
+    """Features of a FeatureCollection file, one at a time (without "geometry" by default)."""
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        # skip the header ("type", "name", "crs") up to the opening bracket of "features"
+        while True:
+            start = buffer.find('"features"')
+            if start >= 0:
+                bracket = buffer.find("[", start)
+                if bracket >= 0:
+                    break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buffer += chunk
+        pos = bracket + 1
+
+        eof = False
+        while True:
+            # skip separators, stop at the closing bracket
+            while pos < len(buffer) and buffer[pos] in _whitespace + ",":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError("empty buffer")
+                feature, pos = _decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # feature cut by the end of the buffer: read more and retry
+                if eof:
+                    raise ValueError(f"Truncated feature collection: {path}")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            if not geometry:
+                feature.pop("geometry", None)
+            yield feature
+
+            # drop what has been decoded, so the buffer stays around one chunk
+            if pos > chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def load_features(path, geometry=False):
+    """FeatureCollection-shaped dict ({"features": [...]}) read with iter_features."""
+    return {"type": "FeatureCollection", "features": list(iter_features(path, geometry))}
+
+
+def load_feature_table(path, fields=BUILDING_FIELDS, geometry=False):
+    """{property: typed array} of the requested properties, one element per feature.
+
+    fields: {property: dtype}. Missing or null values are NaN for float columns and -1
+    for integer ones. With geometry=True the geometries are kept in a "geometry" list.
+    """
+    values = {name: [] for name in fields}
+    geometries = []
+    for feature in iter_features(path, geometry):
+        properties = feature["properties"]
+        for name, column in values.items():
+            column.append(properties.get(name))
+        if geometry:
+            geometries.append(feature.get("geometry"))
+
+    table = {}
+    for name, dtype in fields.items():
+        missing = np.nan if np.issubdtype(dtype, np.floating) else -1
+        table[name] = np.array([missing if v is None else v for v in values[name]], dtype=dtype)
+    if geometry:
+        table["geometry"] = geometries
+    return table
+
+
+def feature_collection(table):
+    """FeatureCollection-shaped dict with the projected properties of a feature table,
+    for the code written against json.load output (feature order is kept)."""
+    names = [name for name in table if name != "geometry"]
+    columns = [table[name].tolist() for name in names]
+    features = [{"type": "Feature", "properties": dict(zip(names, row))} for row in zip(*columns)]
+    if "geometry" in table:
+        for feature, geometry in zip(features, table["geometry"]):
+            feature["geometry"] = geometry
+    return {"type": "FeatureCollection", "features": features}
+
+
+# ---- SELF-CHECK ----
+def _self_check(seed=0):
+    """iter_features against json.load for chunk sizes that cut the features, the header
+    and the separators everywhere (python geojson_stream.py)."""
+    import os
+    import tempfile
+
+    rng = np.random.default_rng(seed)
+    features = [{"type": "Feature",
+                 "properties": {"ID": i, "SEZ21": int(rng.integers(1, 5)), "Area": float(rng.uniform(1, 900)),
+                                "nfloors": None if i % 7 == 0 else int(rng.integers(1, 9)),
+                                "name": f"edificio {i} – via “Sparano” ]}},"},
+                 "geometry": {"type": "Polygon", "coordinates": [[[float(i), 0.0], [i + 1.0, 1.5], [float(i), 0.0]]]}}
+                for i in range(40)]
+    header = {"type": "FeatureCollection", "name": "test",
+              "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:EPSG::32633"}}}
+    layouts = {
+        "compact": json.dumps({**header, "features": features}, ensure_ascii=False),
+        "indented": json.dumps({**header, "features": features}, indent=2),
+        "one per line": "{\n" + json.dumps(header)[1:-1] + ',\n"features": [\n'
+                        + ",\n".join(json.dumps(feature) for feature in features) + "\n]\n}\n",
+        "empty": json.dumps({**header, "features": []}),
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "collection.json")
+        for layout, text in layouts.items():
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            with open(path, "r", encoding="utf-8") as f:
+                expected = json.load(f)["features"]
+            for chunk_size in list(range(1, 64)) + [97, 1000, 1 << 20]:
+                assert list(iter_features(path, geometry=True, chunk_size=chunk_size)) == expected, (layout, chunk_size)
+            without_geometry = [{k: v for k, v in feature.items() if k != "geometry"} for feature in expected]
+            assert list(iter_features(path, chunk_size=5)) == without_geometry, layout
+
+        # the last layout written is the empty collection
+        assert load_feature_table(path, fields={"ID": np.int64})["ID"].size == 0
+
+        # a collection cut in the middle of a feature is an error, not a shorter list
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(layouts["one per line"][:-200])
+        try:
+            list(iter_features(path, chunk_size=16))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("truncated collection not detected")
+
+
+if __name__ == "__main__":
+    _self_check()
+    print("✅ geojson_stream: self-check OK")
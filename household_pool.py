@@ -0,0 +1,95 @@
+"""Household pool of a census section as integer arrays.
+
+Each household is a type code (position in HOUSEHOLD_TYPES) and a profile index in the
+profile table of its type: a column of the compiled library / profile store in the
+income and _all scripts (profile_idx), a row of the profiles.xlsx sheet in main.py
+(profile_rows, see stack_profiles). The pool is shuffled once and every building takes a
+contiguous slice of it, instead of households.pop(0) on a list of tuples carrying the
+profile lists; the profile values are only looked up when the outputs are written.
+"""
+import numpy as np
+
+HOUSEHOLD_TYPES = ("1_comp_work", "1_comp_ret", "2_comp_work", "2_comp_ret", "3_comp", "4_comp_more")
+TYPE_CODES = {hh_type: code for code, hh_type in enumerate(HOUSEHOLD_TYPES)}
+# residents per household of each type
+HOUSEHOLD_SIZES = (1, 1, 2, 2, 3, 4)
+
+
+def household_counts(census, census_occupied):
+    """Households per type (HOUSEHOLD_TYPES order) of a census section."""
+    return np.array([
+        int(census["HH_1 comp"] * census_occupied),
+        int(census["HH_1 comp"] * (1 - census_occupied)),
+        int(census["HH_2 comp"] * census_occupied),
+        int(census["HH_2 comp"] * (1 - census_occupied)),
+        int(census["HH_3 comp"]),
+        int(census["HH_4 comp"] + census["HH_5 comp"] + census["HH_6 comp or more"]),
+    ], dtype=np.int64)
+
+
+def build_household_pool(counts, n_profiles=None, rng=None, profile_weights=None):
+    """Shuffled pool of households: (type codes, profile column indices).
+
+    counts: households per type code. n_profiles: number of profile columns available for
+    each type, a column is drawn for every household (column 0 when None), uniformly or
+    with profile_weights (see sample_profile_indices).
+    """
+    rng = np.random.default_rng(rng)
+    types = np.repeat(np.arange(len(counts), dtype=np.int8), counts)
+    if n_profiles is None:
+        profile_idx = np.zeros(types.size, dtype=np.int32)
+    else:
+        profile_idx = sample_profile_indices(types, n_profiles, rng, profile_weights)
+
+    order = rng.permutation(types.size)
+    return types[order], profile_idx[order]
+
+
+def sample_profile_indices(types, n_profiles, rng=None, profile_weights=None):
+    """Index in [0, n_profiles[type]) of the profile drawn for every household.
+
+    The axis is the caller's: a profile column of the library tables (rows x profiles) for
+    build_household_pool, a row of the profiles.xlsx sheet for main.py, where n_profiles
+    counts the rows and the result goes to gather_profiles as profile_rows. types: type code of every household, any number of sections at once. Uniform draw:
+    one call for all the households. profile_weights: {household type: weight of every
+    profile} to calibrate the draw, one rng.choice per weighted type (types not in it
+    stay uniform).
+    """
+    rng = np.random.default_rng(rng)
+    n_profiles = np.asarray(n_profiles)
+    profile_idx = (rng.random(len(types)) * n_profiles[types]).astype(np.int32)
+    for hh_type, weights in (profile_weights or {}).items():
+        rows = np.flatnonzero(types == TYPE_CODES[hh_type])
+        if rows.size:
+            weights = np.asarray(weights, dtype=np.float64)
+            profile_idx[rows] = rng.choice(len(weights), size=rows.size, p=weights / weights.sum())
+    return profile_idx
+
+
+def stack_profiles(type_profiles):
+    """All the profile tables in one array: (stacked rows x columns, first row of each type).
+
+    type_profiles: {household type: array (profiles x columns)}, one profile per row.
+    """
+    tables = [np.asarray(type_profiles[hh_type]) for hh_type in HOUSEHOLD_TYPES]
+    offsets = np.concatenate(([0], np.cumsum([len(table) for table in tables])[:-1]))
+    return np.concatenate(tables), offsets
+
+
+def gather_profiles(types, profile_rows, stacked, offsets):
+    """(households x columns) profiles of the households, one fancy-indexing operation.
+
+    profile_rows: row of every household within the table of its type (stack_profiles).
+    """
+    return stacked[offsets[types] + profile_rows]
+
+
+def split_pool(pool_size, building_households):
+    """Start and stop of the pool slice of each building, in building order.
+
+    Buildings after the end of the pool get what is left (possibly nothing), as the
+    old households.pop(0) loop did.
+    """
+    stops = np.minimum(np.cumsum(building_households), pool_size)
+    starts = np.concatenate(([0], stops[:-1])).astype(stops.dtype)
+    return starts, stops
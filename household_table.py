@@ -0,0 +1,220 @@
+"""Households of the synthetic population as a struct of arrays.
+
+Replaces the all_households_detailed dict-of-dicts (one dict per household, keyed by
+"<building>_<random.randint>" ids that could collide) with integer columns: sequential
+household ids, the building of each household, categorical codes for the type and, per
+member, the education and income codes (CSR layout: the members of household i are
+member_start[i]:member_start[i + 1]). The table is saved as a columnar file (see
+columnar_store.py); the old JSON layout is still available through to_json_dict.
+"""
+import numpy as np
+
+from columnar_store import open_columns, write_columns
+
+
+class HouseholdTable:
+    """Households of a set of buildings.
+
+    buildings: building IDs; building: index in buildings of every household;
+    household_type: code in household_types; member_start, member_education,
+    member_income: members of every household, codes in education_levels/income_levels.
+    """
+
+    def __init__(self, buildings, building, household_type, member_start, member_education,
+                 member_income, household_types, education_levels, income_levels,
+                 household_id=None):
+        self.buildings = np.asarray(buildings, dtype=np.int64)
+        self.building = np.asarray(building, dtype=np.int32)
+        self.household_type = np.asarray(household_type, dtype=np.int8)
+        self.member_start = np.asarray(member_start, dtype=np.int64)
+        self.member_education = np.asarray(member_education, dtype=np.int8)
+        self.member_income = np.asarray(member_income, dtype=np.int8)
+        self.household_types = list(household_types)
+        self.education_levels = list(education_levels)
+        self.income_levels = list(income_levels)
+        if household_id is None:
+            household_id = np.arange(len(self.building), dtype=np.int64)
+        self.household_id = np.asarray(household_id, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.building)
+
+    @property
+    def building_id(self):
+        """Building ID of every household."""
+        return self.buildings[self.building]
+
+    @property
+    def members(self):
+        """Number of members of every household."""
+        return np.diff(self.member_start)
+
+    @property
+    def education(self):
+        """Education code of the first member (reference person) of every household."""
+        return self.member_education[self.member_start[:-1]]
+
+    @property
+    def income(self):
+        """Income code of the first member (reference person) of every household."""
+        return self.member_income[self.member_start[:-1]]
+
+    @classmethod
+    def concat(cls, tables, household_types=None, education_levels=None, income_levels=None):
+        """One table from several (e.g. one per census section), with the buildings
+        re-indexed and sequential household ids 0..n-1: unique by construction.
+
+        The code names default to those of the first table; with no tables the result is
+        an empty table with the names given (empty lists if none).
+        """
+        tables = [table for table in tables if table is not None]
+        if not tables:
+            return cls(buildings=[], building=[], household_type=[], member_start=[0],
+                       member_education=[], member_income=[], household_types=household_types or [],
+                       education_levels=education_levels or [], income_levels=income_levels or [])
+        first = tables[0]
+        household_types = first.household_types if household_types is None else household_types
+        education_levels = first.education_levels if education_levels is None else education_levels
+        income_levels = first.income_levels if income_levels is None else income_levels
+        building_offsets = np.cumsum([0] + [len(t.buildings) for t in tables[:-1]])
+        member_offsets = np.cumsum([0] + [t.member_start[-1] for t in tables[:-1]])
+        return cls(
+            buildings=np.concatenate([t.buildings for t in tables]),
+            building=np.concatenate([t.building + offset for t, offset in zip(tables, building_offsets)]),
+            household_type=np.concatenate([t.household_type for t in tables]),
+            member_start=np.concatenate([[0]] + [t.member_start[1:] + offset
+                                                 for t, offset in zip(tables, member_offsets)]),
+            member_education=np.concatenate([t.member_education for t in tables]),
+            member_income=np.concatenate([t.member_income for t in tables]),
+            household_types=household_types,
+            education_levels=education_levels,
+            income_levels=income_levels,
+        )
+
+    def subset(self, building_ids):
+        """Table with the households of building_ids only (buildings in that order, the
+        households keep their order). Used to carry unchanged sections over."""
+        position = {building_id: i for i, building_id in enumerate(self.buildings.tolist())}
+        kept = [position.get(building_id, -1) for building_id in building_ids]
+        new_index = np.full(len(self.buildings) + 1, -1, dtype=np.int64)
+        for i, old in enumerate(kept):
+            if old >= 0:
+                new_index[old] = i
+
+        rows = np.flatnonzero(new_index[self.building] >= 0)
+        members = self.members[rows]
+        member_rows = (np.repeat(self.member_start[rows] - np.cumsum(members) + members, members)
+                       + np.arange(members.sum()))
+        return HouseholdTable(
+            buildings=building_ids, building=new_index[self.building[rows]],
+            household_type=self.household_type[rows],
+            member_start=np.concatenate(([0], np.cumsum(members))),
+            member_education=self.member_education[member_rows],
+            member_income=self.member_income[member_rows],
+            household_types=self.household_types, education_levels=self.education_levels,
+            income_levels=self.income_levels)
+
+    def write(self, path):
+        """Save the table to one columnar file."""
+        write_columns(path, {
+            "household_id": self.household_id,
+            "buildings": self.buildings,
+            "building": self.building,
+            "household_type": self.household_type,
+            "member_start": self.member_start,
+            "member_education": self.member_education,
+            "member_income": self.member_income,
+        }, attrs={
+            "household_types": self.household_types,
+            "education_levels": self.education_levels,
+            "income_levels": self.income_levels,
+        })
+
+    @classmethod
+    def read(cls, path, mmap=True):
+        """Table saved by write (columns memory-mapped by default)."""
+        columns, attrs = open_columns(path, mmap=mmap)
+        return cls(buildings=columns["buildings"], building=columns["building"],
+                   household_type=columns["household_type"], member_start=columns["member_start"],
+                   member_education=columns["member_education"], member_income=columns["member_income"],
+                   household_id=columns["household_id"], **attrs)
+
+    def to_json_dict(self):
+        """The all_households_detailed layout: {"<building>_<household id>": {...}}."""
+        household_types = np.array(self.household_types, dtype=object)
+        education_levels = np.array(self.education_levels, dtype=object)
+        income_levels = np.array(self.income_levels, dtype=object)
+        rows = zip(self.household_id.tolist(), self.building_id.tolist(),
+                   household_types[self.household_type], education_levels[self.education],
+                   income_levels[self.income])
+        return {
+            f"{building_id}_{household_id}": {
+                "Building_ID": building_id,
+                "Household_type": household_type,
+                "education": education,
+                "income": income
+            }
+            for household_id, building_id, household_type, education, income in rows
+        }
+
+
+# ---- SELF-CHECK ----
+def _random_table(rng, first_building, n_buildings, household_types=("a", "b", "c"),
+                  education_levels=("e0", "e1"), income_levels=("i0", "i1", "i2")):
+    building = np.sort(rng.integers(0, n_buildings, rng.integers(0, 20))) if n_buildings else np.empty(0, np.int64)
+    members = rng.integers(1, 5, building.size)
+    n_members = int(members.sum())
+    return HouseholdTable(
+        buildings=np.arange(first_building, first_building + n_buildings), building=building,
+        household_type=rng.integers(0, len(household_types), building.size),
+        member_start=np.concatenate(([0], np.cumsum(members))),
+        member_education=rng.integers(0, len(education_levels), n_members),
+        member_income=rng.integers(0, len(income_levels), n_members),
+        household_types=household_types, education_levels=education_levels, income_levels=income_levels)
+
+
+def _same_households(a, b):
+    return (a.buildings.tolist() == b.buildings.tolist()
+            and a.building_id.tolist() == b.building_id.tolist()
+            and a.household_type.tolist() == b.household_type.tolist()
+            and a.member_start.tolist() == b.member_start.tolist()
+            and a.member_education.tolist() == b.member_education.tolist()
+            and a.member_income.tolist() == b.member_income.tolist())
+
+
+def _self_check(trials=200, seed=0):
+    """concat/subset/write/read round trips, empty tables included (python household_table.py)."""
+    import os
+    import tempfile
+
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "households.colstore")
+        for _ in range(trials):
+            # sections of consecutive building IDs, some without buildings or households
+            sections, first = [], 0
+            for _ in range(int(rng.integers(0, 6))):
+                n_buildings = int(rng.integers(0, 8))
+                sections.append(_random_table(rng, first, n_buildings))
+                first += n_buildings
+            table = HouseholdTable.concat(sections, ("a", "b", "c"), ("e0", "e1"), ("i0", "i1", "i2"))
+            assert len(table) == sum(len(section) for section in sections)
+            assert table.household_id.tolist() == list(range(len(table)))
+            assert table.member_start[-1] == len(table.member_education)
+            # every section back from the district table
+            for section in sections:
+                assert _same_households(table.subset(section.buildings.tolist()), section)
+            assert len(table.subset([])) == 0
+
+            table.write(path)
+            assert _same_households(HouseholdTable.read(path, mmap=False), table)
+            assert len(table.to_json_dict()) == len(table)
+
+    empty = HouseholdTable.concat([], ("a",), ("e0",), ("i0",))
+    assert len(empty) == 0 and empty.members.size == 0 and empty.household_types == ["a"]
+    assert len(HouseholdTable.concat([None, None])) == 0
+
+
+if __name__ == "__main__":
+    _self_check()
+    print("✅ household_table: self-check OK")
@@ -1,16 +1,28 @@
 import pandas as pd
 import numpy as np
 from matplotlib import pyplot as plt
-import json
-import random
 import openpyxl
 import os
+import time
+from building_index import build_residential_index_from_table, section_buildings, section_records
+from geojson_stream import load_features, load_feature_table, feature_collection
+from apportionment import apportion_section
+from profile_library import load_profiles, load_profile_calendar
+from run_report import RunReport
+from household_pool import (HOUSEHOLD_TYPES, household_counts, build_household_pool, split_pool,
+                            sample_profile_indices, stack_profiles, gather_profiles)
 
 
 census_data = "Data/census_data_out.json"
 building_data = "Data/building_data_out.json"
 profile_file = 'Data/profiles.xlsx'
 output_folder = "Building_profiles"
+# Optional weight of every profile row per household type, to calibrate the draw
+# (e.g. {"1_comp_work": [...]}, one weight per row of the sheet); None: uniform
+profile_weights = None
+# Run report (stage timings, per-section counters) saved as run_report.json/.csv in
+# output_folder; True adds the memory peaks via tracemalloc, which slows the run down
+report_memory = False
 
 #household_types = {"IMW":"isolated_members_workers",
 #                   "IMR":"isolated_members_retired",
@@ -27,24 +39,33 @@ ncomp_types = {"1component_worker":"1_comp_work",
                "3components":"3_comp",
                "4components_more":"4_comp_more"}
 
-with open(census_data, 'r') as f:
-    census_data = json.load(f)
+os.makedirs(output_folder, exist_ok=True)
+report = RunReport("main", track_memory=report_memory)
 
-with open(building_data, 'r') as f:
-    building_data = json.load(f)
+with report.stage("load"):
+    census_data = load_features(census_data)
 
-# read the xlsx based on the dictionary
-profiles = {
-    ncomp_types[sheet]: pd.read_excel(profile_file, sheet_name=sheet).values.tolist()
-    for sheet in ncomp_types
-}
+    # only the building properties used here, as typed columns (geometry skipped)
+    building_table = load_feature_table(building_data)
+    building_data = feature_collection(building_table)
 
+    # SEZ21 -> residential buildings
+    building_index = build_residential_index_from_table(building_table, area_key="Shape_Area")
 
-def assign_HH_to_buildings(census_sections, building_data):
+# read the xlsx based on the dictionary (compiled once, then loaded from the cache)
+with report.stage("profiles"):
+    profiles = load_profiles(profile_file, ncomp_types)
+    # season, day_type, hour of every row of the sheets
+    profile_calendar = load_profile_calendar(profile_file, ncomp_types)
+
+
+def assign_HH_to_buildings(census_sections, building_data, building_index):
+    rng = np.random.default_rng()
     assignments = []
 
      # variables from json
     for feature in census_sections["features"]:
+        section_start = time.perf_counter()
         census = feature["properties"]
         census_id = census["SEZ21"]
         census_population = census["total resident population"]
@@ -54,92 +75,37 @@ def assign_HH_to_buildings(census_sections, building_data):
                            census["total resident population"]) if census_population>0 else 0
 
         # filter residential buildings only
-        residential_buildings = [b["properties"] for b in building_data["features"]
-                                 if b["properties"]["SEZ21"] == census_id and b["properties"]["function"]
-                                 in [11, 12]] # change with residential code
+        residential_buildings = section_buildings(building_index, building_data, census_id)
         if not residential_buildings:
             continue
 
-        # Calculate total heated area for residential buildings only
-        total_heated_area = sum(b["Shape_Area"] * b["nfloors"] for b in residential_buildings)
-        avg_area_per_person = total_heated_area / census_population if census_population > 0 else 1
-
-        # Calculate estimated number of residents per residential building
-        for building in residential_buildings:
-            building["heated_area"] = building["Shape_Area"] * building["nfloors"]
-            building["estimated_residents"] = max(1, round(building["heated_area"]/
-                                                           avg_area_per_person))
-
-        # Ensure total assigned population match section population
-        assigned_population = sum(b["estimated_residents"] for b in residential_buildings)
-        difference = census_population - assigned_population
-
-        # Adjust the number of residents per buildings by sum or subtraction
-        if difference > 0:
-            for _ in range(difference):
-                random.choice(residential_buildings)["estimated_residents"] += 1
-        elif difference < 0:
-            for _ in range(abs(difference)):
-                random.choice(residential_buildings)["estimated_residents"] -= 1
-
-        # Ensure that at least one household is assigned to each building
-        households = []
-        for building in residential_buildings:
-            building["estimated_residents"] = max(1, building["estimated_residents"])
-
-        # List of family data based on census data. Selection of a random profile from xlsx file
-        # for the range of household types
-        # single working
-        households += [("1_comp_ret", random.choice(profiles["1_comp_work"])) for _ in
-                       range(int(census["HH_1 comp"]*census_occupied))]
-        # single retired
-        households += [("1_comp_ret", random.choice(profiles["1_comp_ret"])) for _ in
-                       range(int(census["HH_1 comp"] * (1-census_occupied)))]
-        # couple without children working
-        households += [("2_comp_work", random.choice(profiles["2_comp_work"])) for _ in
-                       range(int(census["HH_2 comp"]*census_occupied))]
-        # couple without children retired
-        households += [("2_comp_ret", random.choice(profiles["2_comp_ret"])) for _ in
-                       range(int(census["HH_2 comp"] * (1-census_occupied)))]
-        # couple with one child
-        households += [("3_comp", random.choice(profiles["3_comp"])) for _ in
-                       range(int(census["HH_3 comp"]))]
-        # couple with more than one child
-        households += [("4_comp_more", random.choice(profiles["4_comp_more"])) for _ in
-                       range(int(census["HH_4 comp"] + census["HH_5 comp"]
-                                 + census["HH_6 comp or more"]))]
-
-        random.shuffle(households)
-
-        # Initial assignment of households to buildings
-        building_assignments = {b["ID"]: [] for b in residential_buildings}
-        total_assigned_households = 0
-
-        for building in residential_buildings:
-            building["assigned_households"] = max(1, round(
-                building["estimated_residents"] / census_population * total_census_households))
-
-        # Correct number of assigned households
-        assigned_households_check = sum(b["assigned_households"]
-                                        for b in residential_buildings)
-        diff_households = total_census_households - assigned_households_check
-
-        while diff_households != 0:
-            balance = random.choice(residential_buildings)
-            if diff_households > 0:
-                balance["assigned_households"] +=1
-                diff_households -= 1
-            elif diff_households < 0 and balance["assigned_households"] > 1:
-                balance["assigned_households"] -=1
-                diff_households +=1
-
-        # Final assignment of households
-        for building in residential_buildings:
-            for _ in range(building["assigned_households"]):
-                if households:
-                    ncomp_type, profile = households.pop(0)
-                    building_assignments[building["ID"]].append((ncomp_type, profile))
-                    total_assigned_households += 1
+        # Residents proportional to the heated area and households proportional to the
+        # residents, at least one per building and matching the section totals
+        records = section_records(building_index, census_id)
+        heated_area = records["area"] * records["nfloors"]
+        estimated_residents, assigned_households = apportion_section(
+            heated_area, census_population, total_census_households)
+
+        for building, area, residents, n_households in zip(
+                residential_buildings, heated_area, estimated_residents, assigned_households):
+            building["heated_area"] = float(area)
+            building["estimated_residents"] = int(residents)
+            building["assigned_households"] = int(n_households)
+
+        # List of family data based on census data (single working, single retired, couples
+        # working/retired, couple with one child, with more children). The profile rows are
+        # drawn afterwards for the whole district
+        # NB: the single workers are counted as "1_comp_work", the type of the profile table
+        # they take; the original list labelled them "1_comp_ret", so the 1_comp_work /
+        # 1_comp_ret counts and keys of the summaries differ from the old outputs
+        hh_types, _ = build_household_pool(household_counts(census, census_occupied), rng=rng)
+
+        # Assignment of households to buildings: each building takes a contiguous
+        # slice of the shuffled pool (type codes)
+        starts, stops = split_pool(len(hh_types), assigned_households)
+        building_assignments = {b["ID"]: hh_types[start:stop]
+                                for b, start, stop in zip(residential_buildings, starts, stops)}
+        total_assigned_households = int(stops[-1])
 
 
         if total_assigned_households != total_census_households:
@@ -147,6 +113,10 @@ def assign_HH_to_buildings(census_sections, building_data):
                 f"Error in section {census_id}: assigned {total_assigned_households} "
                 f"vs. census expected {total_census_households}")
 
+        report.section(census_id, buildings=len(residential_buildings), households=total_assigned_households,
+                       residents=int(estimated_residents.sum()),
+                       seconds=round(time.perf_counter() - section_start, 4))
+
         assignments.append({
             "section_ID": census_id,
             "assignments": building_assignments
@@ -156,28 +126,53 @@ def assign_HH_to_buildings(census_sections, building_data):
         #file_path=os.path.join(output_folder, f"{building_id}.csv")
         #df.to_excel(file_path, index=False)
 
-    return assignments
-
-assignments = assign_HH_to_buildings(census_data, building_data)
+    # Selection of a random profile from xlsx file for each household of the district:
+    # one draw for all the households (one per weighted type), every building then takes
+    # its slice as (type codes, profile rows)
+    n_profiles = [len(profiles[hh_type]) for hh_type in HOUSEHOLD_TYPES]
+    district_types = np.concatenate([types for section in assignments
+                                     for types in section["assignments"].values()] or [np.empty(0, np.int8)])
+    # here a profile is a row of the sheet: district_rows are rows, not library columns
+    district_rows = sample_profile_indices(district_types, n_profiles, rng, profile_weights)
+    start = 0
+    for section in assignments:
+        for building_id, types in section["assignments"].items():
+            section["assignments"][building_id] = (types, district_rows[start:start + len(types)])
+            start += len(types)
+
+    return assignments, district_types, district_rows
+
+with report.stage("assign"):
+    assignments, district_types, district_rows = assign_HH_to_buildings(census_data, building_data, building_index)
 print(assignments)
 
+# Profiles of all the households of the district (households x profile columns), in
+# assignment order: one gather from the stacked profile tables
+with report.stage("gather_profiles"):
+    stacked_profiles, profile_offsets = stack_profiles(profiles)
+    household_profiles = gather_profiles(district_types, district_rows, stacked_profiles, profile_offsets)
+    # and the season/day_type/hour of the same rows
+    stacked_calendar = pd.concat([profile_calendar[hh_type] for hh_type in HOUSEHOLD_TYPES], ignore_index=True)
+    household_calendar = stacked_calendar.iloc[profile_offsets[district_types] + district_rows].reset_index(drop=True)
+print(f"household profiles: {household_profiles.shape}")
+
 # Summary by building
 for section in assignments:
     for building_id, households in section['assignments'].items():
         # count households by typology
-        household_counts = {t: 0 for t in ncomp_types.values()}
+        building_counts = {t: 0 for t in ncomp_types.values()}
 
-        for household_type, _ in households:
-            household_counts[household_type] += 1
+        for code in households[0]:
+            building_counts[HOUSEHOLD_TYPES[code]] += 1
 
-        print(f"building id {building_id}: {household_counts}")
+        print(f"building id {building_id}: {building_counts}")
 
 section_totals = {}
 
 # Summary by section
 for section in assignments:
-    section_id = section["section"]
-    total_assigned_households = sum(len(households)
+    section_id = section["section_ID"]
+    total_assigned_households = sum(len(households[0])
                                     for households in section["assignments"].values())
     total_census_households = next(
         feature["properties"]["total households"] for feature in census_data["features"] if
@@ -187,5 +182,4 @@ for section in assignments:
         f"Section {section_id}: {total_assigned_households} household assegnati "
         f"vs. {total_census_households} by census section.")
 
-
-
+print(f"✅ Saved run report to {report.write(output_folder)}")
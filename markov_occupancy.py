@@ -0,0 +1,120 @@
+"""Stochastic hourly occupancy and appliance use of every household over a year.
+
+The profiles_HH_ncomp_* workbooks give, per household type, the probability of being at
+home (and of using appliances) at each of the 72 hours of a weekday, a Saturday and a
+Sunday: every household of a type gets the same shape. Here each household is a
+two-state (absent/present) inhomogeneous Markov chain over the 8760 hours of the year.
+The transition probabilities of every type and hour are derived from those profiles so
+that the share of present households follows the profile exactly. With mobility = 0
+it is the chain with the fewest switches (a household only changes state when the profile
+requires it); with mobility = 1 every hour is an independent draw. Appliance use is a
+second chain, active only when the household is at home, with marginal
+min(1, appliances / occupancy). All the households advance together, one vectorized step
+per hour.
+
+    python markov_occupancy.py    # series of the households of Assegnazione_famiglie_income.py
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from household_pool import HOUSEHOLD_TYPES
+
+year = 2016
+hours_per_year = 8760
+# 0: fewest state changes, 1: independent hours
+mobility = 0.3
+seed = 2025
+
+
+def day_types(year=year, n_days=hours_per_year // 24):
+    """Day type of every day of the year: 0 weekday, 1 Saturday, 2 Sunday."""
+    first = date(year, 1, 1)
+    weekdays = np.array([(first + timedelta(days=d)).weekday() for d in range(n_days)])
+    return np.clip(weekdays - 4, 0, 2)
+
+
+def year_profile(profile72, year=year):
+    """Hourly values over the year (..., 8760) of a (..., 72) weekday/Saturday/Sunday profile."""
+    profile72 = np.asarray(profile72, dtype=np.float64)
+    hour_index = (day_types(year)[:, None] * 24 + np.arange(24)).ravel()
+    return profile72[..., hour_index]
+
+
+def transition_probabilities(p, mobility=mobility):
+    """(P(present -> present), P(absent -> present)) of every step of a chain whose share
+    of present households is p (..., hours); step t goes from hour t - 1 to hour t."""
+    p = np.clip(np.asarray(p, dtype=np.float64), 0.0, 1.0)
+    before, after = np.roll(p, 1, axis=-1), p
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # fewest switches: only arrivals when the share grows, only departures when it drops
+        stay = np.where(after >= before, 1.0, after / before)
+        arrive = np.where(after > before, (after - before) / (1.0 - before), 0.0)
+    stay = np.nan_to_num(stay, nan=1.0)
+    arrive = np.nan_to_num(arrive, nan=0.0)
+    # mixing with the independent chain keeps the marginal
+    return (1 - mobility) * stay + mobility * after, (1 - mobility) * arrive + mobility * after
+
+
+def simulate_chain(p, types, rng=None, mobility=mobility):
+    """(hours x households) bool states of the households.
+
+    p: (types x hours) share of the active state per household type; types: type code of
+    every household.
+    """
+    rng = np.random.default_rng(rng)
+    types = np.asarray(types)
+    stay, arrive = transition_probabilities(p, mobility)
+    # (hours x 2 * types) table: column 2 * type + state of the previous hour, so each
+    # step is one gather and one comparison over all the households
+    table = np.stack([arrive.T, stay.T], axis=-1).reshape(stay.shape[1], -1)
+    p = np.asarray(p).T
+    states = np.empty((p.shape[0], len(types)), dtype=bool)
+    states[0] = rng.random(len(types)) < p[0, types]
+    column = 2 * types.astype(np.intp)
+    u = np.empty(len(types))
+    for t in range(1, p.shape[0]):
+        rng.random(out=u)
+        np.less(u, table[t, column + states[t - 1]], out=states[t])
+    return states
+
+
+def household_series(types, profiles, year=year, rng=None, mobility=mobility):
+    """{"occupancy", "appliances"}: (8760 x households) bool series of the households.
+
+    profiles: {category: {household type: array (72 x profile columns)}}; the chain of a
+    type follows the mean of its profile columns.
+    """
+    rng = np.random.default_rng(rng)
+    occupancy = np.array([profiles["occupancy"][t].mean(axis=1) for t in HOUSEHOLD_TYPES])
+    appliances = np.array([profiles["appliances"][t].mean(axis=1) for t in HOUSEHOLD_TYPES])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        use_when_home = np.nan_to_num(np.minimum(1.0, appliances / occupancy))
+
+    present = simulate_chain(year_profile(occupancy, year), types, rng, mobility)
+    active = simulate_chain(year_profile(use_when_home, year), types, rng, mobility)
+    return {"occupancy": present, "appliances": present & active}
+
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    import Assegnazione_famiglie_income as income
+    from columnar_store import write_columns
+    from household_table import HouseholdTable
+    from profile_library import load_profile_library
+
+    profiles = load_profile_library(income.profile_files, income.ncomp_types)
+    households = HouseholdTable.read(income.household_table_file)
+    start = time.perf_counter()
+    series = household_series(households.household_type, profiles, rng=seed)
+    print(f"{len(households)} households x {hours_per_year} hours in {time.perf_counter() - start:.1f} s")
+
+    series_file = os.path.join(income.output_folder, "household_occupancy_series.colstore")
+    write_columns(series_file, {
+        "household_id": households.household_id,
+        "building_id": households.building_id,
+        **{name: states.T.astype(np.uint8) for name, states in series.items()},
+    }, attrs={"year": year, "mobility": mobility, "seed": seed})
+    print(f"✅ Saved occupancy series to {series_file}")
@@ -0,0 +1,169 @@
+"""Vectorized sampling of the education and income levels of the residents.
+
+The assignment scripts drew one level per resident (random.choices / rng.choice), counted
+them with Counter and then corrected the totals with +-1 loops rebuilding a candidates
+list at every step. Here the levels of all the buildings of a section are drawn at once:
+a multinomial per building for the level counts, then multivariate hypergeometric draws
+to split them over the household types and over the households. Totals are exact by
+construction, the only loops are over levels and household types.
+
+allocate_section_levels also matches the census totals of the section (P86-P90, the
+income bands), which the per-building multinomial only does on average.
+"""
+import numpy as np
+
+from apportionment import apportion
+
+
+def level_probabilities(section_counts):
+    """Level distribution of a census section (uniform when the section has no data)."""
+    counts = np.asarray(section_counts, dtype=float)
+    total = counts.sum()
+    if total <= 0:
+        return np.full(counts.size, 1 / counts.size)
+    return counts / total
+
+
+def sample_building_levels(residents, section_counts, rng):
+    """(buildings x levels) counts: the residents of every building drawn from the section
+    distribution. Each row sums to the residents of the building."""
+    residents = np.asarray(residents, dtype=np.int64)
+    return rng.multinomial(residents, level_probabilities(section_counts))
+
+
+def allocate_section_levels(residents, section_counts, rng):
+    """(buildings x levels) counts matching both the building residents (row sums) and
+    the section level totals (column sums).
+
+    The census level totals are first apportioned to the residents of the section (they
+    can differ by a few units), then each level draws its residents without replacement
+    from the capacity still free in the buildings: one multivariate hypergeometric draw
+    over the buildings per level, the last level takes what is left.
+    """
+    residents = np.asarray(residents, dtype=np.int64)
+    level_totals = apportion(section_counts, int(residents.sum()))
+    counts = np.zeros((residents.size, level_totals.size), dtype=np.int64)
+    capacity = residents.copy()
+    for level, total in enumerate(level_totals[:-1]):
+        counts[:, level] = rng.multivariate_hypergeometric(capacity, int(total), method="marginals")
+        capacity -= counts[:, level]
+    counts[:, -1] = capacity
+    return counts
+
+
+def multivariate_hypergeometric(colors, nsample, rng):
+    """Draws without replacement, vectorized over the leading axes.
+
+    colors: (..., levels) counts of the urn of every row, nsample: (...) draws per row
+    (at most the row total). Returns the (..., levels) counts drawn, one marginal
+    hypergeometric draw per level.
+    """
+    colors = np.asarray(colors, dtype=np.int64)
+    left = np.array(nsample, dtype=np.int64, copy=True)
+    drawn = np.zeros_like(colors)
+    remaining = colors.sum(axis=-1)
+    for level in range(colors.shape[-1] - 1):
+        remaining = remaining - colors[..., level]
+        drawn[..., level] = rng.hypergeometric(colors[..., level], remaining, left)
+        left -= drawn[..., level]
+    drawn[..., -1] = left
+    return drawn
+
+
+def split_levels(level_counts, group_residents, rng):
+    """(buildings x groups x levels): the level counts of every building split over groups.
+
+    Groups (household types) take their residents in order from the shuffled residents of
+    the building, as consecutive slices: when the groups ask for more residents than the
+    building has, the last ones get less. Residents left over (building residents larger
+    than the group residents) go to the groups proportionally to their size, or evenly
+    when the building has no households. Summing over the groups gives level_counts back.
+    """
+    level_counts = np.asarray(level_counts, dtype=np.int64)
+    group_residents = np.asarray(group_residents, dtype=np.int64)
+    n_buildings, n_groups = group_residents.shape
+
+    # residents actually available to each group, in group order
+    before = np.cumsum(group_residents, axis=1) - group_residents
+    available = np.clip(level_counts.sum(axis=1, keepdims=True) - before, 0, None)
+    sizes = np.minimum(group_residents, available)
+
+    split = np.zeros((n_buildings, n_groups, level_counts.shape[1]), dtype=np.int64)
+    remaining = level_counts.copy()
+    for group in range(n_groups):
+        split[:, group] = multivariate_hypergeometric(remaining, sizes[:, group], rng)
+        remaining -= split[:, group]
+
+    # residents left over, spread over the groups
+    weights = group_residents.astype(float)
+    empty = weights.sum(axis=1) == 0
+    weights[empty] = 1.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    leftover = rng.multinomial(remaining, weights[:, None, :])  # buildings x levels x groups
+    return split + leftover.transpose(0, 2, 1)
+
+
+def sample_members(group_level_counts, households, household_sizes, missing_level, rng):
+    """Level code of every member of every household, in (building, group, household,
+    member) order.
+
+    group_level_counts: (buildings x groups x levels) residents of each group of each
+    building; households: (buildings x groups) households; household_sizes: (groups,)
+    members per household. Members take the residents of their group without replacement,
+    in random order; members beyond the residents of the group get missing_level.
+    The shuffle is one lexsort over all the residents of the section.
+    """
+    group_level_counts = np.asarray(group_level_counts, dtype=np.int64)
+    n_levels = group_level_counts.shape[-1]
+    pool_sizes = group_level_counts.sum(axis=-1).ravel()
+    slots = (np.asarray(households, dtype=np.int64) * np.asarray(household_sizes)).ravel()
+
+    # residents of every group, shuffled within the group (groups stay contiguous)
+    levels = np.tile(np.arange(n_levels), pool_sizes.size)
+    labels = np.repeat(levels, group_level_counts.ravel())
+    group = np.repeat(np.arange(pool_sizes.size), pool_sizes)
+    labels = labels[np.lexsort((rng.random(labels.size), group))]
+
+    # the first residents of each group fill its member slots
+    rank = np.arange(labels.size) - np.repeat(np.cumsum(pool_sizes) - pool_sizes, pool_sizes)
+    keep = rank < slots[group]
+    slot_start = np.cumsum(slots) - slots
+    members = np.full(slots.sum(), missing_level, dtype=np.int8)
+    members[slot_start[group[keep]] + rank[keep]] = labels[keep]
+    return members
+
+
+# ---- SELF-CHECK ----
+def _self_check(trials=500, seed=0):
+    """Row/column sums of the level allocations on random sections (python population_sampling.py)."""
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        n_buildings, n_levels, n_groups = int(rng.integers(1, 30)), int(rng.integers(2, 9)), 6
+        residents = rng.integers(1, 60, n_buildings)
+        # census totals a few units off the residents, as in the real sections
+        section_counts = rng.multinomial(max(0, int(residents.sum() + rng.integers(-5, 6))),
+                                         rng.dirichlet(np.ones(n_levels)))
+
+        counts = allocate_section_levels(residents, section_counts, rng)
+        assert (counts >= 0).all()
+        assert (counts.sum(axis=1) == residents).all()
+        assert (counts.sum(axis=0) == apportion(section_counts, int(residents.sum()))).all()
+        if section_counts.sum() == residents.sum():
+            assert (counts.sum(axis=0) == section_counts).all()
+
+        sampled = sample_building_levels(residents, section_counts, rng)
+        assert (sampled.sum(axis=1) == residents).all()
+
+        group_residents = rng.integers(0, 20, (n_buildings, n_groups))
+        split = split_levels(counts, group_residents, rng)
+        assert (split >= 0).all() and (split.sum(axis=1) == counts).all()
+
+        households = rng.integers(0, 4, (n_buildings, n_groups))
+        sizes = np.arange(1, n_groups + 1)
+        members = sample_members(split, households, sizes, n_levels, rng)
+        assert members.size == (households * sizes).sum()
+
+
+if __name__ == "__main__":
+    _self_check()
+    print("✅ population_sampling: self-check OK")
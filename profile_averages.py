@@ -0,0 +1,70 @@
+"""Average hourly profile of every building, all the buildings at once.
+
+The per-building workbooks computed their "Average" row with df.iloc[:, 1:].mean() one
+building and one category at a time, and struttura_schedule_CEA.py reopened every
+workbook to read it back. Here the (households x hours) matrix of each category is
+reduced per building with np.add.reduceat over the contiguous household rows of the
+buildings (see profile_store.py), optionally weighting each household by its size.
+"""
+import numpy as np
+
+from household_pool import HOUSEHOLD_SIZES
+from profile_store import household_profile_matrix
+
+
+def grouped_mean(matrix, group_start, weights=None):
+    """(groups x columns) mean of the rows of each group.
+
+    matrix: (rows x columns), rows of group g are group_start[g]:group_start[g + 1].
+    weights: optional (rows,) row weights. Groups without rows get zeros.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    group_start = np.asarray(group_start, dtype=np.int64)
+    sizes = np.diff(group_start)
+    if weights is None:
+        weights = np.ones(len(matrix))
+    weights = np.asarray(weights, dtype=np.float64)
+
+    means = np.zeros((len(sizes), matrix.shape[1]))
+    filled = sizes > 0
+    if filled.any():
+        starts = group_start[:-1][filled]
+        sums = np.add.reduceat(matrix * weights[:, None], starts, axis=0)
+        totals = np.add.reduceat(weights, starts)
+        means[filled] = sums / totals[:, None]
+    return means
+
+
+def building_average_cube(store, categories=None, weighted=False):
+    """(building IDs, categories, buildings x hours x categories array) of a profile store.
+
+    Plain mean of the households of each building (the old "Average" row), or with
+    weighted=True the mean weighted by household size (residents).
+    """
+    columns = store["columns"]
+    categories = list(categories or store["attrs"]["categories"])
+    weights = np.array(HOUSEHOLD_SIZES)[columns["household_type"]] if weighted else None
+    cube = np.stack([grouped_mean(columns[f"profile/{cat}"], columns["building_start"], weights)
+                     for cat in categories], axis=-1)
+    return np.asarray(columns["buildings"]), categories, cube
+
+
+def assignment_average_cube(building_profiles, profiles, categories=None, weighted=False):
+    """Same as building_average_cube, straight from the in-memory assignment.
+
+    building_profiles: {building id: (type codes, profile indices)}, as for write_profile_store.
+    """
+    categories = list(categories or profiles)
+    sizes = [len(types) for types, _ in building_profiles.values()]
+    if building_profiles:
+        types = np.concatenate([types for types, _ in building_profiles.values()]).astype(np.int8)
+        profile_idx = np.concatenate([idx for _, idx in building_profiles.values()]).astype(np.int32)
+    else:
+        types = np.empty(0, dtype=np.int8)
+        profile_idx = np.empty(0, dtype=np.int32)
+    group_start = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))
+    weights = np.array(HOUSEHOLD_SIZES)[types] if weighted else None
+    cube = np.stack([grouped_mean(household_profile_matrix(types, profile_idx, profiles[cat]),
+                                  group_start, weights)
+                     for cat in categories], axis=-1)
+    return np.array(list(building_profiles), dtype=np.int64), categories, cube
@@ -0,0 +1,140 @@
+"""Household profile library compiled once from the Excel workbooks into NumPy archives.
+
+Parsing profiles.xlsx / profiles_HH.xlsx / profiles_HH_ncomp_*.xlsx with openpyxl takes
+seconds on every run. Every workbook is compiled to float32 arrays, keyed by household
+type, and saved in its own .npz archive under cache_folder/<kind>, with the size, mtime
+and content hash of the workbook. A workbook is parsed again only when it changed: same
+size and mtime means unchanged, otherwise its content hash is compared with the stored
+one. Adding or removing a workbook of a set leaves the archives of the others as they are.
+
+The profile tables are (rows x profile columns); the other columns of a sheet (season,
+day_type, hour of profiles.xlsx) are kept next to them, see load_profile_calendar.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+cache_folder = "Data/profile_cache"
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_path(kind, path, signature):
+    key = json.dumps([kind, signature, os.path.abspath(path)])
+    return os.path.join(cache_folder, kind, f"{hashlib.sha1(key.encode()).hexdigest()[:12]}.npz")
+
+
+def _read_archive(cache_file):
+    """(stamp, {name: array}) of a compiled workbook, (None, {}) if not compiled yet."""
+    if not os.path.exists(cache_file):
+        return None, {}
+    with np.load(cache_file) as archive:
+        stamp = json.loads(str(archive["__stamp__"]))
+        return stamp, {name: archive[name] for name in archive.files if name != "__stamp__"}
+
+
+def _write_archive(cache_file, stamp, arrays):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = cache_file[:-len(".npz")] + ".tmp.npz"
+    np.savez(tmp_file, __stamp__=np.array(json.dumps(stamp)), **arrays)
+    os.replace(tmp_file, cache_file)
+
+
+def load_compiled(kind, sources, compile_source, signature=""):
+    """{source key: {name: array}} for a set of workbooks, through the compiled cache.
+
+    sources: {key: workbook path}; compile_source(path) -> {name: array} parses one
+    workbook. Every workbook has its own archive: only the workbooks that changed since
+    the last run are parsed again.
+    """
+    compiled = {}
+    for key, path in sources.items():
+        cache_file = _cache_path(kind, path, signature)
+        old, arrays = _read_archive(cache_file)
+        stat = os.stat(path)
+        stamp = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if old and old["size"] == stamp["size"] and old["mtime"] == stamp["mtime"]:
+            compiled[key] = arrays
+            continue
+        stamp["sha1"] = _file_hash(path)
+        if not (old and old["sha1"] == stamp["sha1"]):
+            arrays = compile_source(path)
+        # same content with a new mtime: only the stamp is rewritten
+        _write_archive(cache_file, stamp, arrays)
+        compiled[key] = arrays
+    return compiled
+
+
+def _profile_columns(df):
+    """Profile columns of a sheet (profile_1, profile_2, ...; all numeric if none)."""
+    columns = [c for c in df.columns if str(c).startswith("profile")]
+    if not columns:
+        columns = list(df.select_dtypes("number").columns)
+    return columns
+
+
+def _compile_profile_workbook(path, ncomp_types):
+    sheets = pd.read_excel(path, sheet_name=list(ncomp_types))
+    compiled = {}
+    for sheet, df in sheets.items():
+        hh_type = ncomp_types[sheet]
+        columns = _profile_columns(df)
+        compiled[hh_type] = df[columns].to_numpy(dtype=np.float32)
+        # the other columns, as "<type>/<column>" (text as fixed-width unicode)
+        for column in df.columns.drop(columns):
+            values = df[column]
+            numeric = pd.api.types.is_numeric_dtype(values)
+            compiled[f"{hh_type}/{column}"] = values.to_numpy() if numeric else values.to_numpy().astype(str)
+    return compiled
+
+
+def _split_calendar(source):
+    """({household type: profile table}, {household type: {column: array}}) of a compiled workbook."""
+    tables, calendar = {}, {}
+    for name, array in source.items():
+        hh_type, _, column = name.partition("/")
+        if column:
+            calendar.setdefault(hh_type, {})[column] = array
+        else:
+            tables[hh_type] = array
+    return tables, calendar
+
+
+def _load_profile_workbooks(profile_files, ncomp_types):
+    return load_compiled("profiles", profile_files,
+                         lambda path: _compile_profile_workbook(path, ncomp_types),
+                         signature=json.dumps(ncomp_types, sort_keys=True))
+
+
+def load_profiles(profile_file, ncomp_types):
+    """{household type: float32 array (rows x profile columns)} of one profile workbook."""
+    library = load_profile_library({"profiles": profile_file}, ncomp_types)
+    return library["profiles"]
+
+
+def load_profile_calendar(profile_file, ncomp_types):
+    """{household type: DataFrame of the non-profile columns} of one profile workbook, row by
+    row as the tables of load_profiles (season, day_type, hour for profiles.xlsx; no
+    columns for the workbooks with profiles only)."""
+    compiled = _load_profile_workbooks({"profiles": profile_file}, ncomp_types)["profiles"]
+    tables, calendar = _split_calendar(compiled)
+    return {hh_type: pd.DataFrame(calendar.get(hh_type, {}), index=pd.RangeIndex(len(table)))
+            for hh_type, table in tables.items()}
+
+
+def load_profile_library(profile_files, ncomp_types):
+    """{category: {household type: float32 array (rows x profile columns)}}.
+
+    profile_files: {category: workbook path}; ncomp_types: {sheet name: household type}.
+    """
+    compiled = _load_profile_workbooks(profile_files, ncomp_types)
+    return {cat: _split_calendar(source)[0] for cat, source in compiled.items()}
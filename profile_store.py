@@ -0,0 +1,79 @@
+"""Hourly profiles of all the assigned households in one columnar file.
+
+Replaces the per-building workbooks of Data/Building_profiles_* (one sheet per category
+plus the "Average" row) with a single store: one row per household, buildings stored
+contiguously, with the building id, the household type and the 72-hour vector of every
+category. See columnar_store.py for the file layout.
+"""
+import numpy as np
+
+from columnar_store import open_columns, write_columns
+from household_pool import HOUSEHOLD_TYPES
+
+
+def household_profile_matrix(types, profile_idx, category_profiles):
+    """(households x hours) float32 matrix of one category.
+
+    category_profiles: {household type: array (hours x profile columns)}.
+    """
+    hours = next(iter(category_profiles.values())).shape[0]
+    matrix = np.empty((len(types), hours), dtype=np.float32)
+    for code, hh_type in enumerate(HOUSEHOLD_TYPES):
+        rows = np.flatnonzero(types == code)
+        if rows.size:
+            matrix[rows] = category_profiles[hh_type][:, profile_idx[rows]].T
+    return matrix
+
+
+def write_profile_store(path, building_profiles, profiles):
+    """Write the households of every building to one columnar file.
+
+    building_profiles: {building id: (type codes, profile indices)}, in output order.
+    profiles: {category: {household type: array (hours x profile columns)}}.
+    """
+    building_ids = np.array(list(building_profiles), dtype=np.int64)
+    sizes = np.array([len(types) for types, _ in building_profiles.values()], dtype=np.int64)
+    if building_profiles:
+        types = np.concatenate([types for types, _ in building_profiles.values()]).astype(np.int8)
+        profile_idx = np.concatenate([idx for _, idx in building_profiles.values()]).astype(np.int32)
+    else:
+        types = np.empty(0, dtype=np.int8)
+        profile_idx = np.empty(0, dtype=np.int32)
+
+    columns = {
+        "buildings": building_ids,
+        "building_start": np.concatenate(([0], np.cumsum(sizes))),
+        "building_id": np.repeat(building_ids, sizes),
+        "household_type": types,
+        "profile_idx": profile_idx,
+    }
+    for cat, category_profiles in profiles.items():
+        columns[f"profile/{cat}"] = household_profile_matrix(types, profile_idx, category_profiles)
+
+    write_columns(path, columns, attrs={
+        "household_types": list(HOUSEHOLD_TYPES),
+        "categories": list(profiles),
+    })
+
+
+def open_profile_store(path):
+    """Memory-mapped store: {"columns": {name: array}, "attrs": {...}, "rows": {id: slice}}."""
+    columns, attrs = open_columns(path)
+    start = columns["building_start"]
+    rows = {int(building_id): slice(int(start[i]), int(start[i + 1]))
+            for i, building_id in enumerate(columns["buildings"])}
+    return {"columns": columns, "attrs": attrs, "rows": rows}
+
+
+def building_households(store, building_id, category):
+    """(household types, households x hours profiles) of one building and category."""
+    rows = store["rows"][int(building_id)]
+    household_types = store["attrs"]["household_types"]
+    types = [household_types[code] for code in store["columns"]["household_type"][rows]]
+    return types, store["columns"][f"profile/{category}"][rows]
+
+
+def building_average(store, building_id, category):
+    """The "Average" row of the old per-building sheet: mean profile of the households."""
+    _, matrix = building_households(store, building_id, category)
+    return matrix.mean(axis=0, dtype=np.float64)
@@ -0,0 +1,106 @@
+"""Timings, memory peaks and per-section counters of a population synthesis run.
+
+    report = RunReport("income", track_memory=True)
+    with report.stage("load"):
+        ...
+    report.section(census_id, buildings=..., households=..., residents=..., seconds=...)
+    report.write(output_folder)
+
+Phases inside a census section (which may run in a worker process) are timed with
+timer into a dict returned with the section results and added to its counters.
+
+Stages are timed with perf_counter; with track_memory the peak of the Python allocations
+of every stage (and of the whole run) comes from tracemalloc, which slows the run down,
+so it can be switched off. The report is saved as run_report.json (stages, sections and
+totals) and run_report_sections.csv (one row per census section), next to the outputs.
+"""
+import csv
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# section counters added up in the report totals (the others, e.g. m2/person, are not additive)
+summed_counters = ("buildings", "households", "residents", "seconds")
+
+
+@contextmanager
+def timer(seconds, name):
+    """Add the time of the with block to seconds[name]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds[name] = seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+class RunReport:
+    """Stages and census sections of one run."""
+
+    def __init__(self, name, track_memory=True):
+        self.name = name
+        self.track_memory = track_memory
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self.sections = []
+        self._start = time.perf_counter()
+        self._peak = 0
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """Time (and memory peak of) the code in the with block."""
+        if self.track_memory:
+            peak_before = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = {"stage": name, "seconds": round(time.perf_counter() - start, 4)}
+            if self.track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                entry["peak_mb"] = round(peak / 2**20, 2)
+                entry["current_mb"] = round(current / 2**20, 2)
+                # keep the run peak across the reset
+                self._peak = max(self._peak, peak_before, peak)
+            self.stages.append(entry)
+
+    def section(self, census_id, **counters):
+        """Counters of one census section (buildings, households, residents, seconds...)."""
+        self.sections.append({"census_id": census_id, **counters})
+
+    def summary(self):
+        totals = {key: sum(section[key] for section in self.sections
+                           if isinstance(section.get(key), (int, float)))
+                  for key in summed_counters}
+        totals["seconds"] = round(totals["seconds"], 4)
+        report = {
+            "run": self.name,
+            "started": self.started,
+            "total_seconds": round(time.perf_counter() - self._start, 4),
+            "stages": self.stages,
+            "section_totals": totals,
+            "sections": self.sections,
+        }
+        if self.track_memory:
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            report["peak_mb"] = round(peak / 2**20, 2)
+        return report
+
+    def write(self, output_folder):
+        """run_report.json and run_report_sections.csv in output_folder; returns the JSON path."""
+        json_path = os.path.join(output_folder, "run_report.json")
+        with open(json_path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+        if self.sections:
+            fieldnames = list(dict.fromkeys(key for section in self.sections for key in section))
+            with open(os.path.join(output_folder, "run_report_sections.csv"), "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(self.sections)
+        return json_path
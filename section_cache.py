@@ -0,0 +1,49 @@
+"""Per-section fingerprints for the incremental re-assignment.
+
+The fingerprint of a census section hashes everything its result depends on: the census
+properties, the ID / area / floors of its residential buildings and the run settings
+(seed, options). The manifest saved next to the outputs maps every section to its
+fingerprint and to its building IDs, so a rerun only recomputes the sections whose
+fingerprint changed and can tell which output entries to replace.
+"""
+import hashlib
+import json
+import os
+
+
+def section_fingerprint(census, records, *settings):
+    """Content hash of a census section: census properties, building records, settings."""
+    h = hashlib.sha1()
+    h.update(json.dumps(census, sort_keys=True, default=str).encode())
+    for field in ("ID", "area", "nfloors"):
+        h.update(records[field].tobytes())
+    h.update(json.dumps(settings, default=str).encode())
+    return h.hexdigest()
+
+
+def load_manifest(path):
+    """{census id (str): {"fingerprint": ..., "buildings": [IDs]}}, empty if missing."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def section_entry(fingerprint, records):
+    return {"fingerprint": fingerprint, "buildings": records["ID"].tolist()}
+
+
+def changed_sections(manifest, fingerprints):
+    """(changed or new census ids, removed census ids) of the fingerprints vs the manifest."""
+    changed = [census_id for census_id, fingerprint in fingerprints.items()
+               if manifest.get(str(census_id), {}).get("fingerprint") != fingerprint]
+    current = {str(census_id) for census_id in fingerprints}
+    removed = [census_id for census_id in manifest if census_id not in current]
+    return changed, removed
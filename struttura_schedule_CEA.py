@@ -1,75 +1,69 @@
+import numpy as np
 import pandas as pd
 import os
 
+from profile_library import load_compiled
+from profile_store import open_profile_store
+from profile_averages import building_average_cube
+from cea_schedules import write_district_schedules
+
 # Input e output directory
 input_folder = "Data/Building_profiles_all"
 output_folder = "Data/Building_schedules_CEA"
 os.makedirs(output_folder, exist_ok=True)
+# Profili orari delle famiglie in un unico file (se presente sostituisce i file .xlsx per edificio)
+profile_store_file = os.path.join(input_folder, "household_profiles.colstore")
+# Media pesata sul numero di componenti della famiglia (False: media semplice, come la riga "Average")
+weighted_average = False
 
-# Struttura header CEA
-metadata = ["METADATA", "CH-SIA-2014", "SINGLE_RES"] + [""] * 8
-#monthly_multiplier = ["MONTHLY_MULTIPLIER"] + [0.8] * 12
-monthly_multiplier = ["MONTHLY_MULTIPLIER"] + [1, 1, 1, 1, 1, 1, 1, 0.8, 1, 1, 1, 1]
-# Giorni della settimana e ore
-days = ["WEEKDAY"] * 24 + ["SATURDAY"] * 24 + ["SUNDAY"] * 24
-hours = list(range(1, 25)) * 3
-
-# Processa ogni file esistente
-for file in os.listdir(input_folder):
-    if file.endswith(".xlsx"):
-        building_id = file.split(".xlsx")[0]
-        input_path = os.path.join(input_folder, file)
-        output_path = os.path.join(output_folder, f"B{building_id}.csv")
+categories = ["occupancy", "appliances", "lighting", "DHW"]
 
-        # Leggi i valori "Average" per ogni foglio
-        average_values = {}
-        with pd.ExcelFile(input_path) as xls:
-            for category in ["occupancy", "appliances", "lighting", "DHW"]:
-                if category in xls.sheet_names:
-                    df = pd.read_excel(xls, sheet_name=category)
-                    avg_row = df[df.iloc[:, 0] == "Average"].iloc[:, 1:].values.flatten()
 
-                    # Assicura che ci siano 72 valori correttamente distribuiti
-                    if len(avg_row) == 72:
-                        average_values[category] = avg_row
-                    else:
-                        print(f"⚠️ Warning: {category} in {building_id}.xlsx ha "
-                              f"{len(avg_row)} valori invece di 72.")
-                        average_values[category] = [0] * 72
+def read_average_rows(input_path):
+    """Valori "Average" di ogni foglio presente nel file dell'edificio."""
+    average_rows = {}
+    with pd.ExcelFile(input_path) as xls:
+        for category in categories:
+            if category in xls.sheet_names:
+                df = pd.read_excel(xls, sheet_name=category)
+                average_rows[category] = np.asarray(
+                    df[df.iloc[:, 0] == "Average"].iloc[:, 1:].values.flatten(), dtype=np.float64)
+    return average_rows
 
-        # Crea DataFrame finale con la distribuzione corretta dei valori
-        schedule_data = pd.DataFrame({
-            "OCCUPANCY": list(average_values["occupancy"]),
-            "APPLIANCES": list(average_values["appliances"]),
-            "LIGHTING": list(average_values["lighting"]),
-            "SERVERS": [0] * 72,
-            "WATER": list(average_values["DHW"]),
-            "HEATING": ["SETPOINT", "SETPOINT", "SETPOINT", "SETPOINT", "SETPOINT", "SETPOINT",
-                        "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK",
-                        "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK",
-                        "SETPOINT", "SETPOINT", "SETPOINT"] * 3,
-            "COOLING": ["SETPOINT", "SETPOINT", "SETPOINT", "SETPOINT", "SETPOINT", "SETPOINT",
-                        "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK",
-                        "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK", "SETBACK",
-                        "SETPOINT", "SETPOINT", "SETPOINT"] * 3,
-            "PROCESSES": [0] * 72,
-            "ELECTROMOBILITY": [0] * 72,
-            "DAY": days,
-            "HOUR": hours
-        })
 
-        # Salva in CSV
-        with open(output_path, "w", newline="") as f:
-            # Scrive la riga METADATA
-            f.write(",".join(map(str, metadata)) + "\n")
-            # Scrive la riga MONTHLY_MULTIPLIER
-            f.write(",".join(map(str, monthly_multiplier)) + "\n")
-            # Scrive i dati
-            schedule_data.to_csv(f, index=False, float_format="%.1f")
+if os.path.exists(profile_store_file):
+    # Medie di tutti gli edifici in un colpo solo dal file dei profili (edifici x 72 x categorie)
+    building_ids, cube_categories, cube = building_average_cube(
+        open_profile_store(profile_store_file), categories, weighted=weighted_average)
+    building_averages = {str(building_id): dict(zip(cube_categories, np.moveaxis(averages, -1, 0)))
+                         for building_id, averages in zip(building_ids.tolist(), cube)}
+else:
+    # Legge i valori "Average" di tutti i file (solo i file modificati vengono riletti da Excel)
+    building_files = {file.split(".xlsx")[0]: os.path.join(input_folder, file)
+                      for file in os.listdir(input_folder) if file.endswith(".xlsx")}
+    building_averages = load_compiled("building_averages", building_files, read_average_rows)
 
-        print(f"✅ Creato file: {output_path}")
+# Controlla i valori di ogni edificio: (edifici x 72 x categorie)
+building_ids = list(building_averages)
+schedule_cube = np.zeros((len(building_ids), 72, len(categories)))
+for i, (building_id, average_rows) in enumerate(building_averages.items()):
+    average_values = {}
+    for category in categories:
+        if category in average_rows:
+            avg_row = average_rows[category]
 
-print("🎉 Elaborazione completata!")
+            # Assicura che ci siano 72 valori correttamente distribuiti
+            if len(avg_row) == 72:
+                average_values[category] = avg_row
+            else:
+                print(f"⚠️ Warning: {category} in {building_id}.xlsx ha "
+                      f"{len(avg_row)} valori invece di 72.")
+                average_values[category] = [0] * 72
 
+    schedule_cube[i] = np.column_stack([average_values[category] for category in categories])
 
+# Salva tutti i CSV (formato CEA, vedi cea_schedules.py); i file invariati non vengono riscritti
+written, unchanged = write_district_schedules(output_folder, building_ids, categories, schedule_cube)
+print(f"✅ Creati {written} file in {output_folder} ({unchanged} invariati)")
 
+print("🎉 Elaborazione completata!")
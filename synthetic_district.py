@@ -0,0 +1,109 @@
+"""Synthetic census sections and buildings with the schema of the Bari files in Data/.
+
+Used to measure how the household assignment scales (see benchmark_assignment.py). The
+census file has the properties read by the assignment scripts (SEZ21, total resident
+population, total households, HH_1 comp ... HH_6 comp or more, P86-P90,
+unknown_education, the income bands, occupied residents) and the building file has ID,
+SEZ21, function, Area, Shape_Area, nfloors and a square footprint as geometry. Section
+totals are consistent with the heated area of their residential buildings.
+Features are written one per line, so 1M buildings never sit in memory as dicts.
+"""
+import json
+import os
+
+import numpy as np
+
+# share of the households per number of components (1, 2, 3, 4, 5, 6 or more)
+household_shares = (0.33, 0.28, 0.18, 0.14, 0.05, 0.02)
+# education levels P86-P90 + unknown
+education_shares = {"P86": 0.05, "P87": 0.2, "P88": 0.33, "P89": 0.3, "P90": 0.07, "unknown_education": 0.05}
+income_shares = {
+    "below0_income": 0.01,
+    "10k_income": 0.3,
+    "10_15k_income": 0.15,
+    "15_26k_income": 0.25,
+    "26_55k_income": 0.22,
+    "55_75k_income": 0.04,
+    "75_120k_income": 0.02,
+    "120k_income": 0.01,
+}
+# heated m2 per resident, persons per household, occupied share of the residents
+area_per_person = 35.0
+persons_per_household = 2.4
+occupied_share = 0.4
+
+
+def _write_collection(path, name, features):
+    """Write a FeatureCollection from an iterable of feature dicts, one feature per line."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'{{\n"type": "FeatureCollection",\n"name": "{name}",\n"features": [\n')
+        for i, feature in enumerate(features):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(feature))
+        f.write("\n]\n}\n")
+
+
+def _split(total, shares, rng):
+    """Integer split of total on the shares (multinomial)."""
+    shares = np.asarray(list(shares), dtype=float)
+    return rng.multinomial(int(total), shares / shares.sum())
+
+
+def write_district(census_file, building_file, n_buildings, buildings_per_section=40, seed=0):
+    """Write a synthetic district of n_buildings; returns the number of census sections."""
+    rng = np.random.default_rng(seed)
+    n_sections = max(1, n_buildings // buildings_per_section)
+    sez = np.sort(rng.integers(0, n_sections, n_buildings)) + 1
+    function = rng.choice([11, 12, 2, 3], size=n_buildings, p=[0.1, 0.75, 0.1, 0.05])
+    area = rng.lognormal(np.log(250), 0.5, n_buildings).round(3)
+    nfloors = rng.integers(1, 10, n_buildings)
+    x = rng.uniform(0, 10_000, n_buildings).round(2)
+    y = rng.uniform(0, 10_000, n_buildings).round(2)
+
+    def buildings():
+        for i in range(n_buildings):
+            side = float(np.sqrt(area[i]).round(3))
+            x0, y0 = float(x[i]), float(y[i])
+            yield {
+                "type": "Feature",
+                "properties": {"ID": i, "SEZ21": int(sez[i]), "function": int(function[i]),
+                               "Area": float(area[i]), "Shape_Area": float(area[i]),
+                               "nfloors": int(nfloors[i])},
+                "geometry": {"type": "Polygon", "coordinates": [[
+                    [x0, y0], [x0 + side, y0], [x0 + side, y0 + side], [x0, y0 + side], [x0, y0]]]},
+            }
+
+    # section residents from the heated area of the residential buildings
+    residential = np.isin(function, (11, 12))
+    heated_area = np.bincount(sez, weights=np.where(residential, area * 0.82 * nfloors, 0),
+                              minlength=n_sections + 1)
+
+    def sections():
+        for census_id in range(1, n_sections + 1):
+            population = int(heated_area[census_id] / area_per_person)
+            households = int(population / persons_per_household)
+            hh = _split(households, household_shares, rng)
+            occupied = int(population * occupied_share)
+            properties = {
+                "SEZ21": census_id,
+                "total resident population": population,
+                "total households": households,
+                "HH_1 comp": int(hh[0]), "HH_2 comp": int(hh[1]), "HH_3 comp": int(hh[2]),
+                "HH_4 comp": int(hh[3]), "HH_5 comp": int(hh[4]), "HH_6 comp or more": int(hh[5]),
+                "Italian occupied_IT10": int(occupied * 0.9),
+                "Foreign occupied_ST31": occupied - int(occupied * 0.9),
+            }
+            properties.update(zip(education_shares, _split(population, education_shares.values(), rng).tolist()))
+            properties.update(zip(income_shares, _split(population, income_shares.values(), rng).tolist()))
+            yield {"type": "Feature", "properties": properties, "geometry": None}
+
+    for path in (census_file, building_file):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _write_collection(building_file, "Synthetic_buildings", buildings())
+    _write_collection(census_file, "Synthetic_census", sections())
+    return n_sections
+
+
+if __name__ == "__main__":
+    write_district("Data/synthetic/census_10k.json", "Data/synthetic/buildings_10k.json", 10_000)